@@ -240,7 +240,7 @@ PROJECT_MANIFEST = {
         "test_samples": 440,
         "features": 7,
         "classes": 22,
-        "training_time": "20-30 seconds"
+        "training_time": "measured by benchmarks/run_benchmarks.py --suites train"
     },
     
     "features": [
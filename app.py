@@ -5,38 +5,143 @@ This API provides endpoints for making crop recommendations based on soil
 and environmental conditions.
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import sys
+import threading
+import time
 import traceback
 
 # Add scripts directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scripts'))
 
+import config
+import metrics
+import serialization
+from binary_batch import FEATURES_MIMETYPE, PREDICTIONS_MIMETYPE, decode_features, encode_predictions
 from predict import CropRecommendationPredictor
+from prediction_cache import PredictionCache
+from registry import ModelRegistry, RegistryWatcher
+from shared_model import SHARED_MODEL_ENV
+from stream_io import STREAM_FORMATS, detect_format, score_stream
+from validation import (parse_compact, parse_fields, parse_query_options, parse_top_k,
+                        parse_validation_mode, validate_matrix, validate_records)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Encode ``jsonify`` responses with serialization.dumps (orjson when installed)."""
+    
+    backend = serialization.resolve_backend()
+    
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return serialization.dumps(obj, self.backend).decode('utf-8')
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialization.dumps(obj, self.backend), mimetype=self.mimetype)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Initialize predictor globally
 predictor = None
+_predictor_lock = threading.Lock()
+
+# Result cache in front of predictor.predict (cleared when the model reloads)
+prediction_cache = None
+if config.CACHE_ENABLED:
+    prediction_cache = PredictionCache(
+        config.FEATURES,
+        config.CACHE_QUANTIZATION,
+        max_entries=config.CACHE_MAX_ENTRIES,
+        ttl_seconds=config.CACHE_TTL_SECONDS
+    )
+    metrics.REGISTRY.add_collector(metrics.cache_collector(prediction_cache))
+
+# Versioned model registry; its current version takes precedence over models/
+model_registry = ModelRegistry(config.MODEL_REGISTRY_PATH) if config.REGISTRY_ENABLED else None
+model_watcher = None
+# Start the registry watcher with the first predictor; serve.py's pre-fork
+# master turns this off because it polls the registry and replaces workers
+watch_registry = True
+
+def load_predictor(version=None):
+    """
+    Build a predictor for a registry version (default: the current one), or
+    from the model files in models/ when the registry has no current version.
+    """
+    version = version or (model_registry.current_version() if model_registry is not None else None)
+    if version is not None:
+        return CropRecommendationPredictor(engine='compiled',
+                                           bundle_path=model_registry.bundle_path(version),
+                                           version=version)
+    return CropRecommendationPredictor(engine=config.MODEL_ENGINE, variant=config.MODEL_VARIANT)
 
 def initialize_predictor():
-    """Initialize the predictor."""
+    """
+    Initialize the predictor (safe to call from concurrent requests). When the
+    CROP_SHARED_MODEL environment variable names a shared memory segment, the
+    model published there is attached instead of loading one from disk.
+    Otherwise the registry watcher is started with it (see ``watch_registry``),
+    so any WSGI host picks up newly activated versions.
+    """
     global predictor
-    try:
-        predictor = CropRecommendationPredictor()
-        return True
-    except Exception as e:
-        print(f"Error initializing predictor: {e}")
-        return False
+    with _predictor_lock:
+        if predictor is not None:
+            return True
+        try:
+            shared_model = os.environ.get(SHARED_MODEL_ENV)
+            if shared_model:
+                predictor = CropRecommendationPredictor(engine='compiled', shared_model=shared_model)
+            else:
+                predictor = load_predictor()
+                if watch_registry:
+                    start_model_watcher()
+            return True
+        except Exception as e:
+            print(f"Error initializing predictor: {e}")
+            return False
+
+def reload_predictor(version=None):
+    """Load a fresh predictor from disk and swap it in for new requests."""
+    global predictor
+    new_predictor = load_predictor(version)
+    with _predictor_lock:
+        predictor = new_predictor
+    return new_predictor
+
+def attach_shared_model(name):
+    """Serve the model a supervisor published in shared memory (see scripts/shared_model.py)."""
+    global predictor
+    new_predictor = CropRecommendationPredictor(engine='compiled', shared_model=name)
+    with _predictor_lock:
+        predictor = new_predictor
+    return new_predictor
+
+def start_model_watcher():
+    """
+    Poll the registry in a background thread and hot-swap newly activated
+    versions. The new model is fully loaded before the swap, so in-flight
+    requests finish on the old one and none are dropped.
+    """
+    global model_watcher
+    if model_registry is None or model_watcher is not None:
+        return model_watcher
+    current = predictor.model_version if predictor is not None else None
+    model_watcher = RegistryWatcher(model_registry, reload_predictor, version=current).start()
+    return model_watcher
 
 @app.before_request
 def before_request():
     """Ensure predictor is initialized."""
     global predictor
+    if metrics.REGISTRY.enabled:
+        g.request_start = time.perf_counter()
     if predictor is None:
         if not initialize_predictor():
             return jsonify({
@@ -44,6 +149,16 @@ def before_request():
                 'error': 'Failed to initialize prediction model'
             }), 500
 
+@app.after_request
+def record_request_metrics(response):
+    """Record the request duration per route (streamed bodies: until the first byte)."""
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code,
+                                time.perf_counter() - start)
+    return response
+
 @app.route('/', methods=['GET'])
 def home():
     """Serve the web interface."""
@@ -59,9 +174,12 @@ def home():
                 'GET /': 'This page',
                 'POST /predict': 'Make a single prediction',
                 'POST /predict-batch': 'Make multiple predictions',
+                'POST /predict-stream': 'Stream-score an NDJSON/CSV upload',
                 'GET /crops': 'List all supported crops',
                 'GET /features': 'List required input features',
-                'GET /health': 'Check API health'
+                'GET /health': 'Check API health',
+                'GET /model': 'Active model version and load time',
+                'GET /metrics': 'Prometheus metrics'
             }
         }), 200
 
@@ -71,9 +189,43 @@ def health():
     global predictor
     return jsonify({
         'status': 'healthy',
-        'model_loaded': predictor is not None
+        'model_loaded': predictor is not None,
+        'cache': prediction_cache.stats() if prediction_cache is not None else None
     }), 200
 
+@app.route('/model', methods=['GET'])
+def model_info():
+    """Report the active model version and when it was loaded."""
+    global predictor
+    active = predictor
+    
+    if active is None:
+        return jsonify({
+            'success': False,
+            'error': 'Model not initialized'
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'model': {
+            'version': active.model_version,
+            'engine': active.engine,
+            'loaded_at': active.loaded_at,
+            'load_seconds': round(active.load_seconds, 4),
+            'generation': active.model_generation,
+            'metadata': active.model_metadata
+        },
+        'registry': {
+            'current': model_registry.current_version(),
+            'versions': model_registry.versions()
+        } if model_registry is not None else None
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose timing histograms and cache counters in Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/crops', methods=['GET'])
 def get_crops():
     """Get list of all supported crops."""
@@ -137,7 +289,9 @@ def predict():
         "temperature": <float>, # Temperature (°C)
         "humidity": <float>,    # Humidity (%)
         "ph": <float>,          # pH level
-        "rainfall": <float>     # Rainfall (mm)
+        "rainfall": <float>,    # Rainfall (mm)
+        "top_k": <int>,         # Optional: ranked alternatives (default 3)
+        "fields": ["crop", ...] # Optional: result keys to return (default: all)
     }
     """
     global predictor
@@ -149,35 +303,44 @@ def predict():
         }), 500
     
     try:
+        timer = metrics.stage_timer('/predict')
+        
         # Get JSON data
         data = request.get_json()
+        timer.mark('parse')
         
-        # Validate required fields
-        required_fields = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-        missing_fields = [field for field in required_fields if field not in data]
+        # Validate required fields, types and FEATURE_RANGES
+        validation = validate_records([data])
         
-        if missing_fields:
+        if not validation.ok:
+            errors = validation.errors[0]
             return jsonify({
                 'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}',
-                'required_fields': required_fields
+                'error': '; '.join(errors),
+                'errors': errors,
+                'required_fields': config.FEATURES
             }), 400
         
-        # Make prediction
-        result = predictor.predict(
-            N=float(data['N']),
-            P=float(data['P']),
-            K=float(data['K']),
-            temperature=float(data['temperature']),
-            humidity=float(data['humidity']),
-            ph=float(data['ph']),
-            rainfall=float(data['rainfall'])
-        )
+        values = validation.inputs()[0]
+        top_k = parse_top_k(data.get('top_k'), config.DEFAULT_TOP_K)
+        fields = parse_fields(data.get('fields'))
+        timer.mark('coerce')
         
-        return jsonify({
+        # Make prediction (served from the cache when enabled)
+        if prediction_cache is not None:
+            result = prediction_cache.get_or_predict(predictor, values, top_k)
+        else:
+            result = predictor.predict(**values, top_k=top_k)
+        if fields is not None:
+            result = {key: value for key, value in result.items() if key in fields}
+        timer.mark('predict')
+        
+        response = jsonify({
             'success': True,
             'prediction': result
-        }), 200
+        })
+        timer.mark('serialize')
+        return response, 200
     
     except ValueError as e:
         return jsonify({
@@ -210,8 +373,30 @@ def predict_batch():
                 "rainfall": <float>
             },
             ...
-        ]
+        ],
+        "top_k": <int>,           # Optional: ranked alternatives per row
+        "on_error": "reject",     # Optional: "reject" (default) or "skip" invalid rows
+        "fields": ["crop", ...],  # Optional: result keys to return (default: all)
+        "compact": false          # Optional: parallel arrays instead of result dicts
     }
+    
+    Every row is checked for missing, non-numeric, non-finite and out-of-range
+    values first. In "reject" mode any invalid row fails the request with
+    per-row errors; in "skip" mode the valid rows are scored (each result
+    carries its input "row" index) and the rest are listed under "errors".
+    
+    With "compact": true the predictions come back as parallel arrays
+    "crops", "ids" and "confidences" (plus "alternatives" with top_k, and
+    "rows" in "skip" mode) and the inputs are not echoed.
+    
+    top_k, on_error, fields and compact may also be given in the query
+    string (validation.parse_query_options); the JSON body takes precedence.
+    
+    Binary columnar batches (see scripts/binary_batch.py): send the rows as
+    Content-Type: application/x-crop-features (a float32 matrix, read without
+    copying) with top_k/on_error/fields/compact in the query string (e.g.
+    ?compact=true&fields=crop,confidence), and/or send
+    Accept: application/x-crop-predictions to get the results as arrays.
     """
     global predictor
     
@@ -222,37 +407,96 @@ def predict_batch():
         }), 500
     
     try:
-        # Get JSON data
-        request_data = request.get_json()
+        timer = metrics.stage_timer('/predict-batch')
         
-        if 'data' not in request_data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing "data" field in request'
-            }), 400
+        if request.mimetype == FEATURES_MIMETYPE:
+            # Binary float32 matrix: a read-only view of the body, options in the query string
+            features = decode_features(request.get_data(), len(config.FEATURES))
+            request_data = parse_query_options(request.args)
+            timer.mark('parse')
+            if len(features) == 0:
+                return jsonify({
+                    'success': False,
+                    'error': 'Binary batch has no rows'
+                }), 400
+            validation = validate_matrix(features)
+        else:
+            # Get JSON data
+            request_data = request.get_json()
+            timer.mark('parse')
+            
+            if 'data' not in request_data:
+                return jsonify({
+                    'success': False,
+                    'error': 'Missing "data" field in request'
+                }), 400
+            
+            # Options may also come from the query string; the body takes precedence
+            request_data = {**parse_query_options(request.args), **request_data}
+            data = request_data['data']
+            
+            if not isinstance(data, list):
+                return jsonify({
+                    'success': False,
+                    'error': '"data" must be a list'
+                }), 400
+            
+            if len(data) == 0:
+                return jsonify({
+                    'success': False,
+                    'error': '"data" list is empty'
+                }), 400
+            
+            validation = validate_records(data)
         
-        data = request_data['data']
+        top_k = parse_top_k(request_data.get('top_k'), None)
+        mode = parse_validation_mode(request_data.get('on_error'))
+        fields = parse_fields(request_data.get('fields'))
+        compact = parse_compact(request_data.get('compact'), fields)
+        binary = request.accept_mimetypes.best_match(['application/json', PREDICTIONS_MIMETYPE]) \
+            == PREDICTIONS_MIMETYPE
+        timer.mark('validate')
         
-        if not isinstance(data, list):
+        if not validation.ok and mode == 'reject':
             return jsonify({
                 'success': False,
-                'error': '"data" must be a list'
+                'error': f'{len(validation.errors)} of {len(validation.valid)} rows are invalid',
+                'errors': validation.error_list()
             }), 400
         
-        if len(data) == 0:
-            return jsonify({
-                'success': False,
-                'error': '"data" list is empty'
-            }), 400
+        if binary:
+            arrays = predictor.predict_arrays(validation, top_k=top_k)
+            timer.mark('predict')
+            rows = validation.valid_rows if mode == 'skip' else None
+            response = Response(encode_predictions(arrays, rows), mimetype=PREDICTIONS_MIMETYPE)
+            response.headers['X-Rejected-Rows'] = str(len(validation.errors))
+            timer.mark('serialize')
+            return response, 200
         
-        # Make predictions
-        results = predictor.predict_batch(data)
-        
-        return jsonify({
-            'success': True,
-            'total_predictions': len(results),
-            'predictions': results
-        }), 200
+        # Make predictions (only the valid rows in 'skip' mode)
+        if compact:
+            columns = predictor.predict_columns(validation, top_k=top_k)
+            timer.mark('predict')
+            body = {'success': True, 'total_predictions': len(columns['ids']), **columns}
+            if mode == 'skip':
+                body['rows'] = validation.valid_rows
+        else:
+            results = predictor.predict_validated(validation, top_k=top_k, fields=fields)
+            timer.mark('predict')
+            body = {
+                'success': True,
+                'total_predictions': len(results),
+                'predictions': results
+            }
+            if mode == 'skip':
+                for row, result in zip(validation.valid_rows.tolist(), results):
+                    result['row'] = row
+        if mode == 'skip':
+            body['rejected'] = len(validation.errors)
+            body['errors'] = validation.error_list()
+        response = jsonify(body)
+        timer.mark('serialize')
+        return response, 200
     
     except ValueError as e:
         return jsonify({
@@ -267,6 +511,50 @@ def predict_batch():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/predict-stream', methods=['POST'])
+def predict_stream():
+    """
+    Score a large NDJSON or CSV upload and stream NDJSON results back.
+    
+    The body is parsed and scored in chunks of ``chunk_size`` rows (default
+    config.STREAM_CHUNK_ROWS), so memory stays bounded for any upload size.
+    
+    Content-Type: application/x-ndjson (one JSON object per line) or
+    text/csv (header row with the feature names); ``?format=ndjson|csv``
+    overrides the Content-Type.
+    
+    Each response line is {"row": i, "success": true, "prediction": {...}}
+    or {"row": i, "success": false, "error": "..."}.
+    """
+    global predictor
+    
+    if predictor is None:
+        return jsonify({
+            'success': False,
+            'error': 'Model not initialized'
+        }), 500
+    
+    fmt = detect_format(request.content_type, request.args.get('format'))
+    if fmt is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unsupported body format',
+            'supported_content_types': sorted(STREAM_FORMATS)
+        }), 415
+    
+    try:
+        chunk_rows = int(request.args.get('chunk_size', config.STREAM_CHUNK_ROWS))
+    except ValueError:
+        chunk_rows = 0
+    if not 0 < chunk_rows <= config.STREAM_MAX_CHUNK_ROWS:
+        return jsonify({
+            'success': False,
+            'error': f'chunk_size must be between 1 and {config.STREAM_MAX_CHUNK_ROWS}'
+        }), 400
+    
+    results = score_stream(predictor, request.stream, fmt, chunk_rows, app.json.backend)
+    return Response(stream_with_context(results), mimetype='application/x-ndjson')
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
@@ -293,21 +581,24 @@ if __name__ == '__main__':
     if initialize_predictor():
         print("[OK] Model loaded successfully!")
         print("\nStarting Flask server...")
-        print("Server running at: http://localhost:5000")
+        print(f"Server running at: http://localhost:{config.API_PORT}")
         print("\nAPI Documentation:")
         print("  GET  /              - API info and endpoints")
         print("  GET  /health        - Health check")
         print("  GET  /crops         - List supported crops")
         print("  GET  /features      - List required features")
+        print("  GET  /model         - Active model version")
+        print("  GET  /metrics       - Prometheus metrics")
         print("  POST /predict       - Make single prediction")
         print("  POST /predict-batch - Make batch predictions")
+        print("  POST /predict-stream - Stream-score NDJSON/CSV uploads")
         print("\n" + "=" * 60)
         
         # Run the app
         app.run(
-            host='0.0.0.0',
-            port=5000,
-            debug=False,
+            host=config.API_HOST,
+            port=config.API_PORT,
+            debug=config.API_DEBUG,
             use_reloader=False
         )
     else:
@@ -0,0 +1,374 @@
+"""
+ASGI API for Crop Recommendation System
+
+Async variant of the Flask API in app.py with the same endpoints and response
+shapes. Concurrent single predictions on /predict are micro-batched: they are
+queued and flushed through one vectorized predict_batch call when the batch
+reaches MICROBATCH_MAX_SIZE rows or MICROBATCH_MAX_DELAY_MS passes.
+
+This is a plain ASGI application with no framework dependency; run it with
+any ASGI server, e.g.:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from urllib.parse import parse_qsl
+
+# Add scripts directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scripts'))
+
+import config
+import metrics
+import serialization
+from micro_batch import MicroBatcher
+from predict import CropRecommendationPredictor
+from registry import ModelRegistry, RegistryWatcher
+from validation import (parse_compact, parse_fields, parse_query_options, parse_top_k,
+                        parse_validation_mode, validate_records)
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+
+
+class CropRecommendationASGI:
+    """ASGI application serving the crop recommendation endpoints."""
+
+    def __init__(self, max_batch_size=config.MICROBATCH_MAX_SIZE,
+                 max_delay_ms=config.MICROBATCH_MAX_DELAY_MS):
+        self.max_batch_size = max_batch_size
+        self.max_delay_ms = max_delay_ms
+        self.predictor = None
+        self.batcher = None
+        self.registry = ModelRegistry(config.MODEL_REGISTRY_PATH) if config.REGISTRY_ENABLED else None
+        self.watcher = None
+        self.json_backend = serialization.resolve_backend()
+        self._batcher_collector = None
+        self.routes = {
+            ('GET', '/'): self.home,
+            ('GET', '/health'): self.health,
+            ('GET', '/crops'): self.get_crops,
+            ('GET', '/features'): self.get_features,
+            ('GET', '/model'): self.model_info,
+            ('GET', '/metrics'): self.get_metrics,
+            ('POST', '/predict'): self.predict,
+            ('POST', '/predict-batch'): self.predict_batch
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    def load_predictor(self, version=None):
+        """
+        Build a predictor for a registry version (default: the current one), or
+        from the model files in models/ when the registry has no current version.
+        """
+        version = version or (self.registry.current_version() if self.registry is not None else None)
+        if version is not None:
+            return CropRecommendationPredictor(engine='compiled',
+                                               bundle_path=self.registry.bundle_path(version),
+                                               version=version)
+        return CropRecommendationPredictor(engine=config.MODEL_ENGINE, variant=config.MODEL_VARIANT)
+
+    def swap_predictor(self, version=None):
+        """Load a model off the event loop, then replace the active one."""
+        self.predictor = self.load_predictor(version)
+
+    async def startup(self):
+        """Load the model, start the micro-batcher and watch the registry."""
+        loop = asyncio.get_running_loop()
+        self.predictor = await loop.run_in_executor(None, self.load_predictor)
+        self.batcher = MicroBatcher(self._predict_rows, self.max_batch_size, self.max_delay_ms)
+        self.batcher.start()
+        self._batcher_collector = metrics.batcher_collector(self.batcher)
+        metrics.REGISTRY.add_collector(self._batcher_collector)
+        if self.registry is not None:
+            self.watcher = RegistryWatcher(self.registry, self.swap_predictor,
+                                           version=self.predictor.model_version).start()
+
+    def _predict_rows(self, rows):
+        """
+        Score a micro-batch of (values, top_k) requests in one call.
+
+        The batch is ranked once at the largest requested ``top_k`` and each
+        result's alternatives are trimmed back to what its request asked for.
+        """
+        max_k = max(top_k for _, top_k in rows)
+        results = self.predictor.predict_batch([values for values, _ in rows], top_k=max_k)
+        for result, (_, top_k) in zip(results, rows):
+            if top_k < max_k:
+                result['alternatives'] = result['alternatives'][:top_k]
+        return results
+
+    async def shutdown(self):
+        """Stop the registry watcher and the micro-batcher."""
+        if self._batcher_collector in metrics.REGISTRY.collectors:
+            metrics.REGISTRY.collectors.remove(self._batcher_collector)
+            self._batcher_collector = None
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        if self.batcher is not None:
+            await self.batcher.stop()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        method = scope['method']
+        if method == 'OPTIONS':
+            await self._send(send, 200, b'', 'text/plain', extra_headers=[
+                (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                (b'access-control-allow-headers', b'Content-Type')
+            ])
+            return
+
+        handler = self.routes.get((method, scope['path']))
+        if handler is None:
+            if any(path == scope['path'] for _, path in self.routes):
+                await self._send_json(send, {'success': False, 'error': 'Method not allowed'}, 405)
+            else:
+                await self._send_json(send, {'success': False, 'error': 'Endpoint not found'}, 404)
+            return
+
+        start = time.perf_counter()
+        body = b''
+        if method == 'POST':
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message.get('body', b'')
+                more_body = message.get('more_body', False)
+
+        query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        try:
+            response = await handler(body, query)
+        except Exception:
+            response = ({'success': False, 'error': 'Internal server error'}, 500)
+
+        if isinstance(response, bytes):
+            status = 200
+            await self._send(send, status, response, 'text/html; charset=utf-8')
+        elif len(response) == 3:
+            body, status, content_type = response
+            await self._send(send, status, body, content_type)
+        else:
+            status = response[1]
+            await self._send_json(send, *response)
+        metrics.observe_request(scope['path'], method, status, time.perf_counter() - start)
+
+    async def _send_json(self, send, payload, status):
+        await self._send(send, status, serialization.dumps(payload, self.json_backend), 'application/json')
+
+    async def _send(self, send, status, body, content_type, extra_headers=()):
+        headers = [
+            (b'content-type', content_type.encode('latin-1')),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            (b'access-control-allow-origin', b'*')
+        ]
+        headers.extend(extra_headers)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _model_missing(self):
+        if self.predictor is None:
+            return {'success': False, 'error': 'Model not initialized'}, 500
+        return None
+
+    async def home(self, body, query):
+        """Serve the web interface, or API info if it is missing."""
+        if os.path.exists(INDEX_FILE):
+            with open(INDEX_FILE, 'rb') as f:
+                return f.read()
+        return {
+            'name': 'Crop Recommendation System',
+            'version': '1.0.0',
+            'description': 'ML-based crop recommendation API using Random Forest',
+            'endpoints': {
+                'GET /': 'This page',
+                'POST /predict': 'Make a single prediction',
+                'POST /predict-batch': 'Make multiple predictions',
+                'GET /crops': 'List all supported crops',
+                'GET /features': 'List required input features',
+                'GET /health': 'Check API health',
+                'GET /model': 'Active model version and load time',
+                'GET /metrics': 'Prometheus metrics'
+            }
+        }, 200
+
+    async def health(self, body, query):
+        """Health check endpoint."""
+        return {
+            'status': 'healthy',
+            'model_loaded': self.predictor is not None,
+            'batching': self.batcher.stats() if self.batcher is not None else None
+        }, 200
+
+    async def model_info(self, body, query):
+        """Report the active model version and when it was loaded."""
+        missing = self._model_missing()
+        if missing:
+            return missing
+        active = self.predictor
+        return {
+            'success': True,
+            'model': {
+                'version': active.model_version,
+                'engine': active.engine,
+                'loaded_at': active.loaded_at,
+                'load_seconds': round(active.load_seconds, 4),
+                'generation': active.model_generation,
+                'metadata': active.model_metadata
+            },
+            'registry': {
+                'current': self.registry.current_version(),
+                'versions': self.registry.versions()
+            } if self.registry is not None else None
+        }, 200
+
+    async def get_metrics(self, body, query):
+        """Expose timing histograms and batcher counters in Prometheus text format."""
+        return (metrics.REGISTRY.render().encode('utf-8'), 200,
+                'text/plain; version=0.0.4; charset=utf-8')
+
+    async def get_crops(self, body, query):
+        """Get list of all supported crops."""
+        missing = self._model_missing()
+        if missing:
+            return missing
+        crops = dict(sorted(self.predictor.get_crop_info().items(), key=lambda x: x[1]))
+        return {'success': True, 'total_crops': len(crops), 'crops': crops}, 200
+
+    async def get_features(self, body, query):
+        """Get required input features for prediction."""
+        missing = self._model_missing()
+        if missing:
+            return missing
+        features = self.predictor.get_feature_names()
+        return {'success': True, 'features': features, 'feature_count': len(features)}, 200
+
+    async def predict(self, body, query):
+        """Make one prediction through the micro-batcher."""
+        missing = self._model_missing()
+        if missing:
+            return missing
+
+        try:
+            timer = metrics.stage_timer('asgi:/predict')
+            data = json.loads(body)
+            timer.mark('parse')
+            validation = validate_records([data])
+            if not validation.ok:
+                errors = validation.errors[0]
+                return {
+                    'success': False,
+                    'error': '; '.join(errors),
+                    'errors': errors,
+                    'required_fields': config.FEATURES
+                }, 400
+
+            values = validation.inputs()[0]
+            top_k = parse_top_k(data.get('top_k'), config.DEFAULT_TOP_K)
+            fields = parse_fields(data.get('fields'))
+            timer.mark('coerce')
+            result = await self.batcher.submit((values, top_k))
+            if fields is not None:
+                result = {key: value for key, value in result.items() if key in fields}
+            timer.mark('batched_predict')
+            return {'success': True, 'prediction': result}, 200
+
+        except ValueError as e:
+            return {'success': False, 'error': f'Invalid input value: {str(e)}'}, 400
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Prediction error: {str(e)}',
+                'traceback': traceback.format_exc()
+            }, 500
+
+    async def predict_batch(self, body, query):
+        """Make batch predictions (already vectorized, so not micro-batched)."""
+        missing = self._model_missing()
+        if missing:
+            return missing
+
+        try:
+            request_data = json.loads(body)
+            if 'data' not in request_data:
+                return {'success': False, 'error': 'Missing "data" field in request'}, 400
+            # Options may also come from the query string; the body takes precedence
+            request_data = {**parse_query_options(query), **request_data}
+
+            data = request_data['data']
+            if not isinstance(data, list):
+                return {'success': False, 'error': '"data" must be a list'}, 400
+            if len(data) == 0:
+                return {'success': False, 'error': '"data" list is empty'}, 400
+
+            top_k = parse_top_k(request_data.get('top_k'), None)
+            mode = parse_validation_mode(request_data.get('on_error'))
+            fields = parse_fields(request_data.get('fields'))
+            compact = parse_compact(request_data.get('compact'), fields)
+            validation = validate_records(data)
+            if not validation.ok and mode == 'reject':
+                return {
+                    'success': False,
+                    'error': f'{len(validation.errors)} of {len(data)} rows are invalid',
+                    'errors': validation.error_list()
+                }, 400
+
+            loop = asyncio.get_running_loop()
+            if compact:
+                columns = await loop.run_in_executor(
+                    None, lambda: self.predictor.predict_columns(validation, top_k=top_k))
+                response = {'success': True, 'total_predictions': len(columns['ids']), **columns}
+                if mode == 'skip':
+                    response['rows'] = validation.valid_rows
+            else:
+                results = await loop.run_in_executor(
+                    None, lambda: self.predictor.predict_validated(validation, top_k=top_k, fields=fields))
+                response = {
+                    'success': True,
+                    'total_predictions': len(results),
+                    'predictions': results
+                }
+                if mode == 'skip':
+                    for row, result in zip(validation.valid_rows.tolist(), results):
+                        result['row'] = row
+            if mode == 'skip':
+                response['rejected'] = len(validation.errors)
+                response['errors'] = validation.error_list()
+            return response, 200
+
+        except ValueError as e:
+            return {'success': False, 'error': f'Invalid input value: {str(e)}'}, 400
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Batch prediction error: {str(e)}',
+                'traceback': traceback.format_exc()
+            }, 500
+
+
+app = CropRecommendationASGI()
@@ -0,0 +1,73 @@
+"""
+ASGI vs Flask Throughput Benchmark
+
+Drives ``POST /predict`` at the same concurrency against one Flask worker
+(serve.py) and one ASGI worker (uvicorn + asgi_app.py, with micro-batching),
+and reports requests/sec and p50/p99 latency for each.
+
+Requires uvicorn for the ASGI server.
+
+Usage:
+    python benchmarks/bench_asgi_vs_flask.py [--duration 10] [--clients 4] [--concurrency 32]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+
+from load_test import ROOT, run_load, wait_for_server
+
+
+def server_commands(host, port, threads):
+    """Command lines for the two servers under test."""
+    return {
+        'flask (serve.py, 1 worker)': [
+            sys.executable, os.path.join(ROOT, 'serve.py'), '--host', host,
+            '--port', str(port), '--workers', '1', '--threads', str(threads)
+        ],
+        'asgi (uvicorn, micro-batching)': [
+            sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', host,
+            '--port', str(port), '--workers', '1', '--log-level', 'warning', '--no-access-log'
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Flask and ASGI /predict throughput')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    parser.add_argument('--clients', type=int, default=4, help='Client processes')
+    parser.add_argument('--concurrency', type=int, default=32, help='Connections per client process')
+    parser.add_argument('--threads', type=int, default=32, help='Flask worker threads')
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    rows = []
+
+    for name, cmd in server_commands(host, args.port, args.threads).items():
+        server = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_server(host, args.port):
+                print(f"[ERROR] {name} did not start")
+                continue
+            rows.append((name, run_load(host, args.port, '/predict', args.duration,
+                                        args.clients, args.concurrency)))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    print("=" * 80)
+    print(f"POST /predict, {args.clients} clients x {args.concurrency} connections, "
+          f"{args.duration:.0f}s per run")
+    print("=" * 80)
+    print(f"{'server':<32} {'requests':>10} {'errors':>7} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, result in rows:
+        print(f"{name:<32} {result['requests']:>10} {result['errors']:>7} {result['rps']:>9.1f} "
+              f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Batch Prediction Benchmark
+
+Compares the vectorized ``CropRecommendationPredictor.predict_batch`` against
+the original row-by-row path (two scalers, ``model.predict`` and
+``model.predict_proba`` per row) at 1, 100, 10k and 1M rows.
+
+The row-by-row path is only timed up to ``--max-loop-rows`` rows; larger sizes
+are extrapolated from its measured per-row cost and marked as estimates.
+
+Usage:
+    python benchmarks/bench_predict_batch.py [--sizes 1 100 10000 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from predict import CropRecommendationPredictor
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv')
+
+
+def make_rows(n_rows, seed=42):
+    """Sample ``n_rows`` realistic feature dicts from the training data (within ``config.FEATURE_RANGES``)."""
+    crop = pd.read_csv(DATA_PATH)
+    features = crop.drop('label', axis=1)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(features), size=n_rows)
+    sample = features.to_numpy()[idx] * rng.normal(1.0, 0.02, size=(n_rows, features.shape[1]))
+    low, high = zip(*(config.FEATURE_RANGES[name] for name in features.columns))
+    sample = np.clip(sample, low, high)
+    return [dict(zip(features.columns, row)) for row in sample.tolist()]
+
+
+def legacy_predict_row(predictor, row):
+    """The original per-row prediction path, kept here as the baseline."""
+    features = np.array([[row['N'], row['P'], row['K'], row['temperature'],
+                          row['humidity'], row['ph'], row['rainfall']]])
+    features_minmax = predictor.minmax_scaler.transform(features)
+    features_scaled = predictor.standard_scaler.transform(features_minmax)
+    prediction_label = predictor.model.predict(features_scaled)[0]
+    prediction_proba = predictor.model.predict_proba(features_scaled)
+    return prediction_label, np.max(prediction_proba) * 100
+
+
+def time_call(func, repeat):
+    """Return the best wall time of ``repeat`` calls to ``func``."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized predict_batch')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000, 1000000])
+    parser.add_argument('--max-loop-rows', type=int, default=10000,
+                        help='Largest batch timed with the row-by-row baseline')
+    args = parser.parse_args()
+
+    predictor = CropRecommendationPredictor()
+    loop_cost_per_row = None
+
+    print("=" * 72)
+    print("predict_batch benchmark")
+    print("=" * 72)
+    print(f"{'rows':>10} {'row-by-row (s)':>18} {'vectorized (s)':>16} {'speedup':>10} {'rows/s':>12}")
+
+    for n_rows in args.sizes:
+        rows = make_rows(n_rows)
+        repeat = 5 if n_rows <= 10000 else 1
+
+        vectorized = time_call(lambda: predictor.predict_batch(rows), repeat)
+
+        if n_rows <= args.max_loop_rows:
+            loop = time_call(lambda: [legacy_predict_row(predictor, r) for r in rows],
+                             1 if n_rows > 100 else repeat)
+            loop_cost_per_row = loop / n_rows
+            loop_label = f"{loop:.4f}"
+        elif loop_cost_per_row is not None:
+            loop = loop_cost_per_row * n_rows
+            loop_label = f"~{loop:.1f} (est.)"
+        else:
+            loop = None
+            loop_label = "n/a"
+
+        speedup = f"{loop / vectorized:.1f}x" if loop else "n/a"
+        print(f"{n_rows:>10} {loop_label:>18} {vectorized:>16.4f} {speedup:>10} {n_rows / vectorized:>12.0f}")
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
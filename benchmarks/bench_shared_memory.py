@@ -0,0 +1,173 @@
+"""
+Shared-Memory Model Memory Benchmark
+
+Starts N independent worker processes that each build a predictor and score
+a batch, then sums their resident memory from /proc/<pid>/smaps_rollup while
+all of them are alive. Three ways of giving workers the forest are compared:
+
+- private: each worker holds its own copy of the flattened forest in its
+           heap, as when every worker unpickles the model
+- mmap:    each worker memory-maps the same bundle file (page cache pages)
+- shared:  a supervisor publishes the forest once in a shared memory segment
+           (scripts/shared_model.py) and workers attach read-only views
+
+RSS counts every page a process maps, so pages shared by N workers are
+counted N times. PSS divides each shared page among the processes mapping
+it, so total PSS is the memory the workers actually use together.
+
+The bundled model is small (about 1.3 MB), so the forest is replicated
+``--scale`` times (100 trees each) to stand in for a production-sized one.
+Linux only (reads /proc).
+
+Usage:
+    python benchmarks/bench_shared_memory.py [--workers 8 32] [--scale 10] [--modes private mmap shared]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from load_test import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from model_bundle import write_bundle
+from predict import CropRecommendationPredictor
+from shared_model import SharedModelPublisher
+from tree_engine import FlattenedForest
+
+MODES = ['private', 'mmap', 'shared']
+DEFAULT_WORKER_COUNTS = [8, 32]
+DEFAULT_SCALE = 10
+
+# Body of each worker process: load the model the given way, score a batch so
+# every tree is read, report readiness and wait for stdin to close
+WORKER_SCRIPT = """
+import contextlib, io, sys
+import numpy as np
+sys.path.insert(0, 'scripts')
+from predict import CropRecommendationPredictor
+from tree_engine import FlattenedForest
+mode, source = sys.argv[1], sys.argv[2]
+with contextlib.redirect_stdout(io.StringIO()):
+    if mode == 'shared':
+        predictor = CropRecommendationPredictor(engine='compiled', shared_model=source)
+    else:
+        predictor = CropRecommendationPredictor(engine='compiled', bundle_path=source)
+        if mode == 'private':
+            predictor.forest = FlattenedForest.concatenate([predictor.forest])
+rng = np.random.default_rng(0)
+low = np.array([0, 5, 5, 10, 20, 5, 50])
+high = np.array([140, 145, 205, 35, 100, 8, 300])
+predictor.predict_proba(rng.uniform(low, high, size=(2000, 7)))
+print('ready', flush=True)
+sys.stdin.read()
+"""
+
+
+def smaps_rollup(pid):
+    """Rss and Pss of one process in bytes, from /proc/<pid>/smaps_rollup."""
+    totals = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                totals[key.lower()] = int(rest.split()[0]) * 1024
+    return totals
+
+
+def write_scaled_bundle(path, scale):
+    """Write the served bundle with its trees repeated ``scale`` times; returns the forest size in bytes."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = CropRecommendationPredictor(engine='compiled')
+    forest = FlattenedForest.concatenate([predictor.forest] * scale)
+    write_bundle(path, forest, predictor.crop_mapping, predictor.feature_names,
+                 predictor.fused_scale, predictor.fused_offset, predictor.model_metadata)
+    return sum(getattr(forest, name).nbytes for name in ('feature', 'threshold', 'left', 'right', 'value'))
+
+
+def measure(mode, source, n_workers):
+    """
+    Start ``n_workers`` workers in one mode and sum their memory once all are ready.
+
+    Returns:
+    --------
+    dict : 'rss' and 'pss' totals in bytes
+    """
+    workers = []
+    try:
+        for _ in range(n_workers):
+            workers.append(subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT, mode, source], cwd=ROOT,
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True))
+        for worker in workers:
+            if worker.stdout.readline().strip() != 'ready':
+                raise RuntimeError(f'{mode} worker {worker.pid} failed to start')
+        totals = {'rss': 0, 'pss': 0}
+        for worker in workers:
+            for key, value in smaps_rollup(worker.pid).items():
+                totals[key] += value
+        return totals
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+        for worker in workers:
+            worker.wait(timeout=60)
+
+
+def run(worker_counts=DEFAULT_WORKER_COUNTS, scale=DEFAULT_SCALE, modes=MODES):
+    """
+    Total worker memory per mode and worker count.
+
+    Returns:
+    --------
+    dict : {'forest_bytes': int, 'results': {(mode, n_workers): {'rss', 'pss'}}}
+    """
+    work_dir = tempfile.mkdtemp(prefix='crop_shm_bench_')
+    try:
+        bundle_path = os.path.join(work_dir, 'crop_model.bundle')
+        forest_bytes = write_scaled_bundle(bundle_path, scale)
+
+        results = {}
+        with SharedModelPublisher() as publisher:
+            if 'shared' in modes:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    publisher.publish(CropRecommendationPredictor(engine='compiled', bundle_path=bundle_path))
+            for mode in modes:
+                source = publisher.name if mode == 'shared' else bundle_path
+                for n_workers in worker_counts:
+                    results[(mode, n_workers)] = measure(mode, source, n_workers)
+        return {'forest_bytes': forest_bytes, 'results': results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare total worker memory with and without a shared-memory model')
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKER_COUNTS,
+                        help='Worker counts to measure')
+    parser.add_argument('--scale', type=int, default=DEFAULT_SCALE,
+                        help='Copies of the 100-tree forest to serve')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    report = run(args.workers, args.scale, args.modes)
+    mb = 2 ** 20
+
+    print("=" * 72)
+    print(f"Total worker memory, forest of {args.scale * 100} trees "
+          f"({report['forest_bytes'] / mb:.1f} MB of arrays)")
+    print("=" * 72)
+    print(f"{'mode':<10} {'workers':>8} {'total RSS (MB)':>16} {'total PSS (MB)':>16} {'PSS/worker':>12}")
+    for (mode, n_workers), totals in report['results'].items():
+        print(f"{mode:<10} {n_workers:>8} {totals['rss'] / mb:>16.1f} {totals['pss'] / mb:>16.1f} "
+              f"{totals['pss'] / n_workers / mb:>12.1f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
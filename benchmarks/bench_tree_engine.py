@@ -0,0 +1,61 @@
+"""
+Tree Engine Benchmark
+
+Compares sklearn's ``predict_proba`` with the compiled FlattenedForest engine
+on already-scaled inputs: single-row latency and batch throughput.
+
+Usage:
+    python benchmarks/bench_tree_engine.py [--sizes 1 100 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from predict import CropRecommendationPredictor
+
+
+def time_per_call(func, repeat):
+    """Return the median wall time of ``repeat`` calls to ``func``."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled tree engine')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000])
+    args = parser.parse_args()
+
+    predictor = CropRecommendationPredictor(engine='compiled')
+    rng = np.random.default_rng(42)
+
+    print("=" * 72)
+    print(f"Tree engine benchmark ({predictor.forest.n_trees} trees, "
+          f"{predictor.forest.n_nodes} nodes, max depth {predictor.forest.max_depth})")
+    print("=" * 72)
+    print(f"{'rows':>8} {'sklearn (ms)':>14} {'compiled (ms)':>15} {'speedup':>10} {'compiled rows/s':>17}")
+
+    for n_rows in args.sizes:
+        features = predictor._scale(rng.uniform(0, 150, size=(n_rows, 7)))
+        repeat = 50 if n_rows <= 100 else 5
+
+        sklearn_time = time_per_call(lambda: predictor.model.predict_proba(features), repeat)
+        compiled_time = time_per_call(lambda: predictor.forest.predict_proba(features), repeat)
+
+        print(f"{n_rows:>8} {sklearn_time * 1e3:>14.3f} {compiled_time * 1e3:>15.3f} "
+              f"{sklearn_time / compiled_time:>9.1f}x {n_rows / compiled_time:>17.0f}")
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
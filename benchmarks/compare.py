@@ -0,0 +1,94 @@
+"""
+Benchmark Comparison
+
+Compares two result files written by ``benchmarks/run_benchmarks.py`` and
+flags every metric that got worse by more than a relative threshold (in the
+direction recorded with the metric: latencies, times and memory regress when
+they grow, throughputs when they shrink). Exits with status 1 when any metric
+regressed, so it can gate a CI job.
+
+Usage:
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 0.10]
+"""
+
+import argparse
+import json
+import sys
+
+DEFAULT_THRESHOLD = 0.10
+
+
+def load_results(path):
+    """The ``results`` mapping of a benchmark JSON file."""
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, candidate, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result mappings metric by metric.
+
+    Parameters:
+    -----------
+    baseline, candidate : dict
+        ``results`` mappings of two runs
+    threshold : float
+        Relative change beyond which a worse value counts as a regression
+
+    Returns:
+    --------
+    list of dict : One row per metric present in both runs, with the relative
+        change (positive = better) and a status of 'ok', 'improved' or 'regressed'
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(candidate)):
+        before = baseline[name]['value']
+        after = candidate[name]['value']
+        if before == 0:
+            change = 0.0
+        elif baseline[name].get('better', 'lower') == 'higher':
+            change = (after - before) / before
+        else:
+            change = (before - after) / before
+
+        if change < -threshold:
+            status = 'regressed'
+        elif change > threshold:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline': before, 'candidate': after,
+                     'unit': baseline[name]['unit'], 'change': change, 'status': status})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('baseline', help='Results JSON of the reference run')
+    parser.add_argument('candidate', help='Results JSON of the run under test')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change counted as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+    rows = compare(baseline, candidate, args.threshold)
+
+    print(f"{'metric':<40} {'baseline':>12} {'candidate':>12} {'change':>9}  status")
+    for row in rows:
+        print(f"{row['name']:<40} {row['baseline']:>12.4f} {row['candidate']:>12.4f} "
+              f"{row['change']:>+8.1%}  {row['status']}")
+
+    missing = sorted(set(baseline) ^ set(candidate))
+    if missing:
+        print(f"\n[WARN] Only in one run: {', '.join(missing)}")
+
+    regressed = [row['name'] for row in rows if row['status'] == 'regressed']
+    if regressed:
+        print(f"\n[FAIL] {len(regressed)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n[OK] No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load Test for the Production Server
+
+Starts ``serve.py`` with 1, 4 and 16 workers (one run each), drives ``/predict``
+from several client processes for a fixed duration and reports requests/sec
+and p50/p99 latency. Payloads are randomized so the result cache does not
+serve every request.
+
+Usage:
+    python benchmarks/load_test.py [--workers 1 4 16] [--duration 10]
+                                   [--clients 4] [--concurrency 8]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RICE = [90, 42, 43, 20.88, 82.0, 6.5, 202.94]
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def wait_for_server(host, port, timeout=60):
+    """Poll /health until the server answers."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client_process(host, port, path, duration, concurrency, seed, queue):
+    """Run ``concurrency`` keep-alive client threads and report latencies."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def run_thread(thread_seed):
+        rng = np.random.default_rng(thread_seed)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local = []
+        local_errors = 0
+        while time.monotonic() < stop_at:
+            values = np.array(RICE) * rng.normal(1.0, 0.05, size=len(RICE))
+            body = json.dumps(dict(zip(FEATURES, values.round(2).tolist())))
+            start = time.perf_counter()
+            try:
+                conn.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=run_thread, args=(seed * 1000 + i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put((latencies, errors[0]))
+
+
+def run_load(host, port, path, duration, clients, concurrency):
+    """Drive the server from ``clients`` processes and aggregate the results."""
+    queue = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=client_process,
+                                args=(host, port, path, duration, concurrency, seed, queue))
+        for seed in range(clients)
+    ]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([lat for lats, _ in results for lat in lats])
+    errors = sum(err for _, err in results)
+    return {
+        'requests': int(latencies.size),
+        'errors': int(errors),
+        'rps': latencies.size / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3) if latencies.size else float('nan'),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3) if latencies.size else float('nan')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /predict against serve.py')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--threads', type=int, default=None, help='Threads per worker (default: config)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    parser.add_argument('--clients', type=int, default=4, help='Client processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='Connections per client process')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--path', default='/predict')
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    rows = []
+
+    for workers in args.workers:
+        cmd = [sys.executable, os.path.join(ROOT, 'serve.py'), '--host', host,
+               '--port', str(args.port), '--workers', str(workers)]
+        if args.threads:
+            cmd += ['--threads', str(args.threads)]
+        server = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_server(host, args.port):
+                print(f"[ERROR] Server with {workers} workers did not start")
+                continue
+            result = run_load(host, args.port, args.path, args.duration, args.clients, args.concurrency)
+            rows.append((workers, result))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    print("=" * 72)
+    print(f"Load test: POST {args.path}, {args.clients} clients x {args.concurrency} connections, "
+          f"{args.duration:.0f}s per run")
+    print("=" * 72)
+    print(f"{'workers':>8} {'requests':>10} {'errors':>8} {'req/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for workers, result in rows:
+        print(f"{workers:>8} {result['requests']:>10} {result['errors']:>8} {result['rps']:>10.1f} "
+              f"{result['p50_ms']:>10.2f} {result['p99_ms']:>10.2f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+"""
+Reproducible Benchmark Suite
+
+Measures the numbers that matter for training and serving:
+
+- load:    predictor construction time per engine, in a fresh process
+- startup: API worker boot (``import app`` + model load) per engine in a fresh
+           interpreter, its module count, and ``python -X importtime`` totals
+- predict: single-row ``predict`` latency (p50/p99) per engine
+- batch:   ``predict_batch`` throughput across batch sizes
+- serialize: response bytes and JSON encode time of a 10k-row /predict-batch
+           body, full vs ``fields=`` vs ``compact``, per available JSON backend
+- wire:    end-to-end ``/predict-batch`` throughput through the Flask test
+           client for JSON, compact JSON and the binary columnar format,
+           including client-side encoding and decoding
+- rss:     peak resident memory of a fresh process that loads the model and
+           scores the largest batch
+- shared:  total RSS and PSS of 8 and 32 worker processes whose forest is a
+           private copy, a mapped bundle file, or a shared memory segment
+           (see bench_shared_memory.py)
+- http:    end-to-end ``POST /predict`` latency against app.py, served by
+           serve.py with one worker
+- train:   ``scripts/train.py`` wall time on synthetic datasets scaled to
+           10x/100x/1000x the bundled dataset
+
+Every metric is written as one flat entry to a JSON file, together with the
+commit, interpreter and library versions, so two runs can be compared with
+``benchmarks/compare.py``. Inputs are seeded: repeated runs on the same
+machine score the same rows.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--suites load startup predict batch serialize wire rss shared http train]
+                                        [--train-scales 10 100 1000] [--output results.json]
+    python benchmarks/compare.py baseline.json results.json [--threshold 0.10]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import bench_shared_memory
+from load_test import FEATURES, RICE, ROOT, wait_for_server
+
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, ROOT)
+
+import config
+
+RESULTS_PATH = os.path.join(ROOT, 'benchmarks', 'results')
+
+SUITES = ['load', 'startup', 'predict', 'batch', 'serialize', 'wire', 'rss', 'shared', 'http', 'train']
+ENGINES = ['sklearn', 'compiled']
+
+DEFAULT_BATCH_SIZES = [1, 100, 10000, 100000]
+
+# Body of the startup suite's child process: boot an API worker with the given engine
+STARTUP_SCRIPT = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import config
+config.MODEL_ENGINE = sys.argv[1]
+import app
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    app.initialize_predictor()
+print(json.dumps({'import_seconds': imported - start, 'boot_seconds': time.perf_counter() - start,
+                  'modules': len(sys.modules), 'sklearn': 'sklearn' in sys.modules}))
+"""
+DEFAULT_TRAIN_SCALES = [10, 100, 1000]
+
+
+def git_commit():
+    """Short hash of HEAD (suffixed with '-dirty' for uncommitted changes), or None."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def environment():
+    """Machine and library details recorded with every run."""
+    import sklearn
+    return {
+        'commit': git_commit(),
+        'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def metric(value, unit, better='lower'):
+    """One result entry; ``better`` tells compare.py which direction is a regression."""
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def make_features(n_rows, seed=config.RANDOM_STATE):
+    """``n_rows`` jittered copies of the dataset's feature rows, clipped to ``config.FEATURE_RANGES``."""
+    crop = pd.read_csv(config.DATASET_FILE)
+    features = crop[config.FEATURES].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(features), size=n_rows)
+    jittered = features[idx] * rng.normal(1.0, 0.02, size=(n_rows, features.shape[1]))
+    low, high = zip(*(config.FEATURE_RANGES[name] for name in config.FEATURES))
+    return np.clip(jittered, low, high)
+
+
+def scale_dataset(scale, path, seed=config.RANDOM_STATE):
+    """
+    Write a synthetic dataset with ``scale`` times as many rows as the bundled one.
+
+    Rows come from the per-crop distributions of ``scripts/generate_data.py``.
+
+    Returns:
+    --------
+    int : Rows written
+    """
+    from generate_data import CropFeatureModel, write_shard
+
+    crop = pd.read_csv(config.DATASET_FILE)
+    return write_shard(CropFeatureModel.fit(crop), path, len(crop) * scale, seed)
+
+
+def percentiles(timings):
+    """p50 and p99 of a list of durations, in milliseconds."""
+    timings = np.asarray(timings) * 1e3
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def bench_predict(n_calls=500):
+    """Single-row ``predict`` latency per engine."""
+    from predict import CropRecommendationPredictor
+
+    rows = [dict(zip(config.FEATURES, row)) for row in make_features(n_calls).tolist()]
+    results = {}
+    for engine in ENGINES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor = CropRecommendationPredictor(engine=engine)
+        predictor.predict(**rows[0])
+        timings = []
+        for row in rows:
+            start = time.perf_counter()
+            predictor.predict(**row)
+            timings.append(time.perf_counter() - start)
+        p50, p99 = percentiles(timings)
+        results[f'predict.{engine}.p50_ms'] = metric(p50, 'ms')
+        results[f'predict.{engine}.p99_ms'] = metric(p99, 'ms')
+    return results
+
+
+def bench_batch(sizes=DEFAULT_BATCH_SIZES):
+    """``predict_batch`` rows/second per engine and batch size (best of a few runs)."""
+    from predict import CropRecommendationPredictor
+
+    results = {}
+    for engine in ENGINES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor = CropRecommendationPredictor(engine=engine)
+        for n_rows in sizes:
+            rows = [dict(zip(config.FEATURES, row)) for row in make_features(n_rows).tolist()]
+            best = float('inf')
+            for _ in range(5 if n_rows <= 10000 else 2):
+                start = time.perf_counter()
+                predictor.predict_batch(rows)
+                best = min(best, time.perf_counter() - start)
+            results[f'batch.{engine}.{n_rows}.rows_per_s'] = metric(n_rows / best, 'rows/s', 'higher')
+    return results
+
+
+def bench_serialize(n_rows=10000):
+    """Encoded size and best-of-5 encode time of batch responses, per layout and JSON backend."""
+    import serialization
+    from predict import CropRecommendationPredictor
+    from validation import validate_records
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = CropRecommendationPredictor(engine='compiled')
+    rows = [dict(zip(config.FEATURES, row)) for row in make_features(n_rows).tolist()]
+    validation = validate_records(rows)
+    bodies = {
+        'full': {'success': True, 'predictions': predictor.predict_validated(validation)},
+        'fields': {'success': True, 'predictions': predictor.predict_validated(
+            validation, fields=['crop', 'confidence'])},
+        'compact': {'success': True, **predictor.predict_columns(validation)}
+    }
+
+    backends = ['json']
+    if serialization.resolve_backend('auto') == 'orjson':
+        backends.append('orjson')
+
+    results = {}
+    for layout, body in bodies.items():
+        results[f'serialize.{layout}.{n_rows}.bytes'] = metric(len(serialization.dumps(body)), 'bytes')
+        for backend in backends:
+            best = float('inf')
+            for _ in range(5):
+                start = time.perf_counter()
+                serialization.dumps(body, backend)
+                best = min(best, time.perf_counter() - start)
+            results[f'serialize.{backend}.{layout}.{n_rows}.ms'] = metric(best * 1000, 'ms')
+    return results
+
+
+def bench_wire(sizes=(10000, 100000)):
+    """
+    ``POST /predict-batch`` rows/second and body sizes for JSON, compact JSON and binary.
+
+    Each round trip starts from a feature matrix and ends with the crop ids
+    on the client, so encoding, parsing and decoding are all counted.
+    """
+    import binary_batch
+    import serialization
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as flask_app
+        flask_app.initialize_predictor()
+    client = flask_app.app.test_client()
+    backend = serialization.resolve_backend()
+
+    def json_round_trip(features, compact):
+        rows = [dict(zip(config.FEATURES, row)) for row in features.tolist()]
+        body = serialization.dumps({'data': rows, 'compact': compact}, backend)
+        response = client.post('/predict-batch', data=body, content_type='application/json')
+        payload = json.loads(response.data)
+        ids = payload['ids'] if compact else [p['crop_id'] for p in payload['predictions']]
+        return len(body), len(response.data), np.asarray(ids)
+
+    def binary_round_trip(features):
+        body = binary_batch.encode_features(features)
+        response = client.post('/predict-batch', data=body, content_type=binary_batch.FEATURES_MIMETYPE,
+                               headers={'Accept': binary_batch.PREDICTIONS_MIMETYPE})
+        return len(body), len(response.data), binary_batch.decode_predictions(response.data)['ids']
+
+    formats = {
+        'json': lambda features: json_round_trip(features, False),
+        'compact': lambda features: json_round_trip(features, True),
+        'binary': binary_round_trip
+    }
+    results = {}
+    for n_rows in sizes:
+        features = make_features(n_rows)
+        for name, round_trip in formats.items():
+            best = float('inf')
+            for _ in range(3 if n_rows <= 10000 else 1):
+                start = time.perf_counter()
+                request_bytes, response_bytes, _ = round_trip(features)
+                best = min(best, time.perf_counter() - start)
+            results[f'wire.{name}.{n_rows}.rows_per_s'] = metric(n_rows / best, 'rows/s', 'higher')
+            results[f'wire.{name}.{n_rows}.request_bytes'] = metric(request_bytes, 'bytes')
+            results[f'wire.{name}.{n_rows}.response_bytes'] = metric(response_bytes, 'bytes')
+    return results
+
+
+def probe(engine, n_rows):
+    """
+    Body of the ``--probe`` child process.
+
+    Times the predictor load, scores ``n_rows`` rows and prints the load time
+    and peak RSS (bytes) as JSON.
+    """
+    from predict import CropRecommendationPredictor
+
+    rows = [dict(zip(config.FEATURES, row)) for row in make_features(n_rows).tolist()]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        predictor = CropRecommendationPredictor(engine=engine)
+        load_seconds = time.perf_counter() - start
+        if rows:
+            predictor.predict_batch(rows)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    print(json.dumps({'load_seconds': load_seconds,
+                      'peak_rss_bytes': peak if sys.platform == 'darwin' else peak * 1024}))
+
+
+def run_probe(engine, n_rows):
+    """Run ``probe`` in a fresh interpreter, so earlier suites do not warm or inflate it."""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe', engine,
+                             '--probe-rows', str(n_rows)],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def parse_importtime(stderr, depth=0):
+    """Cumulative import time (ms) per module at one nesting ``depth`` of ``python -X importtime`` output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if (len(name) - len(name.lstrip()) - 1) // 2 == depth:
+            totals[name.strip()] = int(cumulative) / 1000
+    return totals
+
+
+def bench_startup(repeat=5):
+    """
+    Fresh-process API worker boot time per engine (best of ``repeat``).
+
+    Boot is ``import app`` plus loading the model, as each serve.py worker or
+    ASGI process does before its first request.
+    """
+    results = {}
+    for engine in ENGINES:
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, engine], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        results[f'startup.{engine}.boot_seconds'] = metric(min(run['boot_seconds'] for run in runs), 's')
+        results[f'startup.{engine}.modules'] = metric(runs[0]['modules'], 'modules')
+
+    importtime = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stderr
+    results['startup.importtime.app_ms'] = metric(parse_importtime(importtime).get('app', 0.0), 'ms')
+    # What ``import app`` spends its time on
+    for name, ms in sorted(parse_importtime(importtime, depth=1).items(), key=lambda item: -item[1])[:5]:
+        print(f"     import {name:<20} {ms:8.1f} ms")
+    return results
+
+
+def bench_load(repeat=3):
+    """Predictor construction time per engine in a fresh process (median of ``repeat``)."""
+    results = {}
+    for engine in ENGINES:
+        timings = [run_probe(engine, 0)['load_seconds'] for _ in range(repeat)]
+        results[f'load.{engine}.seconds'] = metric(np.median(timings), 's')
+    return results
+
+
+def bench_rss(n_rows=max(DEFAULT_BATCH_SIZES)):
+    """Peak RSS per engine of a fresh process that loads the model and scores ``n_rows`` rows."""
+    results = {}
+    for engine in ENGINES:
+        peak = run_probe(engine, n_rows)['peak_rss_bytes']
+        results[f'rss.{engine}.peak_mb'] = metric(peak / 2 ** 20, 'MB')
+    return results
+
+
+def bench_shared(worker_counts=bench_shared_memory.DEFAULT_WORKER_COUNTS):
+    """Total memory of concurrent workers per way of holding the forest (see bench_shared_memory.py)."""
+    report = bench_shared_memory.run(worker_counts)
+    results = {'shared.forest_mb': metric(report['forest_bytes'] / 2 ** 20, 'MB')}
+    for (mode, n_workers), totals in report['results'].items():
+        results[f'shared.{mode}.{n_workers}.rss_mb'] = metric(totals['rss'] / 2 ** 20, 'MB')
+        results[f'shared.{mode}.{n_workers}.pss_mb'] = metric(totals['pss'] / 2 ** 20, 'MB')
+    return results
+
+
+def bench_http(n_requests=1000, port=5097):
+    """Sequential keep-alive ``POST /predict`` latency against one serve.py worker."""
+    host = '127.0.0.1'
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--host', host, '--port', str(port),
+         '--workers', '1'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_server(host, port):
+            raise RuntimeError('serve.py did not start')
+
+        # Randomized payloads so the result cache does not answer every request
+        rng = np.random.default_rng(config.RANDOM_STATE)
+        values = np.array(RICE) * rng.normal(1.0, 0.05, size=(n_requests, len(RICE)))
+        bodies = [json.dumps(dict(zip(FEATURES, row))) for row in values.round(2).tolist()]
+
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        timings = []
+        for body in bodies:
+            start = time.perf_counter()
+            conn.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            timings.append(time.perf_counter() - start)
+            if response.status != 200:
+                raise RuntimeError(f'/predict returned {response.status}')
+        conn.close()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    p50, p99 = percentiles(timings)
+    return {
+        'http.predict.p50_ms': metric(p50, 'ms'),
+        'http.predict.p99_ms': metric(p99, 'ms'),
+        'http.predict.requests_per_s': metric(len(timings) / sum(timings), 'req/s', 'higher')
+    }
+
+
+def bench_train(scales=DEFAULT_TRAIN_SCALES):
+    """``scripts/train.py`` wall time on scaled synthetic datasets (written to a temp dir)."""
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='crop_bench_')
+    try:
+        for scale in scales:
+            data_path = os.path.join(work_dir, f'crop_x{scale}.csv')
+            n_rows = scale_dataset(scale, data_path)
+            output_dir = os.path.join(work_dir, f'models_x{scale}')
+
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT, 'scripts', 'train.py'),
+                            '--data', data_path, '--output-dir', output_dir],
+                           cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+            elapsed = time.perf_counter() - start
+
+            results[f'train.x{scale}.seconds'] = metric(elapsed, 's')
+            results[f'train.x{scale}.rows_per_s'] = metric(n_rows / elapsed, 'rows/s', 'higher')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def run_suite(suites=SUITES, batch_sizes=DEFAULT_BATCH_SIZES, train_scales=DEFAULT_TRAIN_SCALES):
+    """
+    Run the selected benchmarks.
+
+    Parameters:
+    -----------
+    suites : list of str
+        Any of ``SUITES``
+    batch_sizes : list of int
+        Batch sizes for the batch suite; the largest is used for the RSS probe
+    train_scales : list of int
+        Dataset multipliers for the train suite
+
+    Returns:
+    --------
+    dict : ``{'environment': {...}, 'results': {name: metric}}``
+    """
+    runners = {
+        'load': bench_load,
+        'startup': bench_startup,
+        'predict': bench_predict,
+        'batch': lambda: bench_batch(batch_sizes),
+        'serialize': bench_serialize,
+        'wire': bench_wire,
+        'rss': lambda: bench_rss(max(batch_sizes)),
+        'shared': bench_shared,
+        'http': bench_http,
+        'train': lambda: bench_train(train_scales)
+    }
+    results = {}
+    for suite in suites:
+        print(f"[..] {suite}")
+        start = time.perf_counter()
+        results.update(runners[suite]())
+        print(f"[OK] {suite} ({time.perf_counter() - start:.1f}s)")
+    return {'environment': environment(), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the training and inference benchmark suite')
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--train-scales', type=int, nargs='+', default=DEFAULT_TRAIN_SCALES,
+                        help='Synthetic dataset sizes, as multiples of the bundled dataset')
+    parser.add_argument('--output', default=None,
+                        help='Results JSON (default: benchmarks/results/<timestamp>_<commit>.json)')
+    parser.add_argument('--probe', choices=ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument('--probe-rows', type=int, default=max(DEFAULT_BATCH_SIZES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.probe_rows)
+        return
+
+    print("=" * 72)
+    print("Crop Recommendation Benchmark Suite")
+    print("=" * 72)
+
+    report = run_suite(args.suites, args.batch_sizes, args.train_scales)
+
+    output = args.output
+    if output is None:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_PATH, f"{stamp}_{report['environment']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print("=" * 72)
+    for name, entry in sorted(report['results'].items()):
+        print(f"{name:<40} {entry['value']:>14.4f} {entry['unit']}")
+    print("=" * 72)
+    print(f"[OK] Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
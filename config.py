@@ -13,12 +13,18 @@ SCRIPTS_PATH = os.path.join(PROJECT_ROOT, 'scripts')
 # Data file
 DATASET_FILE = os.path.join(DATA_PATH, 'Crop_recommendation.csv')
 
+# Columnar cache of parsed training data (scripts/dataset.py)
+DATASET_CACHE_PATH = os.path.join(DATA_PATH, 'cache')
+DATASET_CHUNK_ROWS = 100000
+
 # Model files
 MODEL_FILE = os.path.join(MODELS_PATH, 'crop_recommendation_model.pkl')
 MINMAX_SCALER_FILE = os.path.join(MODELS_PATH, 'minmax_scaler.pkl')
 STANDARD_SCALER_FILE = os.path.join(MODELS_PATH, 'standard_scaler.pkl')
+FUSED_SCALER_FILE = os.path.join(MODELS_PATH, 'fused_scaler.pkl')
 CROP_MAPPING_FILE = os.path.join(MODELS_PATH, 'crop_mapping.pkl')
 FEATURE_NAMES_FILE = os.path.join(MODELS_PATH, 'feature_names.pkl')
+MODEL_BUNDLE_FILE = os.path.join(MODELS_PATH, 'crop_model.bundle')
 
 # Model hyperparameters
 MODEL_PARAMS = {
@@ -33,11 +39,107 @@ MODEL_PARAMS = {
 TEST_SIZE = 0.2
 RANDOM_STATE = 42
 
+# Hyperparameter search (python scripts/train.py --search)
+SEARCH_SPACE = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [8, 12, 20, None],
+    'min_samples_leaf': [1, 2],
+    'max_features': ['sqrt', 0.5]
+}
+CV_FOLDS = 5
+# Candidates within this much mean CV accuracy of the best one are
+# considered equivalent; the smallest and fastest of them is selected
+SEARCH_ACCURACY_TOLERANCE = 0.005
+
+# Post-training compression (python scripts/compress.py)
+COMPRESSION_DEPTHS = [8, 12]
+# Greedy tree selection stops once validation accuracy is within this much of
+# the full forest and at least COMPRESSION_MIN_TREES trees are kept
+COMPRESSION_ACCURACY_TOLERANCE = 0.005
+COMPRESSION_MIN_TREES = 10
+# Student forest trained on teacher-labelled, jittered copies of the training rows
+COMPRESSION_DISTILL_PARAMS = {
+    'n_estimators': 10,
+    'max_depth': 12,
+    'min_samples_leaf': 2
+}
+COMPRESSION_DISTILL_SAMPLES = 50000
+COMPRESSION_DISTILL_NOISE = 0.1
+# Out-of-core bundles: the hashed train and test splits are streamed from the
+# columnar cache and sampled down to at most about this many rows each
+COMPRESSION_MAX_ROWS = 200000
+
+# Incremental retraining (python scripts/incremental.py)
+INCREMENTAL_PATH = os.path.join(MODELS_PATH, 'incremental')
+INCREMENTAL_TREES_PER_SEGMENT = 20
+# Sliding window: the oldest tree groups are retired beyond this many trees
+# (None keeps every tree)
+INCREMENTAL_MAX_TREES = 100
+
+# Out-of-core training (python scripts/train.py --out-of-core). The forest's
+# MODEL_PARAMS['n_estimators'] trees are fitted as members of this many trees,
+# each on a bootstrap sample of at most OUT_OF_CORE_MEMBER_ROWS training rows
+OUT_OF_CORE_TREES_PER_MEMBER = 10
+OUT_OF_CORE_MEMBER_ROWS = 250000
+
+# Precomputed decision grid (python scripts/decision_grid.py): the forest's
+# answer at every point of a quantized grid over FEATURE_RANGES, stored as
+# uint8 crop ids and float16 confidences for O(1) lookups of coarse inputs.
+# Feature -> grid step; builds with more than DECISION_GRID_MAX_CELLS points
+# are refused
+DECISION_GRID_FILE = os.path.join(MODELS_PATH, 'decision_grid.npz')
+DECISION_GRID_STEPS = {
+    'N': 25,
+    'P': 25,
+    'K': 25,
+    'temperature': 2.5,
+    'humidity': 10,
+    'ph': 0.5,
+    'rainfall': 50
+}
+DECISION_GRID_MAX_CELLS = 50000000
+
+# Synthetic data generator (python scripts/generate_data.py)
+GENERATOR_SHARD_ROWS = 1000000
+GENERATOR_CHUNK_ROWS = 100000
+
 # API configuration
 API_HOST = '0.0.0.0'
 API_PORT = 5000
 API_DEBUG = False
 
+# Inference engine used by the API: 'sklearn' or 'compiled' (see scripts/predict.py).
+# 'compiled' loads models/crop_model.bundle without importing scikit-learn,
+# which keeps worker startup short
+MODEL_ENGINE = 'compiled'
+# Compressed model variant served by the compiled engine (see scripts/compress.py),
+# e.g. 'prune_d12'; None serves the full model
+MODEL_VARIANT = None
+
+# Versioned model registry (scripts/registry.py). When it has a current
+# version, the API serves that bundle with the compiled engine and swaps in
+# newly activated versions without a restart
+REGISTRY_ENABLED = True
+MODEL_REGISTRY_PATH = os.path.join(MODELS_PATH, 'registry')
+REGISTRY_POLL_SECONDS = 2.0
+
+# Production server (serve.py)
+SERVER_WORKERS = 4
+SERVER_THREADS = 8
+SERVER_GRACEFUL_TIMEOUT = 30
+# Publish the flattened forest in one shared memory segment that every worker
+# maps read-only, instead of each process holding its own copy
+# (scripts/shared_model.py, serve.py --shared-model)
+SHARED_MEMORY_MODEL = False
+
+# Streaming bulk scoring (/predict-stream)
+STREAM_CHUNK_ROWS = 1000
+STREAM_MAX_CHUNK_ROWS = 50000
+
+# Micro-batching of concurrent /predict requests (asgi_app.py)
+MICROBATCH_MAX_SIZE = 64
+MICROBATCH_MAX_DELAY_MS = 5
+
 # Supported crops
 CROPS = {
     'rice': 1,
@@ -78,6 +180,40 @@ FEATURE_RANGES = {
     'rainfall': (50, 500)
 }
 
+# Input validation (scripts/validation.py). Values outside FEATURE_RANGES are
+# rejected when VALIDATE_RANGES is on. VALIDATION_MODE is the default for
+# /predict-batch: 'reject' fails the request if any row is invalid, 'skip'
+# scores the valid rows and reports errors for the rest
+VALIDATE_RANGES = True
+VALIDATION_MODE = 'reject'
+
+# Ranked alternatives returned by /predict
+DEFAULT_TOP_K = 3
+
+# JSON encoder for API responses (scripts/serialization.py): 'auto' uses
+# orjson when installed and falls back to the standard library, 'orjson'
+# requires it, 'json' always uses the standard library
+JSON_BACKEND = 'auto'
+
+# Prediction cache (in front of /predict)
+CACHE_ENABLED = True
+CACHE_MAX_ENTRIES = 10000
+CACHE_TTL_SECONDS = 300
+# Inputs are bucketed as round(value / step) before lookup
+CACHE_QUANTIZATION = {
+    'N': 1,
+    'P': 1,
+    'K': 1,
+    'temperature': 0.1,
+    'humidity': 0.1,
+    'ph': 0.01,
+    'rainfall': 0.1
+}
+
+# Per-stage timing histograms exposed at /metrics (Prometheus text format).
+# When disabled, instrumented code only pays a no-op call per stage
+METRICS_ENABLED = True
+
 # Logging configuration
 LOGGING_CONFIG = {
     'version': 1,
@@ -0,0 +1,207 @@
+"""
+Binary Columnar Batch Format
+
+A compact alternative to JSON for ``/predict-batch``. The request body is one
+raw little-endian float32 (n, n_features) matrix, in ``config.FEATURES``
+column order, after a 16-byte header. The server reads it as a zero-copy
+``np.frombuffer`` view. The response is columnar: one contiguous little-endian
+array per output, after a header of the same size.
+
+Every field is 4 bytes wide, so each array starts 4-byte aligned.
+
+Request  (Content-Type: application/x-crop-features):
+    header   '<4sHHII'   magic b'CRPF', version, n_features, n_rows, reserved
+    features float32     (n_rows, n_features), row-major
+
+Response (Accept: application/x-crop-predictions):
+    header   '<4sHHII'   magic b'CRPP', version, top_k (0 = none), n_rows, flags
+    rows     uint32      (n_rows,) input row of each prediction, if flags & FLAG_ROWS
+    ids      int32       (n_rows,) crop ids (names from GET /crops)
+    conf     float32     (n_rows,) confidence, percent
+    alt_ids  int32       (n_rows, top_k) ranked crop ids, if top_k
+    alt_conf float32     (n_rows, top_k) ranked confidences, if top_k
+
+Options that JSON requests put in the body (``top_k``, ``on_error``) go in
+the query string. ``post_batch`` is a small client for the format.
+
+Usage:
+    from binary_batch import post_batch
+    result = post_batch('http://localhost:5000/predict-batch', features, top_k=3)
+    result['ids'], result['confidences']
+"""
+
+import struct
+
+import numpy as np
+
+FEATURES_MIMETYPE = 'application/x-crop-features'
+PREDICTIONS_MIMETYPE = 'application/x-crop-predictions'
+
+HEADER = struct.Struct('<4sHHII')
+FEATURES_MAGIC = b'CRPF'
+PREDICTIONS_MAGIC = b'CRPP'
+VERSION = 1
+
+# Response flag: a uint32 column of input row indices precedes the ids
+FLAG_ROWS = 1
+
+FEATURE_DTYPE = np.dtype('<f4')
+ID_DTYPE = np.dtype('<i4')
+ROW_DTYPE = np.dtype('<u4')
+
+
+def encode_features(features):
+    """
+    Encode an (n, n_features) matrix as a request body.
+
+    Returns:
+    --------
+    bytes : Header followed by the float32 matrix
+    """
+    features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+    if features.ndim != 2:
+        raise ValueError(f"Expected a 2-D feature matrix, got shape {features.shape}")
+    n_rows, n_features = features.shape
+    return HEADER.pack(FEATURES_MAGIC, VERSION, n_features, n_rows, 0) + features.tobytes()
+
+
+def decode_features(body, n_features):
+    """
+    View a request body as an (n, n_features) float32 matrix, without copying.
+
+    Parameters:
+    -----------
+    body : bytes-like
+        Request body
+    n_features : int
+        Features the model expects
+
+    Returns:
+    --------
+    np.ndarray : Read-only float32 view of ``body``
+
+    Raises:
+    -------
+    ValueError : If the header or the body size does not match
+    """
+    if len(body) < HEADER.size:
+        raise ValueError(f"Binary body is shorter than its {HEADER.size}-byte header")
+    magic, version, body_features, n_rows, _ = HEADER.unpack_from(body)
+    if magic != FEATURES_MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} {FEATURES_MIMETYPE} body")
+    if body_features != n_features:
+        raise ValueError(f"Expected {n_features} features per row, got {body_features}")
+    expected = HEADER.size + n_rows * n_features * FEATURE_DTYPE.itemsize
+    if len(body) != expected:
+        raise ValueError(f"Binary body is {len(body)} bytes; {n_rows} rows need {expected}")
+    return np.frombuffer(body, dtype=FEATURE_DTYPE, count=n_rows * n_features,
+                         offset=HEADER.size).reshape(n_rows, n_features)
+
+
+def encode_predictions(arrays, rows=None):
+    """
+    Encode ``CropRecommendationPredictor.predict_arrays`` output as a response body.
+
+    Parameters:
+    -----------
+    arrays : dict
+        'ids', 'confidences' and optionally 'alternatives'
+    rows : np.ndarray, optional
+        Input row index of each prediction (sent when some rows were skipped)
+
+    Returns:
+    --------
+    bytes : Header followed by the columns
+    """
+    n_rows = len(arrays['ids'])
+    alternatives = arrays.get('alternatives')
+    top_k = alternatives['ids'].shape[1] if alternatives is not None else 0
+    flags = FLAG_ROWS if rows is not None else 0
+
+    parts = [HEADER.pack(PREDICTIONS_MAGIC, VERSION, top_k, n_rows, flags)]
+    if rows is not None:
+        parts.append(np.asarray(rows, dtype=ROW_DTYPE).tobytes())
+    parts.append(np.asarray(arrays['ids'], dtype=ID_DTYPE).tobytes())
+    parts.append(np.asarray(arrays['confidences'], dtype=FEATURE_DTYPE).tobytes())
+    if top_k:
+        parts.append(np.ascontiguousarray(alternatives['ids'], dtype=ID_DTYPE).tobytes())
+        parts.append(np.ascontiguousarray(alternatives['confidences'], dtype=FEATURE_DTYPE).tobytes())
+    return b''.join(parts)
+
+
+def decode_predictions(body):
+    """
+    Decode a response body into NumPy arrays (views of ``body``).
+
+    Returns:
+    --------
+    dict : 'ids', 'confidences', plus 'rows' when present and 'alternatives'
+        ({'ids', 'confidences'}, each (n, top_k)) when top_k was requested
+    """
+    magic, version, top_k, n_rows, flags = HEADER.unpack_from(body)
+    if magic != PREDICTIONS_MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} {PREDICTIONS_MIMETYPE} body")
+
+    offset = HEADER.size
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+        offset += count * dtype.itemsize
+        return array
+
+    result = {}
+    if flags & FLAG_ROWS:
+        result['rows'] = take(ROW_DTYPE, n_rows)
+    result['ids'] = take(ID_DTYPE, n_rows)
+    result['confidences'] = take(FEATURE_DTYPE, n_rows)
+    if top_k:
+        result['alternatives'] = {
+            'ids': take(ID_DTYPE, n_rows * top_k).reshape(n_rows, top_k),
+            'confidences': take(FEATURE_DTYPE, n_rows * top_k).reshape(n_rows, top_k)
+        }
+    return result
+
+
+def post_batch(url, features, top_k=None, on_error=None, timeout=60):
+    """
+    Score a feature matrix against ``/predict-batch`` using the binary format.
+
+    Parameters:
+    -----------
+    url : str
+        Full ``/predict-batch`` URL
+    features : array-like
+        (n, 7) matrix in ``config.FEATURES`` column order
+    top_k : int, optional
+        Ranked alternatives per row
+    on_error : str, optional
+        'reject' or 'skip' (server default when omitted)
+    timeout : float
+        Socket timeout in seconds
+
+    Returns:
+    --------
+    dict : ``decode_predictions`` output
+
+    Raises:
+    -------
+    RuntimeError : With the server's error message on a non-200 response
+    """
+    # Client-only: keeps urllib's HTTP/SSL stack out of the server's imports
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+
+    query = {key: value for key, value in (('top_k', top_k), ('on_error', on_error)) if value is not None}
+    if query:
+        url = f"{url}?{urllib.parse.urlencode(query)}"
+    request = urllib.request.Request(url, data=encode_features(features), method='POST', headers={
+        'Content-Type': FEATURES_MIMETYPE,
+        'Accept': PREDICTIONS_MIMETYPE
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return decode_predictions(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"{url} returned {e.code}: {e.read().decode('utf-8', 'replace')}")
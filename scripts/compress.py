@@ -0,0 +1,273 @@
+"""
+Post-Training Model Compression
+
+Builds smaller variants of the trained forest and writes each one as a model
+bundle under models/compressed/, together with a report of held-out accuracy
+(and its delta to the full forest), bytes on disk and per-row latency:
+
+- select:         greedy forward selection of trees on validation accuracy
+- prune_d<D>:     depth capped at D, then subtrees that agree on a class merged
+- select_prune_d<D>: tree selection applied to the pruned forest
+- distill:        a small student forest trained on teacher-labelled, jittered
+                  copies of the training rows
+
+The held-out rows are the test split the bundle was trained with: the
+bundle's 'split' metadata names the data source and the method (train.py's
+random split, or the hashed split of out-of-core training), and the data is
+reloaded through dataset.py. Tree selection is tuned on a validation split
+carved out of the training rows, so the test rows only ever score variants.
+Bundles without split metadata fall back to train.py's random split of
+config.DATASET_FILE.
+
+Out-of-core bundles are compressed from a hashed sample of at most about
+config.COMPRESSION_MAX_ROWS training rows and as many test rows, streamed
+from the columnar cache, so datasets larger than memory can be compressed.
+
+Any variant can be served with
+``CropRecommendationPredictor(engine='compiled', variant='prune_d12')``.
+
+Usage:
+    python scripts/compress.py [--depths 8 12] [--no-select] [--no-distill]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import load_dataset
+from model_bundle import load_bundle, write_bundle
+from predict import BUNDLE_FILE, COMPRESSED_PATH, MODELS_PATH
+from tree_engine import FlattenedForest
+
+REPORT_FILE = 'report.csv'
+
+# Rows timed one at a time, and rows per batch, for the latency columns
+LATENCY_ROWS = 200
+BATCH_ROWS = 10000
+
+
+def load_splits(bundle, max_rows=config.COMPRESSION_MAX_ROWS):
+    """
+    Rebuild the train/test split the bundle was trained with, scaled with its scaler.
+
+    A random split (train.py) is rebuilt in memory, like the training run did.
+    A hashed split (out-of-core training) is streamed from the columnar cache
+    chunk by chunk, keeping a hashed sample of at most about ``max_rows`` rows
+    per side, so memory does not grow with the dataset.
+
+    Returns:
+    --------
+    tuple : (X_train, X_test, y_train, y_test) with crop ids as labels
+    """
+    split = bundle.metadata.get('split') or {'method': 'random', 'source': config.DATASET_FILE}
+    test_size = split.get('test_size', config.TEST_SIZE)
+    seed = split.get('seed', config.RANDOM_STATE)
+    if split['method'] not in ('random', 'hash'):
+        raise ValueError(f"Unknown split method in bundle metadata: {split['method']!r}")
+
+    dataset = load_dataset(split['source'])
+    columns = [dataset.feature_names.index(name) for name in bundle.feature_names]
+
+    if split['method'] == 'random':
+        X = dataset.features()[:, columns] * bundle.scale + bundle.offset
+        y = np.asarray(dataset.labels, dtype=np.int64)
+        return train_test_split(X, y, test_size=test_size, random_state=seed)
+
+    # Imported here: out_of_core pulls in the process pool machinery
+    from out_of_core import hash_split
+    keep_train = min(max_rows / max(dataset.rows * (1 - test_size), 1), 1.0)
+    keep_test = min(max_rows / max(dataset.rows * test_size, 1), 1.0)
+    parts = {'train': ([], []), 'test': ([], [])}
+    start = 0
+    for features, labels in dataset.iter_chunks():
+        row_ids = np.arange(start, start + len(labels))
+        start += len(labels)
+        test = hash_split(row_ids, test_size, seed)
+        sampled_train = hash_split(row_ids, keep_train, seed + 1)
+        sampled_test = hash_split(row_ids, keep_test, seed + 1)
+        for side, keep in (('train', ~test & sampled_train), ('test', test & sampled_test)):
+            parts[side][0].append(features[keep][:, columns] * bundle.scale + bundle.offset)
+            parts[side][1].append(np.asarray(labels[keep], dtype=np.int64))
+
+    (X_train, y_train), (X_test, y_test) = [
+        (np.vstack(X_parts), np.concatenate(y_parts)) for X_parts, y_parts in parts.values()]
+    return X_train, X_test, y_train, y_test
+
+
+def select_trees(forest, X, y, tolerance=config.COMPRESSION_ACCURACY_TOLERANCE,
+                 min_trees=config.COMPRESSION_MIN_TREES):
+    """
+    Greedily pick trees until the sub-forest matches the full forest.
+
+    Each step adds the tree that maximizes accuracy of the averaged sub-forest
+    on the validation rows ``X``, ``y``, breaking ties on the mean probability given to the true class.
+
+    Returns:
+    --------
+    list of int : Selected tree positions, in the order they were picked
+    """
+    tree_proba = forest.value[forest.apply(X)]                  # (rows, trees, classes)
+    truth = forest.classes[np.newaxis, :] == y[:, np.newaxis]   # (rows, classes)
+    full_accuracy = np.mean(forest.classes[tree_proba.sum(axis=1).argmax(axis=1)] == y)
+    target = full_accuracy - tolerance
+
+    selected = []
+    remaining = list(range(forest.n_trees))
+    total = np.zeros((len(X), len(forest.classes)))
+    while remaining:
+        candidates = total[:, np.newaxis, :] + tree_proba[:, remaining, :]
+        accuracy = np.mean(forest.classes[candidates.argmax(axis=2)] == y[:, np.newaxis], axis=0)
+        true_proba = np.mean(np.sum(candidates * truth[:, np.newaxis, :], axis=2), axis=0)
+        best = int(np.lexsort((-true_proba / (len(selected) + 1), -accuracy))[0])
+
+        total += tree_proba[:, remaining[best], :]
+        selected.append(remaining.pop(best))
+        if accuracy[best] >= target and len(selected) >= min_trees:
+            break
+    return selected
+
+
+def distill(forest, X_train, params=None, n_samples=config.COMPRESSION_DISTILL_SAMPLES,
+            noise=config.COMPRESSION_DISTILL_NOISE, seed=config.RANDOM_STATE):
+    """
+    Train a small student forest to mimic ``forest``.
+
+    The student sees the training rows plus Gaussian-jittered copies of them
+    (``noise`` is in scaled, unit-variance feature space), all labelled with
+    the teacher's prediction.
+
+    Returns:
+    --------
+    FlattenedForest : The flattened student forest
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(X_train), size=max(n_samples - len(X_train), 0))
+    jittered = X_train[picks] + rng.normal(scale=noise, size=(len(picks), X_train.shape[1]))
+    X = np.vstack([X_train, jittered])
+    y = forest.classes[forest.predict_proba(X).argmax(axis=1)]
+
+    student = RandomForestClassifier(**(params or config.COMPRESSION_DISTILL_PARAMS),
+                                     random_state=seed, n_jobs=-1)
+    student.fit(X.astype(np.float32), y)
+    return FlattenedForest.from_sklearn(student)
+
+
+def measure(forest, X_test, y_test):
+    """
+    Held-out accuracy and latency of one forest.
+
+    Returns:
+    --------
+    dict : accuracy, median single-row latency (ms) and batched cost per row (us)
+    """
+    accuracy = float(np.mean(forest.classes[forest.predict_proba(X_test).argmax(axis=1)] == y_test))
+
+    timings = []
+    for i in range(LATENCY_ROWS):
+        row = X_test[i % len(X_test)].reshape(1, -1)
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+
+    batch = np.resize(X_test, (BATCH_ROWS, X_test.shape[1]))
+    start = time.perf_counter()
+    forest.predict_proba(batch)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'accuracy': accuracy,
+        'latency_ms': float(np.median(timings)) * 1000,
+        'batch_us_per_row': batch_seconds / BATCH_ROWS * 1e6
+    }
+
+
+def compress(bundle_path=None, output_dir=COMPRESSED_PATH, depths=None,
+             select=True, distillation=True):
+    """
+    Build, measure and save every compressed variant of a model bundle.
+
+    Parameters:
+    -----------
+    bundle_path : str, optional
+        Source bundle (default models/crop_model.bundle)
+    output_dir : str
+        Directory receiving ``<variant>.bundle`` files and the report
+    depths : list of int, optional
+        Depth caps to prune to (default ``config.COMPRESSION_DEPTHS``)
+    select, distillation : bool
+        Whether to build the tree-selection and distilled variants
+
+    Returns:
+    --------
+    pd.DataFrame : One report row per variant, the full forest first
+    """
+    bundle = load_bundle(bundle_path or os.path.join(MODELS_PATH, BUNDLE_FILE))
+    X_train, X_test, y_train, y_test = load_splits(bundle)
+    depths = config.COMPRESSION_DEPTHS if depths is None else depths
+
+    # Trees are selected on training rows the test split never sees
+    _, X_val, _, y_val = train_test_split(X_train, y_train, test_size=config.TEST_SIZE,
+                                          random_state=config.RANDOM_STATE)
+
+    variants = {'full': bundle.forest}
+    if select:
+        variants['select'] = bundle.forest.select_trees(select_trees(bundle.forest, X_val, y_val))
+    for depth in depths:
+        pruned = bundle.forest.prune(max_depth=depth, merge_leaves=True)
+        variants[f'prune_d{depth}'] = pruned
+        if select:
+            variants[f'select_prune_d{depth}'] = pruned.select_trees(select_trees(pruned, X_val, y_val))
+    if distillation:
+        variants['distill'] = distill(bundle.forest, X_train)
+
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    for name, forest in variants.items():
+        stats = measure(forest, X_test, y_test)
+        path = os.path.join(output_dir, f'{name}.bundle')
+        size = write_bundle(
+            path, forest, bundle.crop_mapping, bundle.feature_names, bundle.scale, bundle.offset,
+            metadata=dict(bundle.metadata, variant=name, holdout_accuracy=stats['accuracy'])
+        )
+        rows.append(dict(variant=name, n_trees=forest.n_trees, n_nodes=forest.n_nodes,
+                         max_depth=forest.max_depth, bytes=size, **stats))
+
+    report = pd.DataFrame(rows)
+    report.insert(report.columns.get_loc('accuracy') + 1, 'accuracy_delta',
+                  report['accuracy'] - report.loc[0, 'accuracy'])
+    report.to_csv(os.path.join(output_dir, REPORT_FILE), index=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build compressed variants of the trained forest')
+    parser.add_argument('--bundle', default=None, help='Source bundle (default: models/crop_model.bundle)')
+    parser.add_argument('--output-dir', default=COMPRESSED_PATH, help='Directory for variant bundles')
+    parser.add_argument('--depths', type=int, nargs='*', default=config.COMPRESSION_DEPTHS,
+                        help='Depth caps to prune to')
+    parser.add_argument('--no-select', action='store_true', help='Skip greedy tree selection')
+    parser.add_argument('--no-distill', action='store_true', help='Skip forest distillation')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Crop Recommendation Model Compression")
+    print("=" * 60)
+
+    report = compress(args.bundle, args.output_dir, args.depths,
+                      select=not args.no_select, distillation=not args.no_distill)
+
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"\n[OK] {len(report)} variants written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
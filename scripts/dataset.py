@@ -0,0 +1,309 @@
+"""
+Columnar Training Data Ingestion
+
+Reads labelled training data with an explicit schema: the ``config.FEATURES``
+columns as float32 and the label as crop-id codes from ``config.CROPS``
+(int8). Unknown crop names and missing values raise ValueError instead of
+becoming NaN.
+
+The source is parsed in chunks, once. The result is cached as a columnar
+store with one ``.npy`` file per column. Later loads memory-map the store
+instead of parsing the CSV again:
+
+    data/cache/<source name>-<hash of source path>/
+        N.npy ... rainfall.npy   # float32, one per feature
+        label.npy                # int8 crop ids
+        meta.json                # row count and source fingerprint (written last)
+
+The store is rebuilt when the source's size or modification time changes.
+Sources can be a CSV file, a Parquet file (requires pyarrow) or a directory of
+``part-*.csv`` / ``part-*.parquet`` shards written by ``generate_data.py``.
+
+Usage:
+    python scripts/dataset.py build [data/Crop_recommendation.csv] [--rebuild]
+    python scripts/dataset.py info [data/Crop_recommendation.csv]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+FEATURE_DTYPE = np.float32
+LABEL_DTYPE = np.int8
+LABEL_COLUMN = 'label'
+META_FILE = 'meta.json'
+
+# Bumped whenever the on-disk layout changes, so older stores are rebuilt
+STORE_VERSION = 1
+
+
+def source_files(source):
+    """The files making up a source: the file itself, or a directory's ``part-*`` shards."""
+    if os.path.isdir(source):
+        files = sorted(glob.glob(os.path.join(source, 'part-*.csv'))
+                       + glob.glob(os.path.join(source, 'part-*.parquet')))
+        if not files:
+            raise FileNotFoundError(f"No part-*.csv or part-*.parquet files in {source}")
+        return files
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Training data not found: {source}")
+    return [source]
+
+
+def source_fingerprint(source):
+    """Path, size and mtime of every source file; a change invalidates the cached store."""
+    return [
+        {'path': os.path.abspath(path), 'bytes': os.path.getsize(path), 'mtime_ns': os.stat(path).st_mtime_ns}
+        for path in source_files(source)
+    ]
+
+
+def encode_labels(names):
+    """
+    Map crop names to crop ids.
+
+    Parameters:
+    -----------
+    names : array-like or categorical pd.Series
+        Crop names; a categorical Series is encoded from its categories alone
+
+    Raises:
+    -------
+    ValueError : If any name is not in ``config.CROPS`` or is missing
+    """
+    names = pd.Series(names).astype('category')
+    categories = names.cat.categories
+    unknown = [str(name) for name in categories if name not in config.CROPS]
+    if unknown:
+        raise ValueError(f"Unknown crop labels: {sorted(unknown)[:10]}")
+    codes = names.cat.codes.to_numpy()
+    if (codes < 0).any():
+        raise ValueError(f"Missing labels in {int((codes < 0).sum())} rows")
+    crop_ids = np.array([config.CROPS[name] for name in categories], dtype=LABEL_DTYPE)
+    return crop_ids[codes]
+
+
+def read_csv_rows(path, skip_rows=0, **kwargs):
+    """
+    ``pd.read_csv`` of a CSV with a header row, starting after ``skip_rows`` data rows.
+
+    The header is read once, then the rows are skipped by line count with an
+    integer ``skiprows``: a range of row numbers would be held by pandas as a
+    set of every skipped row. Other keyword arguments (``usecols``, ``dtype``,
+    ``chunksize``, ...) are passed to ``pd.read_csv``.
+    """
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    return pd.read_csv(path, header=None, names=columns, skiprows=skip_rows + 1, **kwargs)
+
+
+def iter_source_chunks(source, chunk_rows=config.DATASET_CHUNK_ROWS):
+    """
+    Yield typed (features, labels) chunks from a CSV/Parquet file or shard directory.
+
+    Returns:
+    --------
+    Iterator of tuples : ((n, 7) float32 features, (n,) int8 crop ids)
+    """
+    columns = config.FEATURES + [LABEL_COLUMN]
+    dtypes = {name: FEATURE_DTYPE for name in config.FEATURES}
+    dtypes[LABEL_COLUMN] = 'category'
+
+    for path in source_files(source):
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Reading Parquet input requires pyarrow (pip install pyarrow)")
+            frames = (batch.to_pandas() for batch in
+                      pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns))
+        else:
+            frames = pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+
+        for frame in frames:
+            features = frame[config.FEATURES].to_numpy(dtype=FEATURE_DTYPE)
+            if np.isnan(features).any():
+                raise ValueError(f"{path}: missing feature values in "
+                                 f"{int(np.isnan(features).any(axis=1).sum())} rows")
+            try:
+                labels = encode_labels(frame[LABEL_COLUMN])
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}")
+            yield features, labels
+
+
+def build_store(source, store_dir, chunk_rows=config.DATASET_CHUNK_ROWS):
+    """
+    Parse a source once, chunk by chunk, into a columnar ``.npy`` store.
+
+    Columns are streamed to raw temporary files and then given their ``.npy``
+    headers, so memory use is bounded by one chunk whatever the source size.
+    ``meta.json`` is written last: a store without it is incomplete.
+
+    Returns:
+    --------
+    ColumnarDataset : The new store, memory-mapped
+    """
+    fingerprint = source_fingerprint(source)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.makedirs(store_dir)
+
+    columns = config.FEATURES + [LABEL_COLUMN]
+    raw = {name: open(os.path.join(store_dir, f'{name}.raw'), 'wb') for name in columns}
+    rows = 0
+    try:
+        for features, labels in iter_source_chunks(source, chunk_rows):
+            for i, name in enumerate(config.FEATURES):
+                raw[name].write(np.ascontiguousarray(features[:, i]).tobytes())
+            raw[LABEL_COLUMN].write(labels.tobytes())
+            rows += len(labels)
+    finally:
+        for f in raw.values():
+            f.close()
+
+    for name in columns:
+        dtype = LABEL_DTYPE if name == LABEL_COLUMN else FEATURE_DTYPE
+        raw_path = os.path.join(store_dir, f'{name}.raw')
+        with open(os.path.join(store_dir, f'{name}.npy'), 'wb') as out, open(raw_path, 'rb') as f:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                      'fortran_order': False, 'shape': (rows,)})
+            shutil.copyfileobj(f, out, 16 * 2 ** 20)
+        os.remove(raw_path)
+
+    meta = {'version': STORE_VERSION, 'rows': rows, 'features': config.FEATURES,
+            'crops': config.CROPS, 'source': fingerprint}
+    tmp_path = os.path.join(store_dir, f'{META_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, META_FILE))
+    return ColumnarDataset(store_dir)
+
+
+class ColumnarDataset:
+    """
+    A memory-mapped columnar store built by ``build_store``.
+
+    Parameters:
+    -----------
+    store_dir : str
+        Store directory containing ``meta.json`` and one ``.npy`` per column
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta['rows']
+        self.feature_names = self.meta['features']
+        self.columns = {
+            name: np.load(os.path.join(store_dir, f'{name}.npy'), mmap_mode='r')
+            for name in self.feature_names + [LABEL_COLUMN]
+        }
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def labels(self):
+        """(n,) int8 crop ids, memory-mapped."""
+        return self.columns[LABEL_COLUMN]
+
+    def features(self, start=0, stop=None):
+        """(rows, n_features) float32 matrix of rows ``start:stop`` (materialized)."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        out = np.empty((max(stop - start, 0), len(self.feature_names)), dtype=FEATURE_DTYPE)
+        for i, name in enumerate(self.feature_names):
+            out[:, i] = self.columns[name][start:stop]
+        return out
+
+    def iter_chunks(self, chunk_rows=config.DATASET_CHUNK_ROWS):
+        """Yield (features, labels) chunks of up to ``chunk_rows`` rows, in order."""
+        for start in range(0, self.rows, chunk_rows):
+            yield self.features(start, start + chunk_rows), np.asarray(self.labels[start:start + chunk_rows])
+
+
+def store_path(source, cache_dir=config.DATASET_CACHE_PATH):
+    """Cache directory of a source: its name plus a hash of its absolute path."""
+    source = os.path.abspath(source)
+    digest = hashlib.sha1(source.encode()).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(source.rstrip(os.sep)))[0]
+    return os.path.join(cache_dir, f'{name}-{digest}')
+
+
+def is_current(store_dir, source):
+    """Whether a complete store exists for the source as it is now."""
+    try:
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return (meta.get('version') == STORE_VERSION
+            and meta.get('features') == config.FEATURES
+            and meta.get('crops') == config.CROPS
+            and meta.get('source') == source_fingerprint(source))
+
+
+def load_dataset(source=config.DATASET_FILE, cache_dir=config.DATASET_CACHE_PATH,
+                 chunk_rows=config.DATASET_CHUNK_ROWS, rebuild=False):
+    """
+    Load training data through the columnar cache.
+
+    Parameters:
+    -----------
+    source : str
+        CSV/Parquet file or directory of shards
+    cache_dir : str
+        Directory holding cached stores
+    chunk_rows : int
+        Rows parsed at a time when (re)building the store
+    rebuild : bool
+        Rebuild the store even when it is current
+
+    Returns:
+    --------
+    ColumnarDataset : Memory-mapped store for the source
+    """
+    store_dir = store_path(source, cache_dir)
+    if rebuild or not is_current(store_dir, source):
+        return build_store(source, store_dir, chunk_rows)
+    return ColumnarDataset(store_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect the columnar training data cache')
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('source', nargs='?', default=config.DATASET_FILE,
+                        help='CSV/Parquet file or directory of part-* shards')
+    parser.add_argument('--cache-dir', default=config.DATASET_CACHE_PATH)
+    parser.add_argument('--chunk-rows', type=int, default=config.DATASET_CHUNK_ROWS)
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild even if the store is current')
+    args = parser.parse_args()
+
+    store_dir = store_path(args.source, args.cache_dir)
+    if args.command == 'build':
+        dataset = load_dataset(args.source, args.cache_dir, args.chunk_rows, args.rebuild)
+        print(f"[OK] {dataset.rows} rows cached in {dataset.store_dir}")
+    elif not is_current(store_dir, args.source):
+        print(f"No current store for {args.source} (run: python scripts/dataset.py build {args.source})")
+    else:
+        dataset = ColumnarDataset(store_dir)
+        counts = np.bincount(dataset.labels, minlength=max(config.CROPS.values()) + 1)
+        print(f"Store:   {dataset.store_dir}")
+        print(f"Rows:    {dataset.rows}")
+        print(f"Columns: {', '.join(dataset.feature_names)} (float32), label (int8)")
+        print(f"Crops:   {int(np.count_nonzero(counts))} present")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+Precomputed Decision Grid
+
+Optional post-training stage for clients that only send coarse inputs. The
+forest is evaluated at every point of a quantized grid over
+``config.FEATURE_RANGES`` (one step per feature, ``config.DECISION_GRID_STEPS``)
+and the result is stored as one uint8 crop id and one float16 confidence per
+grid point, in a compressed ``.npz`` file.
+
+The grid is built without scoring points one by one. Each tree is descended
+once per slab of the grid with a box of level ranges per feature: a split
+cuts the box along its feature where the threshold falls between two levels,
+and each leaf adds its class probabilities to the whole sub-box it receives.
+Points are scaled exactly as the predictor scales its inputs and compared as
+float32, so grid answers match ``predict`` at those points.
+
+``GridPredictor`` answers rows whose every value lies on the grid with one
+index computation and table read, and sends off-grid or out-of-range rows to
+the full model. With ``snap=True`` in-range rows are rounded to the nearest
+grid point instead, trading agreement for coverage.
+
+The report lists grid build time, memory and file size, agreement with the
+exact model at sampled grid points and for snapped dataset rows, and lookup
+vs model throughput.
+
+Usage:
+    python scripts/decision_grid.py [--step N=25 ph=0.5 ...] [--max-cells 50000000]
+                                    [--bundle models/crop_model.bundle] [--output models/decision_grid.npz]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from model_bundle import load_bundle
+from predict import BUNDLE_FILE, MODELS_PATH, CropRecommendationPredictor
+
+# Grid points evaluated together while building (bounds the float64
+# probability buffer at about GRID_CHUNK_CELLS * n_classes * 8 bytes)
+GRID_CHUNK_CELLS = 1000000
+
+# Grid points and dataset rows used for the agreement report and timings
+REPORT_SAMPLE = 20000
+
+# Positions this close to an integer count as on the grid
+ON_GRID_TOLERANCE = 1e-6
+
+
+def forest_digest(forest):
+    """SHA-1 of the forest arrays; ties a grid to the model it was built from."""
+    digest = hashlib.sha1()
+    for name in ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes'):
+        digest.update(np.ascontiguousarray(getattr(forest, name)).tobytes())
+    return digest.hexdigest()
+
+
+def grid_levels(low, high, step):
+    """Grid points ``low, low + step, ...`` up to ``high``."""
+    if step <= 0:
+        raise ValueError(f"Grid steps must be positive, got {step}")
+    return low + step * np.arange(int(np.floor((high - low) / step + ON_GRID_TOLERANCE)) + 1)
+
+
+class DecisionGrid:
+    """
+    Forest predictions at every point of a quantized feature grid.
+
+    Attributes:
+    -----------
+    feature_names : list of str
+        Grid axes, in model feature order
+    low, high, step : np.ndarray (n_features,)
+        Range and spacing of each axis
+    shape : tuple of int
+        Grid points per axis
+    ids : np.ndarray (n_cells,) uint8
+        Predicted crop id at each grid point (C order over ``shape``)
+    confidence : np.ndarray (n_cells,) float16
+        Probability of the predicted crop
+    digest : str
+        ``forest_digest`` of the model the grid was built from
+    """
+
+    def __init__(self, feature_names, low, high, step, ids, confidence, digest):
+        self.feature_names = list(feature_names)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.step = np.asarray(step, dtype=np.float64)
+        self.shape = tuple(len(grid_levels(*axis)) for axis in zip(self.low, self.high, self.step))
+        self.ids = ids
+        self.confidence = confidence
+        self.digest = digest
+        if ids.shape != (self.n_cells,) or confidence.shape != (self.n_cells,):
+            raise ValueError(f"Grid arrays do not match its {self.n_cells} points")
+
+    @property
+    def n_cells(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        """Memory held by the lookup tables."""
+        return self.ids.nbytes + self.confidence.nbytes
+
+    def levels(self, axis):
+        """Grid points along one axis."""
+        return grid_levels(self.low[axis], self.high[axis], self.step[axis])
+
+    def cell_index(self, features, snap=False):
+        """
+        Map raw feature rows to grid points.
+
+        Parameters:
+        -----------
+        features : np.ndarray
+            (n, n_features) unscaled rows in ``feature_names`` order
+        snap : bool
+            Round in-range rows to the nearest grid point instead of
+            requiring every value to sit on the grid
+
+        Returns:
+        --------
+        tuple : (flat grid index of each found row, (n,) bool mask of found rows)
+        """
+        position = (features - self.low) / self.step
+        index = np.rint(position)
+        if snap:
+            found = np.all((features >= self.low) & (features <= self.high), axis=1)
+            index = np.minimum(index, np.array(self.shape) - 1)
+        else:
+            found = np.all((index >= 0) & (index < self.shape)
+                           & (np.abs(position - index) <= ON_GRID_TOLERANCE), axis=1)
+        flat = np.ravel_multi_index(index[found].astype(np.intp).T, self.shape)
+        return flat, found
+
+    def save(self, path):
+        """Write the grid as a compressed .npz file; returns its size in bytes."""
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, ids=self.ids, confidence=self.confidence, low=self.low,
+                                high=self.high, step=self.step, feature_names=np.array(self.feature_names),
+                                digest=np.array(self.digest))
+        return os.path.getsize(path)
+
+    @classmethod
+    def load(cls, path=None):
+        """Read a grid written by ``save`` (default ``config.DECISION_GRID_FILE``)."""
+        path = path or config.DECISION_GRID_FILE
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Decision grid not found at {path}; run python scripts/decision_grid.py")
+        with np.load(path) as data:
+            return cls(data['feature_names'].tolist(), data['low'], data['high'], data['step'],
+                       data['ids'], data['confidence'], str(data['digest']))
+
+
+def _split_positions(forest, scaled_levels):
+    """For every split node, how many levels of its feature go left (``x <= threshold``)."""
+    positions = np.zeros(forest.n_nodes, dtype=np.int64)
+    for axis, levels in enumerate(scaled_levels):
+        nodes = np.flatnonzero(forest.is_split & (forest.feature == axis))
+        positions[nodes] = np.searchsorted(levels, forest.threshold[nodes], side='right')
+    return positions
+
+
+def _accumulate(forest, positions, total, start):
+    """
+    Add every tree's leaf probabilities to ``total``, a slab of the grid
+    ((levels, ..., n_classes)) whose first axis begins at level ``start``.
+    Trees are added in forest order, as ``FlattenedForest.predict_proba``
+    sums them.
+    """
+    full = [(0, n) for n in total.shape[1:-1]]
+    for root in forest.roots.tolist():
+        stack = [(root, [(start, start + total.shape[0])] + full)]
+        while stack:
+            node, box = stack.pop()
+            if not forest.is_split[node]:
+                index = tuple(slice(lo - start, hi - start) if axis == 0 else slice(lo, hi)
+                              for axis, (lo, hi) in enumerate(box))
+                total[index] += forest.value[node]
+                continue
+            axis = forest.feature[node]
+            lo, hi = box[axis]
+            cut = positions[node]
+            if cut < hi:
+                right = list(box)
+                right[axis] = (max(lo, cut), hi)
+                stack.append((forest.right[node], right))
+            if cut > lo:
+                left = list(box)
+                left[axis] = (lo, min(hi, cut))
+                stack.append((forest.left[node], left))
+
+
+def build_grid(bundle, steps=None, ranges=None, max_cells=None, chunk_cells=GRID_CHUNK_CELLS):
+    """
+    Evaluate a bundle's forest at every point of a quantized grid.
+
+    Parameters:
+    -----------
+    bundle : ModelBundle
+        Model to precompute
+    steps : dict, optional
+        Feature -> grid step (default ``config.DECISION_GRID_STEPS``)
+    ranges : dict, optional
+        Feature -> (low, high) (default ``config.FEATURE_RANGES``)
+    max_cells : int, optional
+        Refuse grids with more points (default ``config.DECISION_GRID_MAX_CELLS``)
+    chunk_cells : int
+        Grid points evaluated together
+
+    Returns:
+    --------
+    DecisionGrid : The evaluated grid
+    """
+    steps = dict(config.DECISION_GRID_STEPS, **(steps or {}))
+    ranges = ranges or config.FEATURE_RANGES
+    max_cells = max_cells or config.DECISION_GRID_MAX_CELLS
+    forest = bundle.forest
+    names = bundle.feature_names
+
+    low = np.array([ranges[name][0] for name in names], dtype=np.float64)
+    high = np.array([ranges[name][1] for name in names], dtype=np.float64)
+    step = np.array([steps[name] for name in names], dtype=np.float64)
+    levels = [grid_levels(*axis) for axis in zip(low, high, step)]
+    shape = tuple(len(axis) for axis in levels)
+    n_cells = int(np.prod(shape, dtype=np.int64))
+    if n_cells > max_cells:
+        raise ValueError(f"A grid of {' x '.join(map(str, shape))} = {n_cells:,} points exceeds "
+                         f"{max_cells:,}; use coarser steps")
+    if forest.classes.min() < 0 or forest.classes.max() > np.iinfo(np.uint8).max:
+        raise ValueError("Crop ids must fit in uint8 to be stored in a decision grid")
+
+    # Same float64 multiply-add as predictor._scale, then the float32 cast of predict_proba
+    scaled_levels = [(axis * bundle.scale[j] + bundle.offset[j]).astype(np.float32).astype(np.float64)
+                     for j, axis in enumerate(levels)]
+    if any(np.any(np.diff(axis) < 0) for axis in scaled_levels):
+        raise ValueError("The scaler must preserve feature order to build a decision grid")
+    positions = _split_positions(forest, scaled_levels)
+
+    ids = np.empty(n_cells, dtype=np.uint8)
+    confidence = np.empty(n_cells, dtype=np.float16)
+    slab_cells = n_cells // shape[0]
+    slab = max(1, chunk_cells // slab_cells)
+    for start in range(0, shape[0], slab):
+        stop = min(start + slab, shape[0])
+        total = np.zeros((stop - start,) + shape[1:] + (len(forest.classes),), dtype=np.float64)
+        _accumulate(forest, positions, total, start)
+        proba = total.reshape(-1, len(forest.classes)) / forest.n_trees
+        best = proba.argmax(axis=1)
+        ids[start * slab_cells:stop * slab_cells] = forest.classes[best]
+        confidence[start * slab_cells:stop * slab_cells] = proba[np.arange(len(best)), best]
+
+    return DecisionGrid(names, low, high, step, ids, confidence, forest_digest(forest))
+
+
+class GridPredictor:
+    """
+    O(1) table lookups for rows on the grid, the full model for the rest.
+
+    Parameters:
+    -----------
+    grid : DecisionGrid
+        Grid built from the predictor's model
+    predictor : CropRecommendationPredictor
+        Model used for rows the grid does not cover
+    snap : bool
+        Round in-range rows to the nearest grid point (see ``cell_index``)
+    """
+
+    def __init__(self, grid, predictor, snap=False):
+        if predictor.forest is None:
+            raise ValueError("GridPredictor requires a predictor with engine='compiled'")
+        if forest_digest(predictor.forest) != grid.digest:
+            raise ValueError("The decision grid was built from a different model; rebuild it")
+        if list(predictor.feature_names) != grid.feature_names:
+            raise ValueError("The decision grid's features do not match the model's")
+        self.grid = grid
+        self.predictor = predictor
+        self.snap = snap
+
+    def predict_ids(self, features):
+        """
+        Predict crop ids for raw feature rows.
+
+        Parameters:
+        -----------
+        features : np.ndarray
+            (n, n_features) unscaled rows in model feature order
+
+        Returns:
+        --------
+        tuple : (crop ids, confidences in percent, (n,) bool mask of rows
+            answered from the grid)
+        """
+        features = np.asarray(features, dtype=np.float64)
+        flat, found = self.grid.cell_index(features, self.snap)
+        crop_ids = np.empty(len(features), dtype=np.int64)
+        confidences = np.empty(len(features), dtype=np.float64)
+        crop_ids[found] = self.grid.ids[flat]
+        confidences[found] = self.grid.confidence[flat].astype(np.float64) * 100
+
+        if not found.all():
+            # Boolean indexing copies, so predict_proba may scale in place
+            proba = self.predictor.predict_proba(features[~found])
+            best = proba.argmax(axis=1)
+            crop_ids[~found] = self.predictor.crop_ids[best]
+            confidences[~found] = proba[np.arange(len(best)), best] * 100
+        return crop_ids, confidences, found
+
+    def predict(self, N, P, K, temperature, humidity, ph, rainfall):
+        """Single-row prediction with the keys of ``CropRecommendationPredictor.predict``."""
+        values = {'N': N, 'P': P, 'K': K, 'temperature': temperature, 'humidity': humidity,
+                  'ph': ph, 'rainfall': rainfall}
+        features = np.array([[values[name] for name in self.grid.feature_names]], dtype=np.float64)
+        crop_ids, confidences, _ = self.predict_ids(features)
+        crop_id = int(crop_ids[0])
+        return {
+            'crop': self.predictor.reverse_crop_mapping[crop_id],
+            'crop_id': crop_id,
+            'confidence': round(float(confidences[0]), 2),
+            'input': values
+        }
+
+
+def _exact(predictor, features):
+    """Crop ids and probabilities from the full model."""
+    proba = predictor.predict_proba(features.copy())
+    best = proba.argmax(axis=1)
+    return predictor.crop_ids[best], proba[np.arange(len(best)), best]
+
+
+def agreement_report(grid, predictor, rows, sample=REPORT_SAMPLE, seed=config.RANDOM_STATE):
+    """
+    Compare grid answers with the exact model and time both.
+
+    Parameters:
+    -----------
+    grid : DecisionGrid
+        Grid to check
+    predictor : CropRecommendationPredictor
+        Compiled-engine predictor the grid was built from
+    rows : np.ndarray
+        Realistic (n, n_features) raw inputs, e.g. the training data
+    sample : int
+        Grid points checked and rows timed
+
+    Returns:
+    --------
+    dict : grid point agreement and largest confidence error, in-range share
+        and snapped agreement of ``rows``, and lookup / model rows per second
+    """
+    rng = np.random.default_rng(seed)
+    cells = rng.integers(0, grid.n_cells, size=min(sample, grid.n_cells))
+    index = np.stack(np.unravel_index(cells, grid.shape), axis=1)
+    points = grid.low + index * grid.step
+    exact_ids, exact_confidence = _exact(predictor, points)
+
+    lookup = GridPredictor(grid, predictor, snap=True)
+    snapped_ids, _, in_range = lookup.predict_ids(rows)
+    row_ids, _ = _exact(predictor, rows)
+
+    exact_lookup = GridPredictor(grid, predictor)
+    start = time.perf_counter()
+    exact_lookup.predict_ids(points)
+    lookup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predictor.predict_proba(points.copy())
+    model_seconds = time.perf_counter() - start
+
+    return {
+        'grid_point_agreement': float(np.mean(grid.ids[cells] == exact_ids)),
+        'max_confidence_error': float(np.abs(grid.confidence[cells].astype(np.float64) - exact_confidence).max()),
+        'rows_in_range': float(np.mean(in_range)),
+        'snapped_agreement': float(np.mean(snapped_ids[in_range] == row_ids[in_range])) if in_range.any() else None,
+        'lookup_rows_per_s': len(points) / lookup_seconds,
+        'model_rows_per_s': len(points) / model_seconds
+    }
+
+
+def parse_steps(items):
+    """Turn ``['N=25', 'ph=0.5']`` into ``{'N': 25.0, 'ph': 0.5}``."""
+    steps = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        if name not in config.FEATURES or not value:
+            raise argparse.ArgumentTypeError(f"Expected FEATURE=STEP with a feature from {config.FEATURES}, got '{item}'")
+        steps[name] = float(value)
+    return steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute the forest over a quantized feature grid')
+    parser.add_argument('--bundle', default=None, help='Source bundle (default: models/crop_model.bundle)')
+    parser.add_argument('--output', default=config.DECISION_GRID_FILE, help='Grid file to write')
+    parser.add_argument('--step', nargs='*', default=[], metavar='FEATURE=STEP',
+                        help='Override grid steps from config.DECISION_GRID_STEPS')
+    parser.add_argument('--max-cells', type=int, default=config.DECISION_GRID_MAX_CELLS)
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("Crop Recommendation Decision Grid")
+    print("=" * 60)
+
+    bundle_path = args.bundle or os.path.join(MODELS_PATH, BUNDLE_FILE)
+    bundle = load_bundle(bundle_path)
+
+    start = time.perf_counter()
+    grid = build_grid(bundle, parse_steps(args.step), max_cells=args.max_cells)
+    build_seconds = time.perf_counter() - start
+    file_bytes = grid.save(args.output)
+
+    import pandas as pd
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = CropRecommendationPredictor(engine='compiled', bundle_path=bundle_path)
+    data = pd.read_csv(config.DATASET_FILE)
+    report = agreement_report(grid, predictor, data[grid.feature_names].to_numpy(dtype=np.float64))
+
+    print(f"Grid:        {' x '.join(map(str, grid.shape))} = {grid.n_cells:,} points")
+    print(f"Steps:       {dict(zip(grid.feature_names, grid.step.tolist()))}")
+    print(f"Build time:  {build_seconds:.1f}s")
+    print(f"Memory:      {grid.nbytes / 2 ** 20:.1f} MB (uint8 ids + float16 confidence)")
+    print(f"File:        {file_bytes / 2 ** 20:.1f} MB compressed, {args.output}")
+    print(f"Agreement at grid points:      {report['grid_point_agreement']:.2%} "
+          f"(max confidence error {report['max_confidence_error']:.4f})")
+    if report['snapped_agreement'] is not None:
+        print(f"Dataset rows in range:         {report['rows_in_range']:.2%}")
+        print(f"Agreement, rows snapped to grid: {report['snapped_agreement']:.2%}")
+    print(f"Lookup: {report['lookup_rows_per_s']:,.0f} rows/s, model: {report['model_rows_per_s']:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Synthetic Training Data Generator
+
+Fits one multivariate normal per crop (mean and full covariance of the seven
+features) to ``data/Crop_recommendation.csv`` and samples any number of
+labelled rows from it, with crops drawn at their frequency in the source
+data. Sampled rows outside ``config.FEATURE_RANGES`` are redrawn, and any
+still out of range after ``MAX_REDRAWS`` attempts are clipped to the range.
+Features that are whole numbers in the source (N, P, K) are rounded.
+
+Output is split into shards of ``--shard-rows`` rows, written as
+``part-NNNNN.csv`` (or ``.parquet``) in chunks across a process pool. Shard i
+is drawn from its own generator seeded with ``(seed, i)``. A given seed,
+``--rows``, ``--shard-rows`` and ``--chunk-rows`` therefore always produce
+the same files, whatever the number of workers. ``iter_chunks`` yields the
+same kind of data in memory, for benchmarks that should not store it.
+
+Usage:
+    python scripts/generate_data.py data/synthetic --rows 10000000 [--workers 4] [--seed 42]
+    python scripts/generate_data.py data/synthetic --rows 1000000 --format parquet
+    python scripts/generate_data.py - --rows 1000 > sample.csv
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+MANIFEST_FILE = 'manifest.json'
+FORMATS = ['csv', 'parquet']
+
+# Attempts to redraw out-of-range rows before clipping them
+MAX_REDRAWS = 10
+
+# Added to covariance diagonals so per-crop fits on a handful of rows stay positive definite
+COVARIANCE_RIDGE = 1e-6
+
+
+class CropFeatureModel:
+    """
+    Per-crop multivariate normal feature distributions.
+
+    Parameters:
+    -----------
+    crops : list of str
+        Crop names, in the order of the arrays below
+    priors : np.ndarray
+        (n_crops,) probability of each crop
+    means : np.ndarray
+        (n_crops, n_features) feature means
+    cholesky : np.ndarray
+        (n_crops, n_features, n_features) lower Cholesky factors of the covariances
+    integer : np.ndarray
+        (n_features,) bool, features rounded to whole numbers
+    feature_names : list of str
+        Feature columns, in ``config.FEATURES`` order
+    """
+
+    def __init__(self, crops, priors, means, cholesky, integer, feature_names=config.FEATURES):
+        self.crops = list(crops)
+        self.priors = np.asarray(priors, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.cholesky = np.asarray(cholesky, dtype=np.float64)
+        self.integer = np.asarray(integer, dtype=bool)
+        self.feature_names = list(feature_names)
+        self.low = np.array([config.FEATURE_RANGES[name][0] for name in self.feature_names], dtype=np.float64)
+        self.high = np.array([config.FEATURE_RANGES[name][1] for name in self.feature_names], dtype=np.float64)
+
+    @classmethod
+    def fit(cls, frame, feature_names=config.FEATURES):
+        """Fit the distributions to a labelled DataFrame."""
+        crops = sorted(frame['label'].unique(), key=lambda name: config.CROPS.get(name, len(config.CROPS) + 1))
+        features = frame[feature_names].to_numpy(dtype=np.float64)
+        labels = frame['label'].to_numpy()
+
+        priors, means, cholesky = [], [], []
+        for crop in crops:
+            rows = features[labels == crop]
+            covariance = np.cov(rows, rowvar=False) if len(rows) > 1 else np.zeros((len(feature_names),) * 2)
+            covariance += np.diag(np.maximum(np.diag(covariance), 1.0) * COVARIANCE_RIDGE)
+            priors.append(len(rows) / len(features))
+            means.append(rows.mean(axis=0))
+            cholesky.append(_cholesky(covariance))
+
+        integer = np.all(features == np.round(features), axis=0)
+        return cls(crops, priors, means, cholesky, integer, feature_names)
+
+    def sample(self, n_rows, rng):
+        """
+        Draw ``n_rows`` labelled rows.
+
+        Returns:
+        --------
+        tuple : (labels, features) - (n,) crop indices and (n, n_features) float64 matrix
+        """
+        labels = rng.choice(len(self.crops), size=n_rows, p=self.priors)
+        features = self._draw(labels, rng)
+
+        for _ in range(MAX_REDRAWS):
+            outside = np.any((features < self.low) | (features > self.high), axis=1)
+            if not outside.any():
+                break
+            features[outside] = self._draw(labels[outside], rng)
+
+        np.clip(features, self.low, self.high, out=features)
+        features[:, self.integer] = np.round(features[:, self.integer])
+        return labels, features
+
+    def _draw(self, labels, rng):
+        noise = rng.standard_normal((len(labels), len(self.feature_names)))
+        return self.means[labels] + np.einsum('nij,nj->ni', self.cholesky[labels], noise)
+
+    def to_dict(self):
+        return {
+            'crops': self.crops,
+            'priors': self.priors.tolist(),
+            'means': self.means.tolist(),
+            'cholesky': self.cholesky.tolist(),
+            'integer': self.integer.tolist(),
+            'feature_names': self.feature_names
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['crops'], state['priors'], state['means'], state['cholesky'],
+                   state['integer'], state['feature_names'])
+
+
+def _cholesky(covariance):
+    """Cholesky factor, falling back to an eigenvalue-clipped factor for singular fits."""
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(covariance)
+        return vectors * np.sqrt(np.maximum(values, 0.0))
+
+
+def to_frame(model, labels, features):
+    """Rows as a DataFrame with the source CSV's columns (features, then 'label')."""
+    frame = pd.DataFrame(features, columns=model.feature_names)
+    for name, is_integer in zip(model.feature_names, model.integer):
+        if is_integer:
+            frame[name] = frame[name].astype(np.int64)
+    frame['label'] = np.asarray(model.crops, dtype=object)[labels]
+    return frame
+
+
+def iter_chunks(model, n_rows, seed=config.RANDOM_STATE, shard=0, chunk_rows=100000):
+    """
+    Yield ``n_rows`` rows of one shard as DataFrames of up to ``chunk_rows`` rows.
+
+    Draws exactly what ``write_shard`` writes for the same arguments.
+    """
+    rng = np.random.default_rng([seed, shard])
+    for start in range(0, n_rows, chunk_rows):
+        labels, features = model.sample(min(chunk_rows, n_rows - start), rng)
+        yield to_frame(model, labels, features)
+
+
+def write_shard(model, path, n_rows, seed=config.RANDOM_STATE, shard=0, chunk_rows=100000):
+    """
+    Stream one shard to a CSV or Parquet file, chunk by chunk.
+
+    Parameters:
+    -----------
+    model : CropFeatureModel or dict
+        Feature model (a ``to_dict`` state when sent to a worker)
+    path : str
+        Output file; '.parquet' writes Parquet (requires pyarrow), anything else CSV.
+        '-' writes CSV to stdout
+    n_rows : int
+        Rows in the shard
+
+    Returns:
+    --------
+    int : Rows written
+    """
+    if isinstance(model, dict):
+        model = CropFeatureModel.from_dict(model)
+    chunks = iter_chunks(model, n_rows, seed, shard, chunk_rows)
+
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Writing Parquet output requires pyarrow (pip install pyarrow)")
+
+        writer = None
+        try:
+            for frame in chunks:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return n_rows
+
+    out = sys.stdout if path == '-' else open(path, 'w', newline='')
+    try:
+        for i, frame in enumerate(chunks):
+            frame.to_csv(out, header=(i == 0), index=False, float_format='%.6f')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return n_rows
+
+
+def generate(output_dir, n_rows, fmt='csv', shard_rows=config.GENERATOR_SHARD_ROWS,
+             chunk_rows=config.GENERATOR_CHUNK_ROWS, workers=None, seed=config.RANDOM_STATE,
+             source=config.DATASET_FILE):
+    """
+    Write ``n_rows`` synthetic rows as seeded shards across a process pool.
+
+    Parameters:
+    -----------
+    output_dir : str
+        Directory receiving ``part-NNNNN.<fmt>`` files and ``manifest.json``
+    n_rows : int
+        Total rows
+    fmt : str
+        'csv' or 'parquet'
+    shard_rows : int
+        Rows per shard (the last shard may be smaller)
+    chunk_rows : int
+        Rows held in memory per write
+    workers : int, optional
+        Worker processes (default: CPU count, 0 = in-process)
+    seed : int
+        Base seed; shard i uses ``(seed, i)``
+    source : str
+        Labelled CSV the distributions are fitted to
+
+    Returns:
+    --------
+    dict : The manifest written next to the shards
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    model = CropFeatureModel.fit(pd.read_csv(source))
+    workers = os.cpu_count() if workers is None else workers
+    os.makedirs(output_dir, exist_ok=True)
+
+    n_shards = max(math.ceil(n_rows / shard_rows), 1)
+    tasks = []
+    for shard in range(n_shards):
+        rows = min(shard_rows, n_rows - shard * shard_rows)
+        path = os.path.join(output_dir, f'part-{shard:05d}.{fmt}')
+        tasks.append((model.to_dict(), path, rows, seed, shard, chunk_rows))
+
+    if workers == 0:
+        for task in tasks:
+            write_shard(*task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(write_shard, *task) for task in tasks]:
+                future.result()
+
+    manifest = {
+        'rows': n_rows,
+        'seed': seed,
+        'format': fmt,
+        'shard_rows': shard_rows,
+        'chunk_rows': chunk_rows,
+        'shards': [{'file': os.path.basename(path), 'rows': rows} for _, path, rows, _, _, _ in tasks],
+        'model': model.to_dict()
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic labelled crop data')
+    parser.add_argument('output', help="Output directory, or '-' for CSV on stdout")
+    parser.add_argument('--rows', type=int, required=True, help='Rows to generate')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--shard-rows', type=int, default=config.GENERATOR_SHARD_ROWS)
+    parser.add_argument('--chunk-rows', type=int, default=config.GENERATOR_CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count, 0 = in-process)')
+    parser.add_argument('--seed', type=int, default=config.RANDOM_STATE)
+    parser.add_argument('--source', default=config.DATASET_FILE, help='Labelled CSV to fit')
+    args = parser.parse_args()
+
+    if args.output == '-':
+        model = CropFeatureModel.fit(pd.read_csv(args.source))
+        write_shard(model, '-', args.rows, args.seed, 0, args.chunk_rows)
+        return
+
+    start = time.perf_counter()
+    manifest = generate(args.output, args.rows, args.format, args.shard_rows, args.chunk_rows,
+                        args.workers, args.seed, args.source)
+    elapsed = time.perf_counter() - start
+    print(f"[OK] {args.rows} rows in {len(manifest['shards'])} shards written to {args.output} "
+          f"in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Incremental Retraining
+
+Trains on field observations as they arrive instead of refitting the whole
+forest. Each call ingests one new data segment (a CSV with the feature columns
+and a ``label`` column, or only the rows appended to a CSV since it was last
+read) and:
+
+1. updates running min/max and mean/variance statistics, from which the same
+   fused MinMaxScaler + StandardScaler transform as train.py is derived;
+2. trains a group of new trees on that segment only;
+3. retires the oldest tree groups once the forest exceeds the sliding-window
+   size (config.INCREMENTAL_MAX_TREES);
+4. exports a model bundle for the compiled engine.
+
+Trees are stored in raw feature space, so earlier trees stay valid when the
+scaler statistics move; thresholds are mapped into the current scaled space
+when the bundle is exported. ``manifest.json`` in the state directory records
+every segment, which segments each tree saw, and the retired groups.
+
+Usage:
+    python scripts/incremental.py add data/field_2026-10-17.csv [--segment-id 2026-10-17]
+    python scripts/incremental.py status
+
+Serve the result with
+``CropRecommendationPredictor(engine='compiled', bundle_path='models/incremental/crop_model.bundle')``.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import read_csv_rows
+from model_bundle import FOREST_ARRAYS, write_bundle
+from tree_engine import FlattenedForest
+
+MANIFEST_FILE = 'manifest.json'
+TREES_DIR = 'trees'
+BUNDLE_FILE = 'crop_model.bundle'
+MANIFEST_VERSION = 1
+
+
+class RunningScalerStats:
+    """
+    Per-feature min/max and mean/variance, updatable one batch at a time.
+
+    Batches are merged with Chan et al.'s parallel variance update, so the
+    result equals fitting on all rows at once.
+    """
+
+    def __init__(self, n_features):
+        self.n_samples = 0
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def partial_fit(self, X):
+        """Fold a batch of raw feature rows into the statistics."""
+        X = np.asarray(X, dtype=np.float64)
+        n_batch = X.shape[0]
+        if n_batch == 0:
+            return self
+
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        total = self.n_samples + n_batch
+        delta = batch_mean - self.mean
+
+        self.mean = self.mean + delta * n_batch / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.n_samples * n_batch / total
+        self.min = np.minimum(self.min, X.min(axis=0))
+        self.max = np.maximum(self.max, X.max(axis=0))
+        self.n_samples = total
+        return self
+
+    @property
+    def var(self):
+        """Population variance of each feature."""
+        return self.m2 / max(self.n_samples, 1)
+
+    def fused(self):
+        """
+        Scale and offset equal to ``fuse_scalers`` on a MinMaxScaler and
+        StandardScaler fitted to every row seen so far.
+
+        Returns:
+        --------
+        tuple : (scale, offset) float64 arrays with one entry per feature
+        """
+        # MinMaxScaler: x * a + b (constant features keep a scale of 1)
+        data_range = self.max - self.min
+        a = 1.0 / np.where(data_range == 0, 1.0, data_range)
+        b = -self.min * a
+
+        # StandardScaler on the min-max output
+        mean = self.mean * a + b
+        std = np.sqrt(self.var) * a
+        std = np.where(std == 0, 1.0, std)
+        return a / std, (b - mean) / std
+
+    def to_dict(self):
+        return {
+            'n_samples': int(self.n_samples),
+            'min': self.min.tolist(),
+            'max': self.max.tolist(),
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(len(state['mean']))
+        stats.n_samples = state['n_samples']
+        stats.min = np.array(state['min'], dtype=np.float64)
+        stats.max = np.array(state['max'], dtype=np.float64)
+        stats.mean = np.array(state['mean'], dtype=np.float64)
+        stats.m2 = np.array(state['m2'], dtype=np.float64)
+        return stats
+
+
+class IncrementalTrainer:
+    """
+    Grows a forest segment by segment from a persistent state directory.
+
+    Parameters:
+    -----------
+    state_dir : str
+        Directory holding ``manifest.json`` and the stored tree groups
+    trees_per_segment : int
+        Trees trained on each new segment
+    max_trees : int or None
+        Sliding-window size; the oldest groups are retired beyond it
+    """
+
+    def __init__(self, state_dir=config.INCREMENTAL_PATH,
+                 trees_per_segment=config.INCREMENTAL_TREES_PER_SEGMENT,
+                 max_trees=config.INCREMENTAL_MAX_TREES):
+        self.state_dir = state_dir
+        self.trees_per_segment = trees_per_segment
+        self.max_trees = max_trees
+        self.classes = np.array(sorted(config.CROPS.values()))
+        self.manifest = self._load_manifest()
+        self.scaler = RunningScalerStats.from_dict(self.manifest['scaler'])
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.state_dir, MANIFEST_FILE)
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported manifest version {manifest.get('version')}")
+            return manifest
+        return {
+            'version': MANIFEST_VERSION,
+            'features': list(config.FEATURES),
+            'scaler': RunningScalerStats(len(config.FEATURES)).to_dict(),
+            'segments': [],
+            'groups': [],
+            'retired': [],
+            'next_group_id': 0,
+            'next_tree_id': 0
+        }
+
+    def _save_manifest(self):
+        self.manifest['scaler'] = self.scaler.to_dict()
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def rows_consumed(self, source):
+        """Rows of ``source`` already ingested (0 for a new file)."""
+        return max((segment['end_row'] for segment in self.manifest['segments']
+                    if segment['source'] == source), default=0)
+
+    def read_segment(self, path):
+        """
+        Read the rows of ``path`` not ingested yet.
+
+        Returns:
+        --------
+        tuple : (source, start_row, X raw features, y crop ids)
+        """
+        source = os.path.abspath(path)
+        start_row = self.rows_consumed(source)
+        frame = read_csv_rows(path, start_row)
+
+        missing = [column for column in config.FEATURES + ['label'] if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Segment is missing columns: {', '.join(missing)}")
+        unknown = sorted(set(frame['label']) - set(config.CROPS))
+        if unknown:
+            raise ValueError(f"Unknown crop labels: {', '.join(map(str, unknown))}")
+
+        X = frame[config.FEATURES].to_numpy(dtype=np.float64)
+        y = frame['label'].map(config.CROPS).to_numpy()
+        return source, start_row, X, y
+
+    def add_segment(self, path, segment_id=None, timestamp=None):
+        """
+        Ingest the new rows of ``path`` and train a tree group on them.
+
+        Parameters:
+        -----------
+        path : str
+            CSV with the feature columns and ``label``
+        segment_id : str, optional
+            Name recorded in the manifest (default ``seg<N>``)
+        timestamp : str, optional
+            ISO timestamp recorded for the segment (default: now, UTC)
+
+        Returns:
+        --------
+        dict or None : The manifest group entry, or None when there were no new rows
+        """
+        source, start_row, X, y = self.read_segment(path)
+        if len(X) == 0:
+            return None
+
+        timestamp = timestamp or pd.Timestamp.now(tz='UTC').isoformat()
+        segment_id = segment_id or f"seg{len(self.manifest['segments']):04d}"
+        if any(segment['id'] == segment_id for segment in self.manifest['segments']):
+            raise ValueError(f"Segment '{segment_id}' was already ingested")
+
+        self.scaler.partial_fit(X)
+
+        group_id = self.manifest['next_group_id']
+        params = dict(config.MODEL_PARAMS, n_estimators=self.trees_per_segment,
+                      random_state=config.MODEL_PARAMS.get('random_state', 0) + group_id)
+        model = RandomForestClassifier(**params).fit(X, y)
+        forest = FlattenedForest.from_sklearn(model).align_classes(self.classes)
+
+        os.makedirs(os.path.join(self.state_dir, TREES_DIR), exist_ok=True)
+        group_file = os.path.join(TREES_DIR, f'group_{group_id:05d}.npz')
+        _save_forest(os.path.join(self.state_dir, group_file), forest)
+
+        first_tree = self.manifest['next_tree_id']
+        group = {
+            'id': group_id,
+            'file': group_file,
+            'segments': [segment_id],
+            'tree_ids': list(range(first_tree, first_tree + forest.n_trees)),
+            'rows': int(len(X)),
+            'n_nodes': int(forest.n_nodes),
+            'trained_at': timestamp
+        }
+        self.manifest['segments'].append({
+            'id': segment_id,
+            'source': source,
+            'start_row': int(start_row),
+            'end_row': int(start_row + len(X)),
+            'rows': int(len(X)),
+            'added_at': timestamp
+        })
+        self.manifest['groups'].append(group)
+        self.manifest['next_group_id'] = group_id + 1
+        self.manifest['next_tree_id'] = first_tree + forest.n_trees
+
+        retired = self._retire_oldest(timestamp)
+        self._save_manifest()
+
+        # Only delete retired trees once the manifest no longer references them
+        for entry in retired:
+            path = os.path.join(self.state_dir, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        return group
+
+    def _retire_oldest(self, timestamp):
+        """Drop whole groups, oldest first, until the window fits (keeps the newest)."""
+        retired = []
+        groups = self.manifest['groups']
+        while (self.max_trees is not None and len(groups) > 1
+               and sum(len(group['tree_ids']) for group in groups) > self.max_trees):
+            group = groups.pop(0)
+            retired.append(group)
+            self.manifest['retired'].append({
+                'id': group['id'],
+                'file': group['file'],
+                'segments': group['segments'],
+                'tree_ids': group['tree_ids'],
+                'retired_at': timestamp
+            })
+        return retired
+
+    @property
+    def n_trees(self):
+        """Trees currently in the window."""
+        return sum(len(group['tree_ids']) for group in self.manifest['groups'])
+
+    def build_forest(self):
+        """
+        Join the active tree groups into one forest taking scaled inputs.
+
+        Returns:
+        --------
+        FlattenedForest : Thresholds mapped through the current fused scaler
+        """
+        if not self.manifest['groups']:
+            raise RuntimeError("No segments ingested yet")
+        forests = [_load_forest(os.path.join(self.state_dir, group['file']))
+                   for group in self.manifest['groups']]
+        return FlattenedForest.concatenate(forests).rescale(*self.scaler.fused())
+
+    def export(self, bundle_path=None):
+        """
+        Write the current forest and scaler as a model bundle.
+
+        Returns:
+        --------
+        int : Bundle size in bytes
+        """
+        bundle_path = bundle_path or os.path.join(self.state_dir, BUNDLE_FILE)
+        scale, offset = self.scaler.fused()
+        return write_bundle(
+            bundle_path, self.build_forest(), config.CROPS, config.FEATURES, scale, offset,
+            metadata={
+                'incremental': True,
+                'n_estimators': self.n_trees,
+                'train_rows': int(sum(group['rows'] for group in self.manifest['groups'])),
+                'segments': [segment for group in self.manifest['groups'] for segment in group['segments']],
+                'trained_at': self.manifest['groups'][-1]['trained_at']
+            }
+        )
+
+
+def _save_forest(path, forest):
+    """Store a forest's arrays in one .npz file (written atomically)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, max_depth=forest.max_depth,
+                 **{name: getattr(forest, name) for name in FOREST_ARRAYS})
+    os.replace(tmp_path, path)
+
+
+def _load_forest(path):
+    with np.load(path) as arrays:
+        return FlattenedForest(*(arrays[name] for name in FOREST_ARRAYS), int(arrays['max_depth']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally retrain the crop model from new data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Ingest a new data segment')
+    add_parser.add_argument('path', help='CSV with the feature columns and label')
+    add_parser.add_argument('--segment-id', default=None, help='Name recorded in the manifest')
+    add_parser.add_argument('--trees', type=int, default=config.INCREMENTAL_TREES_PER_SEGMENT,
+                            help='Trees trained on the new segment')
+    add_parser.add_argument('--max-trees', type=int, default=config.INCREMENTAL_MAX_TREES,
+                            help='Sliding-window size in trees (0 = keep every tree)')
+    add_parser.add_argument('--output', default=None,
+                            help='Bundle to export (default: <state-dir>/crop_model.bundle)')
+
+    subparsers.add_parser('status', help='Show the ingested segments and active trees')
+
+    for sub in subparsers.choices.values():
+        sub.add_argument('--state-dir', default=config.INCREMENTAL_PATH, help='Incremental state directory')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Crop Recommendation Incremental Training")
+    print("=" * 60)
+
+    if args.command == 'status':
+        trainer = IncrementalTrainer(args.state_dir)
+        print(f"Segments: {len(trainer.manifest['segments'])}, rows seen: {trainer.scaler.n_samples}")
+        print(f"Active trees: {trainer.n_trees} in {len(trainer.manifest['groups'])} groups, "
+              f"retired groups: {len(trainer.manifest['retired'])}")
+        for group in trainer.manifest['groups']:
+            print(f"  group {group['id']}: {len(group['tree_ids'])} trees, "
+                  f"segments {', '.join(group['segments'])}, {group['rows']} rows")
+        return
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    trainer = IncrementalTrainer(args.state_dir, args.trees, args.max_trees or None)
+    group = trainer.add_segment(args.path, args.segment_id)
+    if group is None:
+        print(f"[OK] No new rows in {args.path}")
+        return
+
+    output = args.output or os.path.join(args.state_dir, BUNDLE_FILE)
+    size = trainer.export(output)
+    print(f"[OK] Segment '{group['segments'][0]}': {group['rows']} rows -> "
+          f"{len(group['tree_ids'])} new trees")
+    print(f"[OK] Active trees: {trainer.n_trees}, retired groups: {len(trainer.manifest['retired'])}")
+    print(f"[OK] Bundle exported: {output} ({size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
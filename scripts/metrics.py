@@ -0,0 +1,235 @@
+"""
+Hot-Path Metrics
+
+Histograms of per-stage timings, request durations and batch sizes, rendered
+in the Prometheus text exposition format (version 0.0.4) for ``GET /metrics``.
+
+Stages are timed with a ``StageTimer``: ``mark(stage)`` records the time since
+the previous mark. When metrics are disabled (config.METRICS_ENABLED = False)
+``stage_timer`` returns a shared no-op timer, so instrumented code pays one
+method call per stage and nothing else.
+
+Metrics are kept per process; with serve.py's pre-fork workers each scrape
+reports the worker that answered it (see the ``pid`` label on
+``crop_process_info``).
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+# Seconds; spans ~10us numpy calls up to slow multi-thousand-row batches
+DURATION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                    0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+# Rows per batch call, powers of two up to 64k
+BATCH_SIZE_BUCKETS = tuple(2 ** i for i in range(17))
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """Return (cumulative bucket counts incl. +Inf, sum, count)."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class HistogramFamily:
+    """A named histogram metric with one child histogram per label set."""
+
+    def __init__(self, name, documentation, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            cumulative, total, count = child.snapshot()
+            pairs = list(zip(self.label_names, values))
+            labels = _format_labels(pairs)
+            for bound, running in zip(self.buckets + (float('inf'),), cumulative):
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(pairs, le=le)} {running}")
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histogram families plus collector callbacks rendered on demand.
+
+    A collector returns ``(name, type, help, samples)`` tuples, where samples
+    is a list of ``(labels dict, value)``; it is used for values that already
+    live elsewhere, such as cache and batcher counters.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.families = []
+        self.collectors = []
+
+    def histogram(self, name, documentation, label_names, buckets=DURATION_BUCKETS):
+        family = HistogramFamily(name, documentation, label_names, buckets)
+        self.families.append(family)
+        return family
+
+    def add_collector(self, collector):
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self):
+        """Render every metric in the text exposition format."""
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        for collector in self.collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.items())} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class StageTimer:
+    """Records the time between consecutive ``mark`` calls as named stages."""
+
+    __slots__ = ('component', 'last')
+
+    def __init__(self, component):
+        self.component = component
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        STAGE_SECONDS.labels(self.component, stage).observe(now - self.last)
+        self.last = now
+
+
+class _NullTimer:
+    """Stand-in timer used while metrics are disabled."""
+
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+REGISTRY = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'crop_stage_duration_seconds', 'Time spent in each hot-path stage.', ('component', 'stage'))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'crop_request_duration_seconds', 'End-to-end HTTP request time per route.',
+    ('route', 'method', 'status'))
+BATCH_ROWS = REGISTRY.histogram(
+    'crop_batch_rows', 'Rows scored per batch prediction call.', ('component',), BATCH_SIZE_BUCKETS)
+
+
+def stage_timer(component):
+    """A StageTimer for ``component``, or the no-op timer when disabled."""
+    return StageTimer(component) if REGISTRY.enabled else NULL_TIMER
+
+
+def observe_batch(component, rows):
+    """Record the size of one batch call."""
+    if REGISTRY.enabled:
+        BATCH_ROWS.labels(component).observe(rows)
+
+
+def observe_request(route, method, status, seconds):
+    """Record one HTTP request."""
+    if REGISTRY.enabled:
+        REQUEST_SECONDS.labels(route, method, str(status)).observe(seconds)
+
+
+def process_collector():
+    """Process identity, so per-worker scrapes can be told apart."""
+    return [('crop_process_info', 'gauge', 'Process serving this scrape.',
+             [({'pid': os.getpid()}, 1)])]
+
+
+def cache_collector(cache):
+    """Collector exposing ``PredictionCache.stats()``."""
+    def collect():
+        stats = cache.stats()
+        return [
+            ('crop_cache_entries', 'gauge', 'Cached prediction results.', [({}, stats['size'])]),
+            ('crop_cache_hits_total', 'counter', 'Prediction cache hits.', [({}, stats['hits'])]),
+            ('crop_cache_misses_total', 'counter', 'Prediction cache misses.', [({}, stats['misses'])]),
+            ('crop_cache_evictions_total', 'counter', 'LRU evictions.', [({}, stats['evictions'])]),
+            ('crop_cache_expirations_total', 'counter', 'TTL expirations.', [({}, stats['expirations'])]),
+            ('crop_cache_invalidations_total', 'counter', 'Clears caused by model reloads.',
+             [({}, stats['invalidations'])])
+        ]
+    return collect
+
+
+def batcher_collector(batcher):
+    """Collector exposing ``MicroBatcher.stats()``."""
+    def collect():
+        stats = batcher.stats()
+        return [
+            ('crop_microbatch_batches_total', 'counter', 'Micro-batches flushed.', [({}, stats['batches'])]),
+            ('crop_microbatch_rows_total', 'counter', 'Rows scored through micro-batches.',
+             [({}, stats['rows'])]),
+            ('crop_microbatch_largest_batch', 'gauge', 'Largest micro-batch so far.',
+             [({}, stats['largest_batch'])])
+        ]
+    return collect
+
+
+REGISTRY.add_collector(process_collector)
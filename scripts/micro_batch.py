@@ -0,0 +1,144 @@
+"""
+Micro-Batching for Concurrent Predictions
+
+Collects single-row prediction requests from concurrent asyncio tasks into a
+shared queue and scores them together with one vectorized
+``predict_batch`` call. A batch is flushed when it reaches its maximum size
+or when its oldest request has waited the maximum delay, whichever comes
+first.
+"""
+
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single predictions into vectorized batches.
+
+    The batch function runs in the event loop's default executor so the
+    loop keeps accepting requests (and filling the next batch) meanwhile.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_delay_ms=5.0):
+        """
+        Parameters:
+        -----------
+        predict_batch : callable
+            Function mapping a list of feature dicts to a list of results,
+            e.g. ``CropRecommendationPredictor.predict_batch``
+        max_batch_size : int
+            Flush as soon as this many requests are queued
+        max_delay_ms : float
+            Flush when the oldest queued request has waited this long
+        """
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive")
+
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._queue = None
+        self._task = None
+
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_seen = 0
+
+    def start(self):
+        """Start the flush loop on the running event loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop, failing any requests still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, row):
+        """
+        Queue one feature dict and wait for its prediction.
+
+        Parameters:
+        -----------
+        row : dict
+            Feature values for one sample
+
+        Returns:
+        --------
+        dict : The prediction result for ``row``
+        """
+        if self._task is None:
+            raise RuntimeError("MicroBatcher.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        """Gather batches from the queue and flush them until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        """Score one batch and resolve each request's future."""
+        rows = [row for row, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self.predict_batch, rows)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        self.max_batch_seen = max(self.max_batch_seen, len(rows))
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """
+        Get batching counters.
+
+        Returns:
+        --------
+        dict : Batch count, rows scored and batch size figures
+        """
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_delay_ms': self.max_delay * 1000.0,
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.max_batch_seen
+        }
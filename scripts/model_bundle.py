@@ -0,0 +1,272 @@
+"""
+Single-File Model Bundle
+
+Stores everything the predictor needs in one versioned file: a small JSON
+header (metadata, crop mapping, feature names, fused scaler parameters and an
+array table) followed by the flattened forest arrays, uncompressed and
+64-byte aligned. Loading memory-maps the arrays, so every process that opens
+the same bundle shares the same physical pages and no tree data is copied.
+The same image can be laid out in memory (``bundle_parts``) and loaded from a
+buffer (``bundle_from_buffer``); shared_model.py uses this for bundles kept in
+shared memory.
+
+Layout:
+    magic (8 bytes) | format version (uint32) | header length (uint32)
+    | JSON header | padding | array data ...
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from tree_engine import FlattenedForest
+
+BUNDLE_MAGIC = b'CROPMDL\x00'
+BUNDLE_FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct('<8sII')
+
+# Arrays written for a FlattenedForest, in file order
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes')
+
+
+class ModelBundle:
+    """
+    A loaded model bundle.
+
+    Attributes:
+    -----------
+    forest : FlattenedForest
+        Forest whose arrays are read-only memory maps of the bundle file
+    crop_mapping : dict
+        Crop name -> crop id
+    feature_names : list of str
+        Feature order expected by the forest
+    scale, offset : np.ndarray
+        Fused scaler parameters (see ``predict.fuse_scalers``)
+    metadata : dict
+        Free-form training metadata
+    path : str
+        File the bundle was loaded from
+    version : str or None
+        Model version recorded in the header (shared memory bundles)
+    """
+
+    def __init__(self, forest, crop_mapping, feature_names, scale, offset, metadata, path=None,
+                 version=None):
+        self.forest = forest
+        self.crop_mapping = crop_mapping
+        self.feature_names = feature_names
+        self.scale = scale
+        self.offset = offset
+        self.metadata = metadata
+        self.path = path
+        self.version = version
+
+
+def _align(position):
+    """Round ``position`` up to the next multiple of ALIGNMENT."""
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def bundle_parts(forest, crop_mapping, feature_names, scale, offset, metadata=None, version=None):
+    """
+    Lay out a bundle without writing it.
+
+    Parameters are those of ``write_bundle``, plus ``version``: a model
+    version recorded in the header (used for shared memory bundles).
+
+    Returns:
+    --------
+    tuple : (parts, size) where ``parts`` lists ``(position, bytes-like)`` in
+        file order (gaps between them are zero padding) and ``size`` is the
+        total length in bytes
+    """
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        array = np.ascontiguousarray(getattr(forest, name))
+        arrays[name] = array.astype(array.dtype.newbyteorder('<'), copy=False)
+
+    header = {
+        'metadata': metadata or {},
+        'crop_mapping': {str(k): int(v) for k, v in crop_mapping.items()},
+        'feature_names': list(feature_names),
+        'scaler': {
+            'scale': [float(v) for v in scale],
+            'offset': [float(v) for v in offset]
+        },
+        'forest': {'max_depth': forest.max_depth},
+        'arrays': {}
+    }
+    if version is not None:
+        header['version'] = version
+
+    # Array offsets depend on the header length, so size the table first
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0}
+    while True:
+        header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+        position = _align(_PREAMBLE.size + len(header_bytes))
+        changed = False
+        for name, array in arrays.items():
+            entry = header['arrays'][name]
+            if entry['offset'] != position:
+                entry['offset'] = position
+                changed = True
+            position = _align(position + array.nbytes)
+        if not changed:
+            break
+
+    parts = [(0, _PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_bytes)) + header_bytes)]
+    for name, array in arrays.items():
+        parts.append((header['arrays'][name]['offset'], array.reshape(-1).view(np.uint8)))
+    size = max(position + len(data) for position, data in parts)
+    return parts, size
+
+
+def write_bundle(path, forest, crop_mapping, feature_names, scale, offset, metadata=None):
+    """
+    Write a model bundle atomically (temp file + rename).
+
+    Parameters:
+    -----------
+    path : str
+        Destination file
+    forest : FlattenedForest
+        Flattened forest to store
+    crop_mapping : dict
+        Crop name -> crop id
+    feature_names : list of str
+        Feature order expected by the forest
+    scale, offset : array-like
+        Fused scaler parameters
+    metadata : dict, optional
+        JSON-serializable training metadata
+
+    Returns:
+    --------
+    int : Size of the written file in bytes
+    """
+    parts, size = bundle_parts(forest, crop_mapping, feature_names, scale, offset, metadata)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for position, data in parts:
+            f.write(b'\x00' * (position - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+
+    return size
+
+
+def _parse_preamble(preamble, source):
+    """Check a bundle preamble and return the JSON header length."""
+    if len(preamble) != _PREAMBLE.size:
+        raise ValueError(f"{source} is too short to be a model bundle")
+    magic, version, header_len = _PREAMBLE.unpack(preamble)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError(f"{source} is not a model bundle")
+    if version != BUNDLE_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported bundle format version {version} "
+            f"(expected {BUNDLE_FORMAT_VERSION})"
+        )
+    return header_len
+
+
+def read_header(path):
+    """
+    Read and validate a bundle's JSON header without mapping any arrays.
+
+    Returns:
+    --------
+    dict : The decoded header
+    """
+    with open(path, 'rb') as f:
+        header_len = _parse_preamble(f.read(_PREAMBLE.size), path)
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def _from_header(header, arrays, path):
+    """Assemble a ModelBundle from a decoded header and its forest arrays."""
+    forest = FlattenedForest(
+        arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+        arrays['value'], arrays['roots'], arrays['classes'], header['forest']['max_depth']
+    )
+
+    return ModelBundle(
+        forest=forest,
+        crop_mapping=dict(header['crop_mapping']),
+        feature_names=list(header['feature_names']),
+        scale=np.array(header['scaler']['scale'], dtype=np.float64),
+        offset=np.array(header['scaler']['offset'], dtype=np.float64),
+        metadata=header['metadata'],
+        path=path,
+        version=header.get('version')
+    )
+
+
+def load_bundle(path):
+    """
+    Load a model bundle, memory-mapping the forest arrays read-only.
+
+    Parameters:
+    -----------
+    path : str
+        Bundle file written by ``write_bundle``
+
+    Returns:
+    --------
+    ModelBundle : The loaded bundle
+    """
+    header = read_header(path)
+
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        entry = header['arrays'][name]
+        shape = tuple(entry['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=entry['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=entry['dtype'], mode='r',
+                                     offset=entry['offset'], shape=shape)
+
+    return _from_header(header, arrays, path)
+
+
+def bundle_from_buffer(buffer, source='<buffer>'):
+    """
+    Load a bundle image held in memory, such as a shared memory segment.
+
+    The forest arrays are ``np.frombuffer`` views of ``buffer``, never copies,
+    and are read-only when the buffer is.
+
+    Parameters:
+    -----------
+    buffer : bytes-like
+        Complete bundle image, as laid out by ``bundle_parts``
+    source : str
+        Description used in error messages and as ``ModelBundle.path``
+
+    Returns:
+    --------
+    ModelBundle : The loaded bundle
+    """
+    header_len = _parse_preamble(bytes(buffer[:_PREAMBLE.size]), source)
+    header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_len]).decode('utf-8'))
+
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        entry = header['arrays'][name]
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays[name] = np.empty(shape, dtype=entry['dtype'])
+        else:
+            arrays[name] = np.frombuffer(buffer, dtype=entry['dtype'], count=count,
+                                         offset=entry['offset']).reshape(shape)
+
+    return _from_header(header, arrays, source)
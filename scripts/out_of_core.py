@@ -0,0 +1,323 @@
+"""
+Out-of-Core Training
+
+Trains the Random Forest on datasets larger than memory by streaming the
+columnar store of dataset.py instead of materializing it:
+
+1. Split: every row id is hashed (seeded splitmix64), and rows whose hash
+   falls below config.TEST_SIZE form the test split. The split needs no
+   shuffle and no in-memory index, and a row lands on the same side however
+   the data is chunked.
+2. Scaler: min/max and mean/variance of the training rows are accumulated in
+   one streaming pass (incremental.RunningScalerStats). The fused
+   MinMaxScaler + StandardScaler transform is derived from them.
+3. Members: the forest's trees are split into members of
+   config.OUT_OF_CORE_TREES_PER_MEMBER trees. Each member is fitted in a worker
+   process on its own bootstrap sample of config.OUT_OF_CORE_MEMBER_ROWS
+   training rows, gathered from the memory-mapped columns. Memory per worker is
+   bounded by that sample, not by the dataset.
+4. Merge: the members are joined into one forest and written in the same
+   artifacts train.py writes: the model bundle for the compiled engine, and the
+   pickles for the sklearn engine. If a member never saw some crop, sklearn
+   cannot merge it, so no model pickle is written and any earlier one in the
+   output directory is removed. The merged model is then scored on the test
+   split in a final streaming pass.
+
+Usage:
+    python scripts/train.py --out-of-core [--data data/synthetic] [--workers 4]
+"""
+
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import ColumnarDataset, load_dataset
+from incremental import RunningScalerStats
+from model_bundle import write_bundle
+from tree_engine import FlattenedForest
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(x):
+    """Vectorized splitmix64 finalizer over uint64 arrays."""
+    with np.errstate(over='ignore'):
+        x = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+        x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+        return x ^ (x >> np.uint64(31))
+
+
+def hash_split(row_ids, test_size=config.TEST_SIZE, seed=config.RANDOM_STATE):
+    """
+    Deterministic train/test assignment from row ids.
+
+    Parameters:
+    -----------
+    row_ids : np.ndarray
+        Global row positions in the dataset
+    test_size : float
+        Expected fraction of rows in the test split
+
+    Returns:
+    --------
+    np.ndarray : bool mask, True for test rows
+    """
+    keys = np.asarray(row_ids, dtype=np.uint64) ^ _splitmix64(np.array([seed], dtype=np.uint64))
+    uniform = (_splitmix64(keys) >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+    return uniform < test_size
+
+
+def scan_training_rows(dataset, chunk_rows=config.DATASET_CHUNK_ROWS, test_size=config.TEST_SIZE,
+                       seed=config.RANDOM_STATE):
+    """
+    One streaming pass over the training split.
+
+    Returns:
+    --------
+    tuple : (RunningScalerStats, (n_classes,) training rows per crop id in
+        ``classes`` order, classes)
+    """
+    stats = RunningScalerStats(len(dataset.feature_names))
+    classes = np.array(sorted(config.CROPS.values()))
+    counts = np.zeros(len(classes), dtype=np.int64)
+    start = 0
+    for features, labels in dataset.iter_chunks(chunk_rows):
+        train = ~hash_split(np.arange(start, start + len(labels)), test_size, seed)
+        stats.partial_fit(features[train])
+        counts += np.bincount(np.searchsorted(classes, labels[train]), minlength=len(classes))
+        start += len(labels)
+    return stats, counts, classes
+
+
+def fit_member(member, store_dir, params, n_rows, scale, offset, test_size=config.TEST_SIZE,
+               seed=config.RANDOM_STATE):
+    """
+    Fit one forest member on a bootstrap sample of the training split.
+
+    Runs in a worker process: the store is memory-mapped here, and only the
+    sampled rows are read.
+
+    Returns:
+    --------
+    RandomForestClassifier : The fitted member (inputs in fused-scaled space)
+    """
+    dataset = ColumnarDataset(store_dir)
+    rng = np.random.default_rng([seed, member])
+
+    # Draw with replacement, keeping training rows only, until the sample is full
+    picked = []
+    needed = n_rows
+    while needed > 0:
+        candidates = rng.integers(0, dataset.rows, size=int(needed / (1 - test_size)) + 64)
+        candidates = candidates[~hash_split(candidates, test_size, seed)][:needed]
+        picked.append(candidates)
+        needed -= len(candidates)
+    row_ids = np.sort(np.concatenate(picked))
+
+    X = np.empty((len(row_ids), len(dataset.feature_names)), dtype=np.float32)
+    for i, name in enumerate(dataset.feature_names):
+        X[:, i] = dataset.columns[name][row_ids] * scale[i] + offset[i]
+    y = np.asarray(dataset.labels[row_ids], dtype=np.int64)
+
+    model = RandomForestClassifier(**dict(params, n_jobs=1, random_state=seed + member))
+    return model.fit(X, y)
+
+
+def merge_members(members, classes):
+    """
+    Join fitted members into one RandomForestClassifier and one FlattenedForest.
+
+    Returns:
+    --------
+    tuple : (RandomForestClassifier or None, FlattenedForest). The sklearn
+        model is None when some member never saw a class: its trees cannot be
+        averaged with the others by sklearn, but the flattened forest can.
+    """
+    forest = FlattenedForest.concatenate(
+        [FlattenedForest.from_sklearn(member).align_classes(classes) for member in members])
+
+    if any(not np.array_equal(member.classes_, classes) for member in members):
+        return None, forest
+    model = members[0]
+    model.estimators_ = [tree for member in members for tree in member.estimators_]
+    model.n_estimators = len(model.estimators_)
+    return model, forest
+
+
+def scalers_from_stats(stats):
+    """
+    MinMaxScaler and StandardScaler equal to fitting both on the streamed rows.
+
+    The pickled scalers are what the sklearn engine loads; they are built
+    from the running statistics instead of being refitted on the data.
+    """
+    minmax = MinMaxScaler().partial_fit(np.vstack([stats.min, stats.max]))
+    a, b = minmax.scale_, minmax.min_
+
+    standard = StandardScaler()
+    standard.n_features_in_ = len(stats.mean)
+    standard.n_samples_seen_ = stats.n_samples
+    standard.mean_ = stats.mean * a + b
+    standard.var_ = stats.var * a ** 2
+    std = np.sqrt(standard.var_)
+    standard.scale_ = np.where(std == 0, 1.0, std)
+    return minmax, standard
+
+
+def evaluate(forest, dataset, scale, offset, chunk_rows=config.DATASET_CHUNK_ROWS,
+             test_size=config.TEST_SIZE, seed=config.RANDOM_STATE):
+    """
+    Streaming accuracy of a scaled-space forest on the hashed test split.
+
+    Returns:
+    --------
+    tuple : (accuracy, test rows)
+    """
+    correct = 0
+    total = 0
+    start = 0
+    for features, labels in dataset.iter_chunks(chunk_rows):
+        test = hash_split(np.arange(start, start + len(labels)), test_size, seed)
+        start += len(labels)
+        if not test.any():
+            continue
+        proba = forest.predict_proba(features[test] * scale + offset)
+        correct += int(np.sum(forest.classes[proba.argmax(axis=1)] == labels[test]))
+        total += int(test.sum())
+    return (correct / total if total else float('nan')), total
+
+
+def train_out_of_core(source, output_dir, params=None, workers=None,
+                      trees_per_member=config.OUT_OF_CORE_TREES_PER_MEMBER,
+                      member_rows=config.OUT_OF_CORE_MEMBER_ROWS,
+                      chunk_rows=config.DATASET_CHUNK_ROWS, rebuild_cache=False):
+    """
+    Train and save a forest without loading the dataset into memory.
+
+    Parameters:
+    -----------
+    source : str
+        CSV/Parquet file or shard directory (see dataset.py)
+    output_dir : str
+        Directory receiving the bundle and pickles, like train.py
+    params : dict, optional
+        Forest parameters (default ``config.MODEL_PARAMS``); ``n_estimators``
+        is the total across members
+    workers : int, optional
+        Worker processes (default: CPU count, 0 = in-process)
+    trees_per_member : int
+        Trees fitted per member
+    member_rows : int
+        Bootstrap sample size of each member (capped at the training rows)
+    chunk_rows : int
+        Rows per streaming chunk
+
+    Returns:
+    --------
+    dict : Training summary (rows, accuracy, timings, bundle path)
+    """
+    params = dict(params or config.MODEL_PARAMS)
+    params.pop('verbose', None)
+    workers = os.cpu_count() if workers is None else workers
+    timings = {}
+
+    start = time.perf_counter()
+    dataset = load_dataset(source, chunk_rows=chunk_rows, rebuild=rebuild_cache)
+    timings['ingest'] = time.perf_counter() - start
+    print(f"Dataset rows: {dataset.rows} (columnar cache: {dataset.store_dir})")
+
+    start = time.perf_counter()
+    stats, class_counts, classes = scan_training_rows(dataset, chunk_rows)
+    scale, offset = stats.fused()
+    timings['scan'] = time.perf_counter() - start
+    print(f"Training rows: {stats.n_samples}, scaler statistics from one streaming pass")
+    if stats.n_samples == 0:
+        raise ValueError("The training split is empty")
+
+    n_members = max(-(-params['n_estimators'] // trees_per_member), 1)
+    sample_rows = int(min(member_rows, stats.n_samples))
+    member_params = dict(params, n_estimators=trees_per_member)
+    tasks = [(member, dataset.store_dir, member_params, sample_rows, scale, offset)
+             for member in range(n_members)]
+    print(f"Fitting {n_members} members x {trees_per_member} trees on {sample_rows}-row bootstrap samples...")
+
+    start = time.perf_counter()
+    if workers == 0:
+        members = [fit_member(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            members = list(pool.map(fit_member, *zip(*tasks)))
+    timings['fit'] = time.perf_counter() - start
+
+    model, forest = merge_members(members, classes)
+
+    start = time.perf_counter()
+    accuracy, test_rows = evaluate(forest, dataset, scale, offset, chunk_rows)
+    timings['evaluate'] = time.perf_counter() - start
+    print(f"Accuracy Score: {accuracy:.4f} ({accuracy*100:.2f}%) on {test_rows} hashed test rows")
+
+    os.makedirs(output_dir, exist_ok=True)
+    crop_dict = dict(config.CROPS)
+    feature_names = list(dataset.feature_names)
+    bundle_path = os.path.join(output_dir, 'crop_model.bundle')
+    bundle_size = write_bundle(
+        bundle_path, forest, crop_dict, feature_names, scale, offset,
+        metadata={
+            'accuracy': float(accuracy),
+            'n_estimators': int(forest.n_trees),
+            'params': {k: v for k, v in params.items() if k != 'n_jobs'},
+            'out_of_core': {'members': n_members, 'trees_per_member': trees_per_member,
+                            'member_rows': sample_rows},
+            'split': {'method': 'hash', 'source': os.path.abspath(source),
+                      'test_size': config.TEST_SIZE, 'seed': config.RANDOM_STATE},
+            'train_rows': int(stats.n_samples),
+            'trained_at': pd.Timestamp.now(tz='UTC').isoformat()
+        }
+    )
+    print(f"[OK] Model bundle saved: {bundle_path} ({bundle_size / 1024:.1f} KB)")
+
+    minmax_scaler, standard_scaler = scalers_from_stats(stats)
+    artifacts = {
+        'minmax_scaler.pkl': minmax_scaler,
+        'standard_scaler.pkl': standard_scaler,
+        'fused_scaler.pkl': {'scale': scale, 'offset': offset},
+        'crop_mapping.pkl': crop_dict,
+        'feature_names.pkl': feature_names
+    }
+    model_path = os.path.join(output_dir, 'crop_recommendation_model.pkl')
+    if model is not None:
+        artifacts['crop_recommendation_model.pkl'] = model
+    else:
+        # A model pickle left by an earlier run would be loaded with the new scalers
+        if os.path.exists(model_path):
+            os.remove(model_path)
+            print(f"[OK] Stale model pickle removed: {model_path}")
+        print("[WARN] Some members did not see every crop; the sklearn model pickle was not "
+              "written (serve the bundle with the compiled engine, or raise the member rows)")
+    for name, artifact in artifacts.items():
+        with open(os.path.join(output_dir, name), 'wb') as f:
+            pickle.dump(artifact, f)
+    print(f"[OK] Pickled artifacts saved: {', '.join(sorted(artifacts))}")
+
+    return {
+        'rows': int(dataset.rows),
+        'train_rows': int(stats.n_samples),
+        'test_rows': int(test_rows),
+        'class_counts': dict(zip(classes.tolist(), class_counts.tolist())),
+        'accuracy': float(accuracy),
+        'members': n_members,
+        'n_trees': int(forest.n_trees),
+        'timings': timings,
+        'bundle_path': bundle_path
+    }
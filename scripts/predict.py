@@ -5,70 +5,239 @@ This module handles making predictions using the trained model.
 It loads the saved model, scalers, and makes predictions for new crop conditions.
 """
 
+import itertools
 import pickle
+import time
 import numpy as np
 import os
-from pathlib import Path
+from datetime import datetime, timezone
+
+import metrics
+from model_bundle import load_bundle
+from shared_model import attach as attach_shared_model
+from tree_engine import FlattenedForest
+from validation import ValidationError, validate_records
 
 # Paths
 MODELS_PATH = os.path.join(os.path.dirname(__file__), '..', 'models')
 
+BUNDLE_FILE = 'crop_model.bundle'
+
+# Compressed model variants written by compress.py, as <variant>.bundle
+COMPRESSED_PATH = os.path.join(MODELS_PATH, 'compressed')
+
+# Inference engines: sklearn's predict_proba or the flattened-array forest
+ENGINES = ('sklearn', 'compiled')
+
+# Keys of a prediction result; ``fields=`` selects a subset ('alternatives' needs top_k)
+PREDICTION_FIELDS = ('crop', 'crop_id', 'confidence', 'alternatives', 'input')
+
+# Process-wide counter so every model load gets a distinct generation
+_model_generations = itertools.count(1)
+
+
+def fuse_scalers(minmax_scaler, standard_scaler):
+    """
+    Collapse a fitted MinMaxScaler -> StandardScaler chain into one affine map.
+    
+    MinMaxScaler computes ``x * a + b`` and StandardScaler ``(y - mean) / std``,
+    so the chain is ``x * (a / std) + (b - mean) / std``.
+    
+    Parameters:
+    -----------
+    minmax_scaler : MinMaxScaler
+        Fitted scaler applied first
+    standard_scaler : StandardScaler
+        Fitted scaler applied to the MinMaxScaler output
+    
+    Returns:
+    --------
+    tuple : (scale, offset) float64 arrays with one entry per feature
+    """
+    scale = np.asarray(minmax_scaler.scale_, dtype=np.float64).copy()
+    offset = np.asarray(minmax_scaler.min_, dtype=np.float64).copy()
+    
+    if standard_scaler.with_mean:
+        offset -= standard_scaler.mean_
+    if standard_scaler.with_std:
+        scale /= standard_scaler.scale_
+        offset /= standard_scaler.scale_
+    
+    return scale, offset
+
+
+def top_k_classes(proba, k):
+    """
+    Rank the ``k`` most probable classes of every row.
+    
+    Uses ``argpartition`` so only the top ``k`` columns of each row are sorted.
+    Ties go to the lower column index, so the first column always agrees with
+    ``np.argmax(proba, axis=1)``.
+    
+    Parameters:
+    -----------
+    proba : np.ndarray
+        (n, n_classes) probability matrix
+    k : int
+        Number of classes to keep (capped at n_classes)
+    
+    Returns:
+    --------
+    tuple : (indices, probabilities), both (n, k), best class first
+    """
+    n_classes = proba.shape[1]
+    k = min(k, n_classes)
+    
+    # Break ties toward the lower index with a nudge far below any real gap
+    # between averaged tree probabilities
+    key = proba + (n_classes - np.arange(n_classes)) * 1e-14
+    
+    if k < n_classes:
+        top = np.argpartition(key, -k, axis=1)[:, -k:]
+    else:
+        top = np.broadcast_to(np.arange(n_classes), proba.shape)
+    order = np.argsort(-np.take_along_axis(key, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(proba, top, axis=1)
+
+
+def _load_pickle(path, description):
+    """Unpickle one model artifact, closing the file afterwards."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{description} not found at {path}")
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
 class CropRecommendationPredictor:
     """
     A class to handle crop recommendation predictions.
     """
     
-    def __init__(self):
-        """Initialize the predictor by loading model and scalers."""
+    def __init__(self, engine='sklearn', bundle_path=None, variant=None, version=None, shared_model=None):
+        """
+        Initialize the predictor by loading model and scalers.
+        
+        Parameters:
+        -----------
+        engine : str
+            'sklearn' evaluates the pickled RandomForestClassifier directly;
+            'compiled' uses a FlattenedForest (see tree_engine.py) for
+            vectorized, thread-free inference
+        bundle_path : str, optional
+            Model bundle used by the compiled engine (see model_bundle.py).
+            Defaults to models/crop_model.bundle when it exists; otherwise the
+            compiled engine flattens the pickled model at load time
+        variant : str, optional
+            Name of a compressed variant from compress.py (e.g. 'prune_d12'),
+            loaded from models/compressed/<variant>.bundle. Compiled engine only
+        version : str, optional
+            Registry version of ``bundle_path``, reported as ``model_version``
+        shared_model : str, optional
+            Name of a shared memory segment published by
+            ``shared_model.SharedModelPublisher``. The forest is mapped
+            read-only from it instead of loaded from disk. Compiled engine only
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        if variant is not None:
+            if engine != 'compiled':
+                raise ValueError("Compressed model variants require engine='compiled'")
+            bundle_path = os.path.join(COMPRESSED_PATH, f'{variant}.bundle')
+        if shared_model is not None and engine != 'compiled':
+            raise ValueError("Shared-memory models require engine='compiled'")
+        
+        self.engine = engine
+        self.bundle_path = bundle_path
+        self.shared_model = shared_model
         self.model = None
+        self.forest = None
         self.minmax_scaler = None
         self.standard_scaler = None
+        self.fused_scale = None
+        self.fused_offset = None
         self.crop_mapping = None
         self.reverse_crop_mapping = None
         self.feature_names = None
+        self.model_metadata = {}
+        self.model_generation = None
+        self.model_version = version
+        self.loaded_at = None
+        self.load_seconds = None
         
         self._load_models()
     
     def _load_models(self):
         """Load the trained model and scalers from disk."""
         try:
-            model_path = os.path.join(MODELS_PATH, 'crop_recommendation_model.pkl')
-            minmax_path = os.path.join(MODELS_PATH, 'minmax_scaler.pkl')
-            standard_path = os.path.join(MODELS_PATH, 'standard_scaler.pkl')
-            mapping_path = os.path.join(MODELS_PATH, 'crop_mapping.pkl')
-            features_path = os.path.join(MODELS_PATH, 'feature_names.pkl')
-            
-            # Load model
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"Model not found at {model_path}")
-            self.model = pickle.load(open(model_path, 'rb'))
+            start = time.perf_counter()
+            bundle_path = self.bundle_path or os.path.join(MODELS_PATH, BUNDLE_FILE)
             
-            # Load scalers
-            if not os.path.exists(minmax_path):
-                raise FileNotFoundError(f"MinMaxScaler not found at {minmax_path}")
-            self.minmax_scaler = pickle.load(open(minmax_path, 'rb'))
+            if self.shared_model is not None:
+                self._use_bundle(attach_shared_model(self.shared_model))
+            elif self.engine == 'compiled' and (self.bundle_path or os.path.exists(bundle_path)):
+                self._load_bundle(bundle_path)
+            else:
+                self._load_pickles()
             
-            if not os.path.exists(standard_path):
-                raise FileNotFoundError(f"StandardScaler not found at {standard_path}")
-            self.standard_scaler = pickle.load(open(standard_path, 'rb'))
-            
-            # Load crop mapping
-            if not os.path.exists(mapping_path):
-                raise FileNotFoundError(f"Crop mapping not found at {mapping_path}")
-            self.crop_mapping = pickle.load(open(mapping_path, 'rb'))
             self.reverse_crop_mapping = {v: k for k, v in self.crop_mapping.items()}
             
-            # Load feature names
-            if not os.path.exists(features_path):
-                raise FileNotFoundError(f"Feature names not found at {features_path}")
-            self.feature_names = pickle.load(open(features_path, 'rb'))
+            # Lets caches in front of the predictor detect reloads
+            self.model_generation = next(_model_generations)
+            self.load_seconds = time.perf_counter() - start
+            self.loaded_at = datetime.now(timezone.utc).isoformat()
             
             print("✓ All models loaded successfully!")
             
         except Exception as e:
             raise RuntimeError(f"Error loading models: {e}")
     
-    def predict(self, N, P, K, temperature, humidity, ph, rainfall):
+    def _load_bundle(self, bundle_path):
+        """Load the memory-mapped forest, scaler and mapping from one bundle."""
+        if not os.path.exists(bundle_path):
+            raise FileNotFoundError(f"Model bundle not found at {bundle_path}")
+        self._use_bundle(load_bundle(bundle_path))
+    
+    def _use_bundle(self, bundle):
+        """Take the forest, scaler and mapping from a loaded ModelBundle."""
+        self.model = None
+        self.minmax_scaler = None
+        self.standard_scaler = None
+        self.forest = bundle.forest
+        self.fused_scale = bundle.scale
+        self.fused_offset = bundle.offset
+        self.crop_mapping = bundle.crop_mapping
+        self.feature_names = bundle.feature_names
+        self.model_metadata = bundle.metadata
+        if bundle.version is not None:
+            self.model_version = bundle.version
+    
+    def _load_pickles(self):
+        """Load the pickled model, scalers, crop mapping and feature names."""
+        self.model = _load_pickle(os.path.join(MODELS_PATH, 'crop_recommendation_model.pkl'), "Model")
+        self.minmax_scaler = _load_pickle(os.path.join(MODELS_PATH, 'minmax_scaler.pkl'), "MinMaxScaler")
+        self.standard_scaler = _load_pickle(os.path.join(MODELS_PATH, 'standard_scaler.pkl'), "StandardScaler")
+        self.crop_mapping = _load_pickle(os.path.join(MODELS_PATH, 'crop_mapping.pkl'), "Crop mapping")
+        self.feature_names = _load_pickle(os.path.join(MODELS_PATH, 'feature_names.pkl'), "Feature names")
+        self.model_metadata = {}
+        
+        # Fused scaler is optional; without it the two scalers are chained
+        fused_path = os.path.join(MODELS_PATH, 'fused_scaler.pkl')
+        if os.path.exists(fused_path):
+            fused = _load_pickle(fused_path, "Fused scaler")
+            self.fused_scale = np.asarray(fused['scale'], dtype=np.float64)
+            self.fused_offset = np.asarray(fused['offset'], dtype=np.float64)
+        else:
+            self.fused_scale = None
+            self.fused_offset = None
+        
+        self.forest = FlattenedForest.from_sklearn(self.model) if self.engine == 'compiled' else None
+    
+    def reload(self):
+        """Reload the model artifacts from disk (invalidates result caches)."""
+        self._load_models()
+    
+    def predict(self, N, P, K, temperature, humidity, ph, rainfall, top_k=None):
         """
         Predict the best crop recommendation based on given conditions.
         
@@ -88,6 +257,8 @@ class CropRecommendationPredictor:
             pH level
         rainfall : float
             Rainfall (mm)
+        top_k : int, optional
+            Also return the ``top_k`` most likely crops under 'alternatives'
         
         Returns:
         --------
@@ -95,71 +266,302 @@ class CropRecommendationPredictor:
         """
         
         try:
-            # Create feature array
-            features = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
+            timer = metrics.stage_timer('predict')
+            features = np.array([[N, P, K, temperature, humidity, ph, rainfall]], dtype=np.float64)
             
-            # Apply MinMaxScaler
-            features_minmax = self.minmax_scaler.transform(features)
+            inputs = [{
+                'N': N,
+                'P': P,
+                'K': K,
+                'temperature': temperature,
+                'humidity': humidity,
+                'ph': ph,
+                'rainfall': rainfall
+            }]
+            timer.mark('features')
             
-            # Apply StandardScaler
-            features_scaled = self.standard_scaler.transform(features_minmax)
-            
-            # Make prediction
-            prediction_label = self.model.predict(features_scaled)[0]
-            
-            # Get prediction probabilities
-            prediction_proba = self.model.predict_proba(features_scaled)
-            max_confidence = np.max(prediction_proba) * 100
-            
-            # Convert label to crop name
-            crop_name = self.reverse_crop_mapping[prediction_label]
-            
-            return {
-                'crop': crop_name,
-                'crop_id': int(prediction_label),
-                'confidence': round(max_confidence, 2),
-                'input': {
-                    'N': N,
-                    'P': P,
-                    'K': K,
-                    'temperature': temperature,
-                    'humidity': humidity,
-                    'ph': ph,
-                    'rainfall': rainfall
-                }
-            }
+            return self._predict_matrix(features, inputs, top_k, timer)[0]
         
         except Exception as e:
             raise RuntimeError(f"Error during prediction: {e}")
     
-    def predict_batch(self, data):
+    def predict_batch(self, data, top_k=None):
         """
         Make predictions for a batch of data.
         
+        The whole batch is validated and stacked into a single (n, 7) matrix
+        (see validation.py), scaled once and scored with one ``predict_proba``
+        call; labels come from the argmax of the probabilities, so each row
+        costs no extra model passes.
+        
         Parameters:
         -----------
         data : list of dict
             List of dictionaries containing features
+        top_k : int, optional
+            Also return the ``top_k`` most likely crops for each row
         
         Returns:
         --------
-        list : List of prediction results
-        """
-        results = []
-        for row in data:
-            result = self.predict(
-                row['N'],
-                row['P'],
-                row['K'],
-                row['temperature'],
-                row['humidity'],
-                row['ph'],
-                row['rainfall']
-            )
-            results.append(result)
+        list : List of prediction results (same dicts as ``predict``)
+        
+        Raises:
+        -------
+        ValidationError : If any row is invalid; raised before any row is scored
+        """
+        if len(data) == 0:
+            return []
+        
+        validation = validate_records(data, self.feature_names)
+        if not validation.ok:
+            raise ValidationError(validation.error_list())
+        return self.predict_validated(validation, top_k)
+    
+    def predict_validated(self, validation, top_k=None, fields=None):
+        """
+        Score the valid rows of a ``validate_records`` result.
+        
+        Parameters:
+        -----------
+        validation : validation.ValidationResult
+            Validated batch; its ``features`` matrix is scaled in place
+        top_k : int, optional
+            Also return the ``top_k`` most likely crops for each row
+        fields : collection of str, optional
+            Keys from PREDICTION_FIELDS to include in each result (default: all).
+            Leaving out 'input' also skips building the echoed input dicts
+        
+        Returns:
+        --------
+        list : One prediction dict per valid row, in input order
+        """
+        if len(validation.features) == 0:
+            return []
+        
+        timer = metrics.stage_timer('predict_batch')
+        metrics.observe_batch('predict_batch', len(validation.features))
+        inputs = validation.inputs() if fields is None or 'input' in fields else None
+        timer.mark('features')
+        
+        return self._predict_matrix(validation.features, inputs, top_k, timer, fields)
+    
+    def predict_arrays(self, validation, top_k=None, timer=None):
+        """
+        Score the valid rows of a ``validate_records`` / ``validate_matrix`` result
+        as NumPy arrays, without building any per-row Python objects.
+        
+        Returns:
+        --------
+        dict : 'ids' (n,) crop ids and 'confidences' (n,) percent; with
+            ``top_k``, also 'alternatives' holding (n, top_k) 'ids' and
+            'confidences', best first
+        """
+        timer = timer or metrics.stage_timer('predict_batch')
+        metrics.observe_batch('predict_batch', len(validation.features))
+        timer.mark('features')
+        if len(validation.features) == 0:
+            arrays = {'ids': np.empty(0, dtype=np.int64), 'confidences': np.empty(0)}
+            if top_k:
+                arrays['alternatives'] = {'ids': np.empty((0, top_k), dtype=np.int64),
+                                          'confidences': np.empty((0, top_k))}
+            return arrays
+        
+        labels, confidences, top_ids, top_proba = self._rank(validation.features, top_k, timer)
+        arrays = {'ids': labels, 'confidences': confidences}
+        if top_ids is not None:
+            arrays['alternatives'] = {'ids': top_ids, 'confidences': top_proba * 100}
+        return arrays
+    
+    def predict_columns(self, validation, top_k=None):
+        """
+        Score the valid rows of a ``validate_records`` result as parallel arrays.
+        
+        The compact counterpart of ``predict_validated``: no per-row dicts and
+        no echoed inputs. Numeric columns stay NumPy arrays, which the
+        serializers in serialization.py encode directly.
+        
+        Returns:
+        --------
+        dict : 'crops' (list of str), 'ids' (int array) and 'confidences'
+            (float array, percent); with ``top_k``, also 'alternatives' holding
+            the same three keys as (n, top_k) nested lists/arrays, best first
+        """
+        timer = metrics.stage_timer('predict_batch')
+        arrays = self.predict_arrays(validation, top_k, timer)
+        
+        names = np.array([self.reverse_crop_mapping.get(crop_id)
+                          for crop_id in range(int(max(self.reverse_crop_mapping)) + 1)], dtype=object)
+        columns = {
+            'crops': names[arrays['ids']].tolist(),
+            'ids': arrays['ids'].astype(np.int64),
+            'confidences': np.round(arrays['confidences'], 2)
+        }
+        if 'alternatives' in arrays:
+            alternatives = arrays['alternatives']
+            columns['alternatives'] = {
+                'crops': names[alternatives['ids']].tolist(),
+                'ids': alternatives['ids'].astype(np.int64),
+                'confidences': np.round(alternatives['confidences'], 2)
+            }
+        timer.mark('format')
+        return columns
+    
+    @property
+    def crop_ids(self):
+        """Crop ids in the column order of ``predict_proba``."""
+        if self.forest is not None:
+            return self.forest.classes
+        return self.model.classes_
+    
+    def predict_proba(self, features):
+        """
+        Class probabilities for a raw feature matrix.
+        
+        Parameters:
+        -----------
+        features : np.ndarray
+            Unscaled (n, 7) float64 matrix in ``feature_names`` order. It is
+            scaled in place when the fused scaler is loaded
+        
+        Returns:
+        --------
+        np.ndarray : (n, n_crops) probabilities, columns ordered as ``crop_ids``
+        """
+        return self._model_proba(self._scale(features))
+    
+    def _model_proba(self, features_scaled):
+        """Run the loaded engine on an already scaled feature matrix."""
+        if self.forest is not None:
+            return self.forest.predict_proba(features_scaled)
+        return self.model.predict_proba(features_scaled)
+    
+    def _scale(self, features):
+        """
+        Apply the MinMaxScaler + StandardScaler transform to a feature matrix.
+        
+        With the fused scaler loaded this is a single in-place multiply-add on
+        ``features`` when it is a writeable float64 array owned by the caller.
+        Other inputs (such as a read-only float32 view of a binary request
+        body) are scaled into one new float64 array instead. Without the fused
+        scaler it falls back to the two pickled sklearn scalers.
+        """
+        if self.fused_scale is None:
+            return self._scale_two_step(features)
+        
+        if features.dtype == np.float64 and features.flags.writeable:
+            features *= self.fused_scale
+        else:
+            features = features * self.fused_scale
+        features += self.fused_offset
+        return features
+    
+    def _scale_two_step(self, features):
+        """Scale with the pickled MinMaxScaler followed by the StandardScaler."""
+        features_minmax = self.minmax_scaler.transform(features)
+        return self.standard_scaler.transform(features_minmax)
+    
+    def _rank(self, features, top_k=None, timer=metrics.NULL_TIMER):
+        """
+        Scale and score an (n, 7) raw feature matrix.
+        
+        Label, confidence and ranked alternatives all come from a single
+        ``predict_proba`` pass over the whole matrix.
+        
+        Returns:
+        --------
+        tuple : (crop ids, confidences in percent, (n, top_k) crop ids or None,
+            (n, top_k) probabilities or None)
+        """
+        features_scaled = self._scale(features)
+        timer.mark('scale')
+        prediction_proba = self._model_proba(features_scaled)
+        timer.mark('model')
+        crop_ids = self.crop_ids
+        
+        if top_k:
+            if top_k < 1:
+                raise ValueError("top_k must be at least 1")
+            top, top_proba = top_k_classes(prediction_proba, top_k)
+            top_ids = crop_ids[top]
+            labels = top_ids[:, 0]
+            confidences = top_proba[:, 0] * 100
+        else:
+            best = np.argmax(prediction_proba, axis=1)
+            labels = crop_ids[best]
+            confidences = prediction_proba[np.arange(len(best)), best] * 100
+            top_ids = top_proba = None
+        timer.mark('rank')
+        return labels, confidences, top_ids, top_proba
+    
+    def _predict_matrix(self, features, inputs, top_k=None, timer=metrics.NULL_TIMER, fields=None):
+        """
+        Score an (n, 7) raw feature matrix and build the result dicts.
+        
+        Parameters:
+        -----------
+        features : np.ndarray
+            Unscaled feature matrix, one row per sample
+        inputs : list of dict
+            Input values echoed back in each result, aligned with ``features``
+            (None when 'input' is not among ``fields``)
+        top_k : int, optional
+            Number of ranked alternatives to include per row
+        timer : metrics.StageTimer, optional
+            Receives the 'scale', 'model', 'rank' and 'format' stage timings
+        fields : collection of str, optional
+            Keys from PREDICTION_FIELDS to include (default: all)
+        
+        Returns:
+        --------
+        list : List of prediction result dicts
+        """
+        labels, confidences, top_ids, top_proba = self._rank(features, top_k, timer)
+        fields = PREDICTION_FIELDS if fields is None else fields
+        alternatives = None
+        if top_ids is not None and 'alternatives' in fields:
+            alternatives = self._format_alternatives(top_ids, top_proba)
+        
+        if fields is PREDICTION_FIELDS:
+            results = []
+            for i, (label, confidence, row) in enumerate(zip(labels.tolist(), confidences.tolist(), inputs)):
+                result = {
+                    'crop': self.reverse_crop_mapping[label],
+                    'crop_id': int(label),
+                    'confidence': round(confidence, 2),
+                    'input': row
+                }
+                if alternatives is not None:
+                    result['alternatives'] = alternatives[i]
+                results.append(result)
+        else:
+            columns = {}
+            if 'crop' in fields:
+                columns['crop'] = [self.reverse_crop_mapping[label] for label in labels.tolist()]
+            if 'crop_id' in fields:
+                columns['crop_id'] = labels.astype(np.int64).tolist()
+            if 'confidence' in fields:
+                columns['confidence'] = [round(confidence, 2) for confidence in confidences.tolist()]
+            if alternatives is not None:
+                columns['alternatives'] = alternatives
+            if 'input' in fields:
+                columns['input'] = inputs
+            results = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        timer.mark('format')
         
         return results
     
+    def _format_alternatives(self, top_ids, top_proba):
+        """Turn ranked (n, k) crop ids and probabilities into lists of dicts."""
+        confidences = (top_proba * 100).tolist()
+        return [
+            [
+                {'crop': self.reverse_crop_mapping[crop_id], 'crop_id': crop_id,
+                 'confidence': round(confidence, 2)}
+                for crop_id, confidence in zip(row_ids, row_confidences)
+            ]
+            for row_ids, row_confidences in zip(top_ids.tolist(), confidences)
+        ]
+    
     def get_crop_info(self):
         """
         Get information about all supported crops.
@@ -0,0 +1,147 @@
+"""
+Prediction Result Cache
+
+An LRU + TTL cache placed in front of ``CropRecommendationPredictor.predict``.
+Inputs are quantized per feature before lookup, so sensor readings that only
+differ below their reporting precision share one cached result.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results keyed on quantized inputs.
+
+    Entries expire ``ttl_seconds`` after they were stored, and the cache is
+    cleared automatically when the predictor reloads its model artifacts
+    (detected through ``predictor.model_generation``).
+    """
+
+    def __init__(self, feature_names, quantization, max_entries=10000,
+                 ttl_seconds=300.0, clock=time.monotonic):
+        """
+        Parameters:
+        -----------
+        feature_names : list of str
+            Feature order used to build cache keys
+        quantization : dict
+            Step size per feature; values are bucketed as ``round(x / step)``.
+            Features with a missing or zero step are keyed on their exact value
+        max_entries : int
+            Maximum number of cached results before LRU eviction
+        ttl_seconds : float
+            Lifetime of a cached result
+        clock : callable
+            Monotonic time source (overridable for tests)
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+
+        self.feature_names = list(feature_names)
+        self.steps = [quantization.get(name) or None for name in self.feature_names]
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def key(self, values):
+        """Build the quantized cache key for a dict of feature values."""
+        return tuple(
+            values[name] if step is None else round(values[name] / step)
+            for name, step in zip(self.feature_names, self.steps)
+        )
+
+    def get_or_predict(self, predictor, values, top_k=None):
+        """
+        Return the cached result for ``values`` or compute and store it.
+
+        Parameters:
+        -----------
+        predictor : CropRecommendationPredictor
+            Predictor used on a cache miss
+        values : dict
+            Feature values, as passed to ``predictor.predict``
+        top_k : int, optional
+            Number of ranked alternatives (part of the cache key)
+
+        Returns:
+        --------
+        dict : Prediction result whose ``input`` echoes ``values``
+        """
+        key = self.key(values) + (top_k,)
+        generation = predictor.model_generation
+
+        with self._lock:
+            self._sync_generation(generation)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result, input=values)
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Run the model outside the lock so concurrent misses do not serialize
+        result = predictor.predict(**values, top_k=top_k)
+        cached = {k: v for k, v in result.items() if k != 'input'}
+
+        with self._lock:
+            # Drop the result if the model was reloaded while predicting
+            if generation == self._generation:
+                self._entries[key] = (self.clock() + self.ttl_seconds, cached)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return result
+
+    def _sync_generation(self, generation):
+        """Clear the cache when the predictor's model generation changes."""
+        if generation != self._generation:
+            if self._generation is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+        --------
+        dict : Size, capacity and hit/miss/eviction counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,248 @@
+"""
+Versioned Model Registry
+
+A directory of immutable, versioned model bundles plus a ``CURRENT`` file
+naming the active version:
+
+    models/registry/
+        CURRENT                  # e.g. "v0003"
+        versions/v0001.bundle
+        versions/v0002.bundle
+        versions/v0003.bundle
+
+Publishing copies a bundle in under a new version. Activating a version (or
+rolling back) rewrites ``CURRENT`` with a temp file + rename, so readers see
+either the old or the new pointer and never a partial one. Servers poll the
+pointer with ``RegistryWatcher`` and swap models in without restarting.
+
+Usage:
+    python scripts/registry.py publish models/crop_model.bundle [--version v0004] [--no-activate]
+    python scripts/registry.py activate v0003
+    python scripts/registry.py list
+"""
+
+import os
+import re
+import shutil
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from model_bundle import read_header
+
+CURRENT_FILE = 'CURRENT'
+VERSIONS_DIR = 'versions'
+BUNDLE_SUFFIX = '.bundle'
+
+_VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def _check_version(version):
+    """Reject version names that are not a single safe path component."""
+    if not _VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid version name '{version}'")
+    return version
+
+
+class ModelRegistry:
+    """
+    Versioned bundles with an atomically updated "current" pointer.
+
+    Parameters:
+    -----------
+    root : str
+        Registry directory (created on first publish)
+    """
+
+    def __init__(self, root=config.MODEL_REGISTRY_PATH):
+        self.root = root
+
+    @property
+    def versions_dir(self):
+        return os.path.join(self.root, VERSIONS_DIR)
+
+    def bundle_path(self, version):
+        """Path of a version's bundle file."""
+        return os.path.join(self.versions_dir, f'{version}{BUNDLE_SUFFIX}')
+
+    def versions(self):
+        """All published versions, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = [name[:-len(BUNDLE_SUFFIX)] for name in os.listdir(self.versions_dir)
+                 if name.endswith(BUNDLE_SUFFIX)]
+        return sorted(names)
+
+    def current_version(self):
+        """
+        The active version, or None when nothing has been activated.
+
+        Raises ValueError when ``CURRENT`` holds something other than a
+        version name, so it can never point outside the registry.
+        """
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return _check_version(version) if version else None
+
+    def _next_version(self):
+        numbers = [int(v[1:]) for v in self.versions() if re.fullmatch(r'v\d+', v)]
+        return f"v{max(numbers, default=0) + 1:04d}"
+
+    def publish(self, bundle_path, version=None, activate=True):
+        """
+        Copy a bundle into the registry as a new version.
+
+        Parameters:
+        -----------
+        bundle_path : str
+            Model bundle to publish (checked with ``read_header``)
+        version : str, optional
+            Version name (default: next ``vNNNN``)
+        activate : bool
+            Point ``CURRENT`` at the new version once it is in place
+
+        Returns:
+        --------
+        str : The published version
+        """
+        read_header(bundle_path)
+        version = _check_version(version or self._next_version())
+
+        target = self.bundle_path(version)
+        if os.path.exists(target):
+            raise ValueError(f"Version '{version}' already exists")
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        tmp_path = f"{target}.tmp"
+        shutil.copyfile(bundle_path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Atomically point ``CURRENT`` at an existing version."""
+        _check_version(version)
+        if not os.path.exists(self.bundle_path(version)):
+            raise ValueError(f"Unknown version '{version}'")
+
+        tmp_path = os.path.join(self.root, f'{CURRENT_FILE}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+
+
+class RegistryWatcher:
+    """
+    Background thread that polls a registry and reports pointer changes.
+
+    ``on_change(version)`` runs on the watcher thread, so a slow model load
+    never blocks request handling; it should swap the new model in only once
+    it is fully loaded. A version that fails to load is not retried until
+    ``CURRENT`` changes again.
+
+    Parameters:
+    -----------
+    registry : ModelRegistry
+        Registry to watch
+    on_change : callable
+        Called with the new version name
+    interval : float
+        Seconds between polls
+    version : str, optional
+        Version already being served
+    """
+
+    def __init__(self, registry, on_change, interval=config.REGISTRY_POLL_SECONDS, version=None):
+        self.registry = registry
+        self.on_change = on_change
+        self.interval = interval
+        self.version = version
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='registry-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Poll once.
+
+        Returns:
+        --------
+        bool : True when a new version was loaded
+        """
+        try:
+            version = self.registry.current_version()
+        except ValueError as e:
+            print(f"[WARN] Ignoring registry pointer: {e}", file=sys.stderr)
+            return False
+        if version is None or version == self.version:
+            return False
+
+        self.version = version
+        try:
+            self.on_change(version)
+        except Exception as e:
+            print(f"[WARN] Could not load model version {version}: {e}", file=sys.stderr)
+            return False
+        return True
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the versioned model registry')
+    parser.add_argument('--root', default=config.MODEL_REGISTRY_PATH, help='Registry directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help='Publish a bundle as a new version')
+    publish_parser.add_argument('bundle', help='Model bundle file')
+    publish_parser.add_argument('--version', default=None, help='Version name (default: next vNNNN)')
+    publish_parser.add_argument('--no-activate', action='store_true',
+                                help='Publish without making it current')
+
+    activate_parser = subparsers.add_parser('activate', help='Make a version current')
+    activate_parser.add_argument('version')
+
+    subparsers.add_parser('list', help='List published versions')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+
+    if args.command == 'publish':
+        version = registry.publish(args.bundle, args.version, activate=not args.no_activate)
+        print(f"[OK] Published {args.bundle} as {version}"
+              + ("" if args.no_activate else " (current)"))
+    elif args.command == 'activate':
+        registry.activate(args.version)
+        print(f"[OK] Current version: {args.version}")
+    else:
+        current = registry.current_version()
+        for version in registry.versions():
+            print(f"{'*' if version == current else ' '} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Offline Bulk Scoring
+
+Scores a CSV or Parquet file containing the ``config.FEATURES`` columns. The
+input is read in chunks and the chunks are scored across a process pool with
+the model loaded once per worker. Results are written in input order, with
+the predicted crop, crop id, confidence and top-k probabilities for every row.
+
+Each chunk is checked with ``validation.validate_matrix`` before scoring:
+missing (empty), non-finite and out-of-range values are never scored. With
+``--on-error reject`` (config.VALIDATION_MODE) the run stops at the first
+chunk with invalid rows; with ``--on-error skip`` those rows are written with
+an empty prediction and the reason in the ``error`` column.
+
+Memory stays bounded by ``chunk_size * max_inflight`` rows, whatever the input
+size. After each written chunk a checkpoint file records progress, so an
+interrupted run can continue with ``--resume``.
+
+Usage:
+    python scripts/score.py input.csv predictions.csv [--workers 4] [--top-k 3]
+    python scripts/score.py input.parquet predictions.csv --resume
+    python scripts/score.py input.csv predictions.csv --on-error skip
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import read_csv_rows
+from predict import CropRecommendationPredictor, top_k_classes
+from validation import VALIDATION_MODES, ValidationError, parse_validation_mode, validate_matrix
+
+# Model loaded once per worker process by _init_worker
+_predictor = None
+
+
+def _init_worker(engine):
+    """Process pool initializer: load the model once per worker."""
+    global _predictor
+    _predictor = CropRecommendationPredictor(engine=engine)
+
+
+def score_chunk(features, top_k, predictor=None):
+    """
+    Validate one chunk of raw features and score its valid rows.
+
+    Parameters:
+    -----------
+    features : np.ndarray
+        (n, 7) float64 matrix in ``config.FEATURES`` order
+    top_k : int
+        Number of ranked alternatives to return per row
+    predictor : CropRecommendationPredictor, optional
+        Defaults to the worker's predictor
+
+    Returns:
+    --------
+    dict : 'valid' (n,) bool mask, 'errors' (chunk row -> list of messages)
+        and the 'crop_id', 'confidence', 'top_ids' and 'top_proba' arrays of
+        the valid rows
+    """
+    predictor = predictor or _predictor
+    validation = validate_matrix(features)
+    proba = predictor.predict_proba(validation.features)
+    top, top_proba = top_k_classes(proba, top_k)
+    crop_ids = predictor.crop_ids
+    return {
+        'valid': validation.valid,
+        'errors': validation.errors,
+        'crop_id': crop_ids[top[:, 0]],
+        'confidence': top_proba[:, 0] * 100,
+        'top_ids': crop_ids[top],
+        'top_proba': top_proba
+    }
+
+
+def iter_input_chunks(path, chunk_size, skip_rows=0):
+    """
+    Yield (n, 7) float64 feature matrices from a CSV or Parquet file.
+
+    Parameters:
+    -----------
+    path : str
+        Input file (.csv or .parquet)
+    chunk_size : int
+        Rows per chunk
+    skip_rows : int
+        Leading data rows to skip (used when resuming)
+    """
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet input requires pyarrow (pip install pyarrow)")
+
+        to_skip = skip_rows
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=config.FEATURES):
+            features = np.column_stack([
+                batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+                for name in config.FEATURES
+            ])
+            if to_skip >= len(features):
+                to_skip -= len(features)
+                continue
+            yield features[to_skip:]
+            to_skip = 0
+        return
+
+    reader = read_csv_rows(
+        path,
+        skip_rows,
+        usecols=config.FEATURES,
+        dtype={name: np.float64 for name in config.FEATURES},
+        chunksize=chunk_size
+    )
+    for frame in reader:
+        yield frame[config.FEATURES].to_numpy(dtype=np.float64)
+
+
+class CheckpointedCSVWriter:
+    """
+    Append-only CSV writer that records progress in a JSON checkpoint.
+
+    The checkpoint stores the rows written and the output size in bytes; on
+    resume the output is truncated back to that size, dropping any partial
+    chunk written after the last checkpoint.
+    """
+
+    def __init__(self, path, crop_names, top_k, resume=False, input_path=None):
+        self.path = path
+        self.checkpoint_path = f"{path}.ckpt"
+        self.crop_names = crop_names
+        self.top_k = top_k
+        self.input_path = os.path.abspath(input_path) if input_path else None
+        self.rows_done = 0
+
+        state = self._read_checkpoint() if resume else None
+        if state is not None:
+            if state.get('input') != self.input_path or state.get('top_k') != top_k:
+                raise ValueError("Checkpoint was written for a different input or --top-k")
+            self.rows_done = state['rows_done']
+            self.file = open(path, 'r+b')
+            self.file.truncate(state['output_bytes'])
+            self.file.seek(state['output_bytes'])
+        else:
+            self.file = open(path, 'wb')
+            self.file.write((','.join(self._columns()) + '\n').encode('utf-8'))
+            self._write_checkpoint()
+
+    def _columns(self):
+        columns = ['row', 'crop', 'crop_id', 'confidence']
+        for rank in range(1, self.top_k + 1):
+            columns += [f'top{rank}_crop', f'top{rank}_crop_id', f'top{rank}_proba']
+        return columns + ['error']
+
+    def _read_checkpoint(self):
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.path)):
+            return None
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def _write_checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'input': self.input_path,
+                'top_k': self.top_k,
+                'rows_done': self.rows_done,
+                'output_bytes': self.file.tell()
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def write(self, scored):
+        """Append one scored chunk (invalid rows with empty predictions) and checkpoint it."""
+        valid = scored['valid']
+        n_rows = len(valid)
+
+        def column(values, dtype):
+            # Valid rows get their values, invalid rows are left empty
+            out = pd.Series(pd.NA, index=range(n_rows), dtype=dtype)
+            out[valid] = values
+            return out
+
+        frame = {
+            'row': np.arange(self.rows_done, self.rows_done + n_rows),
+            'crop': column(self.crop_names(scored['crop_id']), object),
+            'crop_id': column(scored['crop_id'], 'Int64'),
+            'confidence': column(np.round(scored['confidence'], 2), 'Float64')
+        }
+        for rank in range(scored['top_ids'].shape[1]):
+            frame[f'top{rank + 1}_crop'] = column(self.crop_names(scored['top_ids'][:, rank]), object)
+            frame[f'top{rank + 1}_crop_id'] = column(scored['top_ids'][:, rank], 'Int64')
+            frame[f'top{rank + 1}_proba'] = column(np.round(scored['top_proba'][:, rank], 4), 'Float64')
+        frame['error'] = ['; '.join(scored['errors'][row]) if row in scored['errors'] else ''
+                          for row in range(n_rows)]
+
+        self.file.write(pd.DataFrame(frame).to_csv(index=False, header=False).encode('utf-8'))
+        self.rows_done += n_rows
+        self._write_checkpoint()
+
+    def close(self, completed=True):
+        """Close the output; remove the checkpoint once the run completed."""
+        self.file.close()
+        if completed and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def score_file(input_path, output_path, chunk_size=100000, workers=None, top_k=3,
+               engine='compiled', resume=False, max_inflight=None, on_error=None):
+    """
+    Score a whole file and write ordered predictions.
+
+    Parameters:
+    -----------
+    input_path, output_path : str
+        Input CSV/Parquet and output CSV
+    chunk_size : int
+        Rows per chunk
+    workers : int
+        Worker processes (0 scores in the current process)
+    top_k : int
+        Ranked alternatives per row
+    engine : str
+        Predictor engine ('sklearn' or 'compiled')
+    resume : bool
+        Continue from the output's checkpoint instead of starting over
+    max_inflight : int
+        Chunks submitted but not yet written (default 2 * workers)
+    on_error : str, optional
+        'reject' stops at the first invalid row, 'skip' writes invalid rows
+        with an empty prediction and their error (default
+        ``config.VALIDATION_MODE``)
+
+    Returns:
+    --------
+    dict : Rows written in this run (scored plus 'rejected'), elapsed
+        seconds and rows/sec
+
+    Raises:
+    -------
+    ValidationError : In 'reject' mode, for the first chunk with invalid rows
+        (the rows before it are written and checkpointed)
+    """
+    mode = parse_validation_mode(on_error)
+    workers = os.cpu_count() if workers is None else workers
+    max_inflight = max_inflight or max(2 * workers, 1)
+
+    local_predictor = CropRecommendationPredictor(engine=engine)
+    if local_predictor.get_feature_names() != config.FEATURES:
+        raise ValueError("Model feature order does not match config.FEATURES")
+    mapping = local_predictor.reverse_crop_mapping
+    names = np.empty(max(mapping) + 1, dtype=object)
+    for crop_id, crop in mapping.items():
+        names[crop_id] = crop
+    crop_names = names.__getitem__
+    top_k = min(top_k, len(local_predictor.crop_ids))
+
+    writer = CheckpointedCSVWriter(output_path, crop_names, top_k,
+                                   resume=resume, input_path=input_path)
+    if writer.rows_done:
+        print(f"Resuming after {writer.rows_done} rows")
+
+    chunks = iter_input_chunks(input_path, chunk_size, skip_rows=writer.rows_done)
+    start = time.perf_counter()
+    start_rows = writer.rows_done
+    rejected = 0
+    completed = False
+
+    def write(scored):
+        nonlocal rejected
+        if scored['errors'] and mode == 'reject':
+            raise ValidationError([{'row': writer.rows_done + row, 'errors': errors}
+                                   for row, errors in sorted(scored['errors'].items())])
+        writer.write(scored)
+        rejected += len(scored['errors'])
+        _report(writer.rows_done - start_rows, start)
+
+    try:
+        if workers == 0:
+            for features in chunks:
+                write(score_chunk(features, top_k, local_predictor))
+        else:
+            del local_predictor
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(engine,)) as pool:
+                pending = deque()
+                for features in chunks:
+                    pending.append(pool.submit(score_chunk, features, top_k))
+                    if len(pending) >= max_inflight:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+        completed = True
+    finally:
+        writer.close(completed=completed)
+
+    elapsed = time.perf_counter() - start
+    rows = writer.rows_done - start_rows
+    return {'rows': rows, 'rejected': rejected, 'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed else 0.0}
+
+
+def _report(rows, start):
+    elapsed = time.perf_counter() - start
+    print(f"\r  {rows:,} rows scored ({rows / max(elapsed, 1e-9):,.0f} rows/s)", end='', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet file of field samples')
+    parser.add_argument('input', help='Input .csv or .parquet with the feature columns')
+    parser.add_argument('output', help='Output .csv file')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count, 0 = in-process)')
+    parser.add_argument('--top-k', type=int, default=3, help='Ranked alternatives per row')
+    parser.add_argument('--engine', choices=['sklearn', 'compiled'], default='compiled')
+    parser.add_argument('--max-inflight', type=int, default=None,
+                        help='Chunks in flight at once (default: 2 x workers)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoint')
+    parser.add_argument('--on-error', choices=VALIDATION_MODES, default=config.VALIDATION_MODE,
+                        help='Stop at invalid rows (reject) or write them with their error (skip)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Crop Recommendation Bulk Scoring")
+    print("=" * 60)
+
+    try:
+        stats = score_file(args.input, args.output, args.chunk_size, args.workers, args.top_k,
+                           args.engine, args.resume, args.max_inflight, args.on_error)
+    except ValidationError as e:
+        parser.exit(1, f"\n\n[ERROR] {e}\nFix the input, or rerun with --resume --on-error skip "
+                       f"to write invalid rows with their error\n")
+
+    print(f"\n\n[OK] {stats['rows']:,} rows scored in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s)")
+    if stats['rejected']:
+        print(f"[WARN] {stats['rejected']:,} invalid rows written without a prediction (see the error column)")
+    print(f"[OK] Predictions written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
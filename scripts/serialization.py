@@ -0,0 +1,102 @@
+"""
+Fast JSON Serialization
+
+One ``dumps`` for every JSON response, and a matching ``loads`` for request
+bodies. They use orjson when it is installed, which encodes NumPy arrays
+natively, and the standard library otherwise:
+
+- 'orjson': ``orjson.dumps`` with NumPy and non-string key support
+  (pip install orjson)
+- 'json':   ``json.dumps`` with compact separators; NumPy arrays and scalars
+  are converted through ``tolist()`` / ``item()``
+
+``config.JSON_BACKEND = 'auto'`` picks orjson when it can be imported. Both
+backends return UTF-8 bytes, ready to be written to a response body.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+BACKENDS = ('auto', 'orjson', 'json')
+
+
+def resolve_backend(name=None):
+    """
+    Turn a configured backend name into the one that will be used.
+
+    Raises:
+    -------
+    ValueError : If the name is not in BACKENDS
+    RuntimeError : If 'orjson' is requested but not installed
+    """
+    name = name or config.JSON_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend '{name}', expected one of {BACKENDS}")
+    if name == 'json':
+        return 'json'
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        if name == 'orjson':
+            raise RuntimeError("The orjson JSON backend requires orjson (pip install orjson)")
+        return 'json'
+    return 'orjson'
+
+
+def _default(obj):
+    """NumPy fallback for ``json.dumps``."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, backend='json'):
+    """
+    Encode ``obj`` as compact JSON.
+
+    Parameters:
+    -----------
+    obj : any
+        Dicts, lists, str/int/float/bool/None and NumPy arrays or scalars
+    backend : str
+        'orjson' or 'json', as returned by ``resolve_backend``
+
+    Returns:
+    --------
+    bytes : UTF-8 encoded JSON
+    """
+    if backend == 'orjson':
+        import orjson
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data, backend='json'):
+    """
+    Decode one JSON document.
+
+    Parameters:
+    -----------
+    data : bytes or str
+        UTF-8 encoded JSON
+    backend : str
+        'orjson' or 'json', as returned by ``resolve_backend``
+
+    Raises:
+    -------
+    ValueError : If ``data`` is not valid JSON (both backends' decode errors
+        subclass it)
+    """
+    if backend == 'orjson':
+        import orjson
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,204 @@
+"""
+Shared-Memory Model Serving
+
+Lets a supervisor load the model once and hand it to any number of worker
+processes, instead of every worker unpickling its own private copy of the
+forest. The supervisor writes a model bundle image (the model_bundle.py
+layout: header, fused scaler, crop mapping and the flattened forest arrays)
+into one POSIX shared memory segment. Workers attach to it by name and get
+read-only NumPy views of the tree arrays, so every worker reads the same
+physical pages.
+
+Lifecycle:
+- ``SharedModelPublisher.publish`` creates a new segment for each model and
+  unlinks the previous one. Workers that already mapped the old segment keep
+  using it until they exit; the kernel frees its memory when the last mapping
+  is gone. New and respawned workers attach to the current segment.
+- ``SharedModelPublisher.close`` unlinks the current segment (at shutdown).
+- Segments are registered with multiprocessing's resource tracker, which
+  unlinks them if the supervisor dies without closing them.
+- Workers attach with ``SharedMemory(name, track=False)`` and only read the
+  segment through read-only views, so a worker exiting never unlinks a
+  segment the supervisor still owns. Before Python 3.13, which has no
+  ``track`` argument, the worker opens the segment with ``SharedMemory(name)``
+  and immediately unregisters it from its own resource tracker instead. A
+  worker forked from the supervisor shares the supervisor's tracker, so in
+  that fallback the segment loses its crash-time cleanup once a worker has
+  attached; ``close`` still unlinks it.
+
+serve.py does this when ``config.SHARED_MEMORY_MODEL`` is on (or with
+``--shared-model``). Workers started by another process manager can attach
+to the segment named in the ``CROP_SHARED_MODEL`` environment variable.
+
+Usage:
+    publisher = SharedModelPublisher()
+    name = publisher.publish(predictor)
+    # in each worker
+    worker_predictor = CropRecommendationPredictor(engine='compiled', shared_model=name)
+    # on shutdown
+    publisher.close()
+"""
+
+import os
+import secrets
+import sys
+
+from model_bundle import bundle_from_buffer, bundle_parts
+from tree_engine import FlattenedForest
+
+# Environment variable naming the segment workers should attach to
+SHARED_MODEL_ENV = 'CROP_SHARED_MODEL'
+
+SEGMENT_PREFIX = 'crop_model_'
+
+
+def predictor_parts(predictor):
+    """
+    Collect what a shared bundle stores from a loaded predictor.
+
+    Predictors built with the sklearn engine are flattened, and their two
+    scalers fused, so workers always get the compiled engine's arrays.
+
+    Returns:
+    --------
+    dict : Keyword arguments for ``model_bundle.bundle_parts``
+    """
+    forest = predictor.forest
+    if forest is None:
+        forest = FlattenedForest.from_sklearn(predictor.model)
+
+    scale, offset = predictor.fused_scale, predictor.fused_offset
+    if scale is None:
+        # Imported here: predict.py imports this module
+        from predict import fuse_scalers
+        scale, offset = fuse_scalers(predictor.minmax_scaler, predictor.standard_scaler)
+
+    return {
+        'forest': forest,
+        'crop_mapping': predictor.crop_mapping,
+        'feature_names': predictor.feature_names,
+        'scale': scale,
+        'offset': offset,
+        'metadata': predictor.model_metadata,
+        'version': predictor.model_version
+    }
+
+
+class SharedModelPublisher:
+    """
+    Owns the shared memory segment holding the current model.
+
+    Attributes:
+    -----------
+    name : str or None
+        Name of the current segment (what workers attach to)
+    size : int
+        Size of the current segment in bytes
+    """
+
+    def __init__(self, prefix=SEGMENT_PREFIX):
+        self.prefix = prefix
+        self.segment = None
+        self.size = 0
+
+    @property
+    def name(self):
+        return self.segment.name if self.segment is not None else None
+
+    def publish(self, predictor):
+        """
+        Copy a predictor's model into a new segment and retire the previous one.
+
+        Parameters:
+        -----------
+        predictor : CropRecommendationPredictor
+            Loaded predictor (either engine)
+
+        Returns:
+        --------
+        str : Name of the new segment
+        """
+        # Supervisor-only: keeps multiprocessing out of the workers' imports
+        from multiprocessing import shared_memory
+
+        parts, size = bundle_parts(**predictor_parts(predictor))
+
+        name = f"{self.prefix}{os.getpid()}_{secrets.token_hex(4)}"
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        try:
+            for position, data in parts:
+                segment.buf[position:position + len(data)] = data
+        except BaseException:
+            segment.close()
+            segment.unlink()
+            raise
+        # Only the name is needed from here on; workers hold their own mappings
+        segment.close()
+
+        self._unlink()
+        self.segment = segment
+        self.size = size
+        return segment.name
+
+    def _unlink(self):
+        if self.segment is not None:
+            from multiprocessing import resource_tracker
+            # Before Python 3.13 a forked worker shares this resource tracker,
+            # and unregistering its attachment drops this registration too;
+            # registering again (a no-op otherwise) keeps unlink balanced
+            resource_tracker.register(f'/{self.segment.name}', 'shared_memory')
+            self.segment.unlink()
+            self.segment = None
+            self.size = 0
+
+    def close(self):
+        """Unlink the current segment (existing mappings stay valid)."""
+        self._unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(name):
+    """
+    Map a published model read-only.
+
+    The mapping lives as long as the returned bundle's arrays; it is released
+    when they are garbage collected.
+
+    Parameters:
+    -----------
+    name : str
+        Segment name returned by ``SharedModelPublisher.publish``
+
+    Returns:
+    --------
+    ModelBundle : Bundle whose forest arrays are read-only views of the segment
+
+    Raises:
+    -------
+    FileNotFoundError : If no segment has that name (e.g. it was retired)
+    """
+    from multiprocessing import resource_tracker, shared_memory
+
+    class AttachedSegment(shared_memory.SharedMemory):
+        def __del__(self):
+            # The bundle's arrays still view the mapping, so it cannot be
+            # closed here; it is unmapped when the last of them is freed
+            try:
+                self.close()
+            except BufferError:
+                pass
+
+    if sys.version_info >= (3, 13):
+        segment = AttachedSegment(name, track=False)
+    else:
+        # Attaching registers a POSIX segment with this process's resource
+        # tracker, which would unlink it when the worker exits
+        segment = AttachedSegment(name)
+        if os.name == 'posix':
+            resource_tracker.unregister(f'/{segment.name}', 'shared_memory')
+    return bundle_from_buffer(segment.buf.toreadonly(), source=f'shared memory segment {name}')
@@ -0,0 +1,142 @@
+"""
+Streaming Bulk Scoring
+
+Parses NDJSON or CSV request bodies incrementally, scores them in fixed-size
+chunks with one vectorized ``predict_batch`` call per chunk and yields NDJSON
+result lines as soon as each chunk is done. Memory use is bounded by the
+chunk size, not by the size of the upload. Each chunk is checked with
+``validate_records`` before scoring, so an invalid row is reported on its own
+line and never fails the rest of its chunk. NDJSON lines are decoded and
+encoded with ``serialization`` (orjson when installed, per
+``config.JSON_BACKEND``).
+"""
+
+import csv
+import io
+
+import serialization
+from validation import validate_records
+
+# Content types accepted by /predict-stream
+STREAM_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/jsonlines': 'ndjson',
+    'text/csv': 'csv'
+}
+
+
+def detect_format(content_type, override=None):
+    """
+    Work out the body format from an explicit override or the Content-Type.
+
+    Returns:
+    --------
+    str or None : 'ndjson', 'csv', or None when the format is not supported
+    """
+    if override:
+        override = override.lower()
+        return override if override in ('ndjson', 'csv') else None
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    return STREAM_FORMATS.get(mimetype)
+
+
+def iter_records(stream, fmt, backend=None):
+    """
+    Parse a binary stream record by record (validation happens per chunk).
+
+    Parameters:
+    -----------
+    stream : binary file-like
+        Request body
+    fmt : str
+        'ndjson' or 'csv' (with a header row)
+    backend : str, optional
+        JSON backend for NDJSON lines (default ``serialization.resolve_backend()``)
+
+    Yields:
+    -------
+    tuple : (row_index, parsed record or None, parse error message or None)
+    """
+    if fmt == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        for row_index, raw in enumerate(csv.DictReader(text)):
+            yield row_index, raw, None
+        return
+
+    backend = backend or serialization.resolve_backend()
+    row_index = 0
+    # NDJSON lines are decoded straight from the bytes
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            raw = serialization.loads(line, backend)
+        except ValueError as e:
+            yield row_index, None, f'Invalid JSON: {str(e)}'
+        else:
+            yield row_index, raw, None
+        row_index += 1
+
+
+def score_stream(predictor, stream, fmt, chunk_rows=1000, backend=None):
+    """
+    Score a streamed body chunk by chunk, yielding NDJSON result lines.
+
+    Each output line is ``{"row": i, "success": true, "prediction": {...}}`` or
+    ``{"row": i, "success": false, "error": "..."}``, in input order.
+
+    Parameters:
+    -----------
+    predictor : CropRecommendationPredictor
+        Predictor used for each chunk
+    stream : binary file-like
+        Request body
+    fmt : str
+        'ndjson' or 'csv'
+    chunk_rows : int
+        Rows parsed and scored per chunk
+    backend : str, optional
+        JSON backend (default ``serialization.resolve_backend()``)
+
+    Yields:
+    -------
+    bytes : One chunk of newline-terminated JSON lines
+    """
+    backend = backend or serialization.resolve_backend()
+    chunk = []
+    for record in iter_records(stream, fmt, backend):
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield _score_chunk(predictor, chunk, backend)
+            chunk = []
+    if chunk:
+        yield _score_chunk(predictor, chunk, backend)
+
+
+def _score_chunk(predictor, chunk, backend):
+    """Validate a chunk, then run one vectorized prediction over its valid rows."""
+    parsed = [raw for _, raw, error in chunk if error is None]
+    validation = validate_records(parsed, predictor.get_feature_names())
+
+    try:
+        results = iter(predictor.predict_validated(validation))
+        chunk_error = None
+    except Exception as e:
+        results = None
+        chunk_error = f'Batch prediction error: {str(e)}'
+
+    lines = []
+    position = 0
+    for row_index, _, error in chunk:
+        if error is None:
+            row_errors = validation.errors.get(position)
+            error = '; '.join(row_errors) if row_errors else chunk_error
+            position += 1
+        if error is None:
+            record = {'row': row_index, 'success': True, 'prediction': next(results)}
+        else:
+            record = {'row': row_index, 'success': False, 'error': error}
+        lines.append(serialization.dumps(record, backend))
+    return b'\n'.join(lines) + b'\n'
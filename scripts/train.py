@@ -3,184 +3,304 @@ Crop Recommendation Model Training Script
 
 This script loads the crop recommendation dataset, preprocesses it,
 trains a Random Forest classifier, and saves the trained model and scalers.
+
+The data is read through the columnar cache of scripts/dataset.py: the CSV is
+parsed once into float32 feature columns and int8 crop ids, and later runs
+memory-map that store.
+
+The forest is built with config.MODEL_PARAMS. With --search, a cross-validated
+hyperparameter search (scripts/tune.py) runs on the training split first and
+the smallest, fastest candidate within config.SEARCH_ACCURACY_TOLERANCE of the
+best accuracy is trained instead.
+
+With --out-of-core, the data is streamed from the columnar cache instead:
+scaler statistics come from one pass, the test split is chosen by hashing row
+ids, and the forest is fitted as members on bootstrap samples in worker
+processes (see scripts/out_of_core.py).
+
+Importing this module does no work: ``train()`` runs the in-memory pipeline
+and ``main()`` is the command line entry point.
+
+Usage:
+    python scripts/train.py
+    python scripts/train.py --out-of-core [--workers 4]
+    python scripts/train.py --search [--folds 5] [--workers 4] [--n-candidates 20]
+    python scripts/train.py --data path/to/dataset.csv --output-dir path/to/models
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
 import os
+import sys
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.metrics import accuracy_score, classification_report
 import warnings
 
-warnings.filterwarnings('ignore')
-
-# Paths
-DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv')
-MODELS_PATH = os.path.join(os.path.dirname(__file__), '..', 'models')
-
-# Create models directory if it doesn't exist
-os.makedirs(MODELS_PATH, exist_ok=True)
-
-print("=" * 60)
-print("Crop Recommendation Model Training")
-print("=" * 60)
-
-# Step 1: Load the dataset
-print("\n[1/6] Loading dataset...")
-crop = pd.read_csv(DATA_PATH)
-print(f"Dataset shape: {crop.shape}")
-print(f"Columns: {list(crop.columns)}")
-print(f"Unique crops: {crop['label'].nunique()}")
-
-# Step 2: Data Preprocessing
-print("\n[2/6] Preprocessing data...")
-
-# Check for missing values
-missing_values = crop.isnull().sum().sum()
-print(f"Missing values: {missing_values}")
-
-# Create mapping for crop labels
-crop_dict = {
-    'rice': 1,
-    'maize': 2,
-    'jute': 3,
-    'cotton': 4,
-    'coconut': 5,
-    'papaya': 6,
-    'orange': 7,
-    'apple': 8,
-    'muskmelon': 9,
-    'watermelon': 10,
-    'grapes': 11,
-    'mango': 12,
-    'banana': 13,
-    'pomegranate': 14,
-    'lentil': 15,
-    'blackgram': 16,
-    'mungbean': 17,
-    'mothbeans': 18,
-    'pigeonpeas': 19,
-    'kidneybeans': 20,
-    'chickpea': 21,
-    'coffee': 22
-}
-
-# Encode labels
-crop['label'] = crop['label'].map(crop_dict)
-print(f"Label encoding completed. Classes: {sorted(crop['label'].unique())}")
-
-# Step 3: Separate features and target
-print("\n[3/6] Separating features and target...")
-X = crop.drop('label', axis=1)
-y = crop['label']
-
-print(f"Features shape: {X.shape}")
-print(f"Target shape: {y.shape}")
-print(f"Feature columns: {list(X.columns)}")
-
-# Step 4: Train-Test Split
-print("\n[4/6] Splitting data (80-20)...")
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
-
-print(f"Training set size: {X_train.shape[0]}")
-print(f"Testing set size: {X_test.shape[0]}")
-
-# Step 5: Feature Scaling
-print("\n[5/6] Scaling features...")
-
-# Apply MinMaxScaler
-minmax_scaler = MinMaxScaler()
-X_train_minmax = minmax_scaler.fit_transform(X_train)
-X_test_minmax = minmax_scaler.transform(X_test)
-
-# Apply StandardScaler
-standard_scaler = StandardScaler()
-X_train_scaled = standard_scaler.fit_transform(X_train_minmax)
-X_test_scaled = standard_scaler.transform(X_test_minmax)
-
-print("Feature scaling completed using MinMaxScaler + StandardScaler")
-
-# Step 6: Train Random Forest Classifier
-print("\n[6/6] Training Random Forest Classifier...")
-
-model = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=20,
-    random_state=42,
-    n_jobs=-1,
-    verbose=0
-)
-
-model.fit(X_train_scaled, y_train)
-print("Model training completed!")
-
-# Predictions and Evaluation
-print("\n" + "=" * 60)
-print("Model Evaluation")
-print("=" * 60)
-
-y_pred = model.predict(X_test_scaled)
-accuracy = accuracy_score(y_test, y_pred)
-
-print(f"\nAccuracy Score: {accuracy:.4f} ({accuracy*100:.2f}%)")
-print(f"\nClassification Report:")
-# Only include labels that are actually in the test set
-unique_labels = sorted(set(y_test) | set(y_pred))
-crop_names = [k for k, v in crop_dict.items() if v in unique_labels]
-print(classification_report(y_test, y_pred, labels=unique_labels, target_names=crop_names))
-
-# Feature Importance
-print("\n" + "=" * 60)
-print("Feature Importance")
-print("=" * 60)
-feature_importance = pd.DataFrame({
-    'Feature': X.columns,
-    'Importance': model.feature_importances_
-}).sort_values('Importance', ascending=False)
-
-print("\n", feature_importance.to_string(index=False))
-
-# Save Models and Scalers
-print("\n" + "=" * 60)
-print("Saving Models and Scalers")
-print("=" * 60)
-
-try:
-    # Save the trained model
-    model_path = os.path.join(MODELS_PATH, 'crop_recommendation_model.pkl')
-    pickle.dump(model, open(model_path, 'wb'))
-    print(f"[OK] Model saved: {model_path}")
-    
-    # Save MinMaxScaler
-    minmax_path = os.path.join(MODELS_PATH, 'minmax_scaler.pkl')
-    pickle.dump(minmax_scaler, open(minmax_path, 'wb'))
-    print(f"[OK] MinMaxScaler saved: {minmax_path}")
-    
-    # Save StandardScaler
-    standard_path = os.path.join(MODELS_PATH, 'standard_scaler.pkl')
-    pickle.dump(standard_scaler, open(standard_path, 'wb'))
-    print(f"[OK] StandardScaler saved: {standard_path}")
-    
-    # Save crop mapping
-    mapping_path = os.path.join(MODELS_PATH, 'crop_mapping.pkl')
-    pickle.dump(crop_dict, open(mapping_path, 'wb'))
-    print(f"[OK] Crop mapping saved: {mapping_path}")
-    
-    # Save feature names
-    features_path = os.path.join(MODELS_PATH, 'feature_names.pkl')
-    pickle.dump(list(X.columns), open(features_path, 'wb'))
-    print(f"[OK] Feature names saved: {features_path}")
-    
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import load_dataset
+from model_bundle import write_bundle
+from out_of_core import train_out_of_core
+from predict import fuse_scalers
+from tree_engine import FlattenedForest
+from tune import LEADERBOARD_FILE, candidate_params, print_leaderboard, run_search, select_candidate
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Train the crop recommendation model')
+    parser.add_argument('--data', default=config.DATASET_FILE, help='Training CSV')
+    parser.add_argument('--output-dir', default=config.MODELS_PATH,
+                        help='Directory receiving the model, scalers and bundle')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='Re-parse the data even if its columnar cache is current')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='Stream the data and fit the forest as members in worker processes')
+    parser.add_argument('--search', action='store_true',
+                        help='Run a cross-validated hyperparameter search before training')
+    parser.add_argument('--folds', type=int, default=config.CV_FOLDS, help='Cross-validation folds')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Search or out-of-core worker processes (default: CPU count, 0 = in-process)')
+    parser.add_argument('--n-candidates', type=int, default=None,
+                        help='Sample this many candidates instead of the full grid')
+    return parser
+
+
+def load_training_data(data_path, rebuild_cache=False):
+    """
+    Load features and crop ids through the columnar cache (steps 1-3).
+
+    Returns:
+    --------
+    tuple : (X float32 matrix, y int64 crop ids, feature names)
+    """
+    print("\n[1/6] Loading dataset...")
+    dataset = load_dataset(data_path, rebuild=rebuild_cache)
+    print(f"Dataset rows: {dataset.rows} (columnar cache: {dataset.store_dir})")
+    print(f"Columns: {dataset.feature_names + ['label']}")
+
+    print("\n[2/6] Preprocessing data...")
+    # Labels are validated and encoded with config.CROPS while the cache is built;
+    # unknown crops or missing values raise instead of turning into NaN
+    y = np.asarray(dataset.labels, dtype=np.int64)
+    print(f"Label encoding completed. Classes: {np.unique(y).tolist()}")
+
+    print("\n[3/6] Separating features and target...")
+    feature_names = list(dataset.feature_names)
+    X = dataset.features()
+
+    print(f"Features shape: {X.shape} ({X.dtype})")
+    print(f"Target shape: {y.shape}")
+    print(f"Feature columns: {feature_names}")
+    return X, y, feature_names
+
+
+def split_and_scale(X, y):
+    """
+    Hold out the test split and fit MinMaxScaler + StandardScaler on the rest (steps 4-5).
+
+    Returns:
+    --------
+    dict : Raw and scaled train/test splits plus the two fitted scalers
+    """
+    print("\n[4/6] Splitting data (80-20)...")
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=config.TEST_SIZE, random_state=config.RANDOM_STATE
+    )
+    print(f"Training set size: {X_train.shape[0]}")
+    print(f"Testing set size: {X_test.shape[0]}")
+
+    print("\n[5/6] Scaling features...")
+    minmax_scaler = MinMaxScaler()
+    X_train_minmax = minmax_scaler.fit_transform(X_train)
+    X_test_minmax = minmax_scaler.transform(X_test)
+
+    standard_scaler = StandardScaler()
+    X_train_scaled = standard_scaler.fit_transform(X_train_minmax)
+    X_test_scaled = standard_scaler.transform(X_test_minmax)
+    print("Feature scaling completed using MinMaxScaler + StandardScaler")
+
+    return {
+        'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test,
+        'X_train_scaled': X_train_scaled, 'X_test_scaled': X_test_scaled,
+        'minmax_scaler': minmax_scaler, 'standard_scaler': standard_scaler
+    }
+
+
+def search_params(X_train, y_train, output_dir, folds=config.CV_FOLDS, workers=None, n_candidates=None):
+    """
+    Cross-validate hyperparameters on the training split (the test split stays held out).
+
+    Returns:
+    --------
+    dict : ``config.MODEL_PARAMS`` updated with the selected candidate
+    """
+    print(f"\n[search] Cross-validating hyperparameters ({folds} folds)...")
+    leaderboard = run_search(X_train, y_train, n_folds=folds, workers=workers,
+                             n_candidates=n_candidates, engine=config.MODEL_ENGINE)
+    leaderboard_path = os.path.join(output_dir, os.path.basename(LEADERBOARD_FILE))
+    leaderboard.to_csv(leaderboard_path, index=False)
+    print_leaderboard(leaderboard)
+    print(f"[OK] Leaderboard saved: {leaderboard_path}")
+
+    model_params = dict(config.MODEL_PARAMS)
+    model_params.update(candidate_params(select_candidate(leaderboard)))
+    print(f"[OK] Selected parameters: {model_params}")
+    return model_params
+
+
+def evaluate(model, X_test_scaled, y_test, feature_names, crop_dict=config.CROPS):
+    """Print accuracy, the classification report and feature importances; returns the accuracy."""
+    print("\n" + "=" * 60)
+    print("Model Evaluation")
+    print("=" * 60)
+
+    y_pred = model.predict(X_test_scaled)
+    accuracy = accuracy_score(y_test, y_pred)
+
+    print(f"\nAccuracy Score: {accuracy:.4f} ({accuracy*100:.2f}%)")
+    print(f"\nClassification Report:")
+    # Only include labels that are actually in the test set
+    unique_labels = sorted(set(y_test) | set(y_pred))
+    crop_names = [k for k, v in crop_dict.items() if v in unique_labels]
+    print(classification_report(y_test, y_pred, labels=unique_labels, target_names=crop_names))
+
+    print("\n" + "=" * 60)
+    print("Feature Importance")
+    print("=" * 60)
+    feature_importance = pd.DataFrame({
+        'Feature': feature_names,
+        'Importance': model.feature_importances_
+    }).sort_values('Importance', ascending=False)
+    print("\n", feature_importance.to_string(index=False))
+    return accuracy
+
+
+def save_artifacts(output_dir, model, minmax_scaler, standard_scaler, feature_names, model_params,
+                   accuracy, train_rows, crop_dict=config.CROPS, split=None):
+    """
+    Write the pickled model, scalers, mapping and feature names plus the model bundle.
+
+    ``split`` describes the train/test split (method, data source, test size
+    and seed) and is stored in the bundle metadata, so scripts/compress.py can
+    rebuild the same held-out rows.
+
+    Returns:
+    --------
+    str : Path of the model bundle
+    """
+    print("\n" + "=" * 60)
+    print("Saving Models and Scalers")
+    print("=" * 60)
+
+    # Fold both affine transforms into one per-feature scale and offset
+    fused_scale, fused_offset = fuse_scalers(minmax_scaler, standard_scaler)
+    artifacts = [
+        ('crop_recommendation_model.pkl', model, 'Model'),
+        ('minmax_scaler.pkl', minmax_scaler, 'MinMaxScaler'),
+        ('standard_scaler.pkl', standard_scaler, 'StandardScaler'),
+        # Single multiply-add used at inference time
+        ('fused_scaler.pkl', {'scale': fused_scale, 'offset': fused_offset}, 'Fused scaler'),
+        ('crop_mapping.pkl', dict(crop_dict), 'Crop mapping'),
+        ('feature_names.pkl', feature_names, 'Feature names')
+    ]
+    for filename, obj, description in artifacts:
+        path = os.path.join(output_dir, filename)
+        with open(path, 'wb') as f:
+            pickle.dump(obj, f)
+        print(f"[OK] {description} saved: {path}")
+
+    # Save single-file bundle (memory-mapped by the compiled engine)
+    bundle_path = os.path.join(output_dir, 'crop_model.bundle')
+    bundle_size = write_bundle(
+        bundle_path,
+        FlattenedForest.from_sklearn(model),
+        dict(crop_dict),
+        feature_names,
+        fused_scale,
+        fused_offset,
+        metadata={
+            'accuracy': float(accuracy),
+            'n_estimators': len(model.estimators_),
+            'params': {k: v for k, v in model_params.items() if k not in ('n_jobs', 'verbose')},
+            'split': split,
+            'train_rows': int(train_rows),
+            'trained_at': pd.Timestamp.now(tz='UTC').isoformat()
+        }
+    )
+    print(f"[OK] Model bundle saved: {bundle_path} ({bundle_size / 1024:.1f} KB)")
     print("\n[OK] All models and scalers saved successfully!")
-    
-except Exception as e:
-    print(f"[ERROR] Error saving models: {e}")
+    return bundle_path
+
+
+def train(data_path=config.DATASET_FILE, output_dir=config.MODELS_PATH, rebuild_cache=False,
+          search=False, folds=config.CV_FOLDS, workers=None, n_candidates=None):
+    """
+    Train the in-memory forest and write every model artifact to ``output_dir``.
+
+    Returns:
+    --------
+    dict : 'accuracy', 'params', 'train_rows', 'test_rows' and 'bundle_path'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    X, y, feature_names = load_training_data(data_path, rebuild_cache)
+    split = split_and_scale(X, y)
+
+    model_params = dict(config.MODEL_PARAMS)
+    if search:
+        model_params = search_params(split['X_train'], split['y_train'], output_dir,
+                                     folds, workers, n_candidates)
+
+    print("\n[6/6] Training Random Forest Classifier...")
+    model = RandomForestClassifier(**model_params)
+    model.fit(split['X_train_scaled'], split['y_train'])
+    print("Model training completed!")
+
+    accuracy = evaluate(model, split['X_test_scaled'], split['y_test'], feature_names)
+    split_info = {'method': 'random', 'source': os.path.abspath(data_path),
+                  'test_size': config.TEST_SIZE, 'seed': config.RANDOM_STATE}
+    bundle_path = save_artifacts(output_dir, model, split['minmax_scaler'], split['standard_scaler'],
+                                 feature_names, model_params, accuracy, len(split['X_train']),
+                                 split=split_info)
+    return {
+        'accuracy': accuracy,
+        'params': model_params,
+        'train_rows': len(split['X_train']),
+        'test_rows': len(split['X_test']),
+        'bundle_path': bundle_path
+    }
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.out_of_core and args.search:
+        parser.error("--search needs the data in memory and cannot be combined with --out-of-core")
+    warnings.filterwarnings('ignore')
+
+    print("=" * 60)
+    print("Crop Recommendation Model Training")
+    print("=" * 60)
+
+    if args.out_of_core:
+        print("\n[out-of-core] Streaming training...")
+        os.makedirs(args.output_dir, exist_ok=True)
+        summary = train_out_of_core(args.data, args.output_dir, workers=args.workers,
+                                    rebuild_cache=args.rebuild_cache)
+        print(f"\nTimings: " + ", ".join(f"{stage} {seconds:.1f}s"
+                                        for stage, seconds in summary['timings'].items()))
+    else:
+        train(args.data, args.output_dir, args.rebuild_cache, args.search,
+              args.folds, args.workers, args.n_candidates)
+
+    print("\n" + "=" * 60)
+    print("Training Complete!")
+    print("=" * 60)
+
 
-print("\n" + "=" * 60)
-print("Training Complete!")
-print("=" * 60)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Compiled Tree-Ensemble Inference Engine
+
+This module flattens every tree of a fitted RandomForestClassifier into a set
+of contiguous NumPy arrays and evaluates many rows against all trees at once
+with a vectorized traversal. It produces the same probabilities as sklearn's
+``predict_proba`` without going through sklearn's per-tree dispatch or joblib.
+"""
+
+import numpy as np
+
+# Rows evaluated per traversal pass; bounds the (rows, trees, classes) gather
+ROW_CHUNK_SIZE = 512
+
+
+class FlattenedForest:
+    """
+    A random forest stored as flat node arrays.
+
+    All trees share one node index space. Leaves point to themselves and have
+    an infinite threshold, so stepping a (row, tree) pair that already sits on
+    a leaf is harmless; traversal still drops finished pairs as it goes.
+
+    Attributes:
+    -----------
+    feature : np.ndarray (n_nodes,) int32
+        Feature index tested at each node (0 for leaves)
+    threshold : np.ndarray (n_nodes,) float64
+        Split threshold; rows go left when ``x[feature] <= threshold``
+    left, right : np.ndarray (n_nodes,) int32
+        Global index of the left/right child (the node itself for leaves)
+    value : np.ndarray (n_nodes, n_classes) float64
+        Class probabilities of the samples reaching each node
+    roots : np.ndarray (n_trees,) int32
+        Global index of each tree's root node
+    classes : np.ndarray (n_classes,)
+        Class labels, in the column order of ``value``
+    max_depth : int
+        Depth of the deepest tree
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(max_depth)
+        self.is_split = left != np.arange(len(left), dtype=left.dtype)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flatten a fitted sklearn RandomForestClassifier.
+
+        Parameters:
+        -----------
+        model : RandomForestClassifier
+            Fitted single-output forest
+
+        Returns:
+        --------
+        FlattenedForest : The same forest as contiguous arrays
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        n_nodes = sum(tree.node_count for tree in trees)
+        n_classes = len(model.classes_)
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.full(n_nodes, np.inf, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty((n_nodes, n_classes), dtype=np.float64)
+        roots = np.empty(len(trees), dtype=np.int32)
+
+        base = 0
+        for t, tree in enumerate(trees):
+            count = tree.node_count
+            nodes = np.arange(base, base + count, dtype=np.int32)
+            is_split = tree.children_left != -1
+
+            roots[t] = base
+            feature[nodes[is_split]] = tree.feature[is_split]
+            threshold[nodes[is_split]] = tree.threshold[is_split]
+            left[nodes] = np.where(is_split, tree.children_left + base, nodes)
+            right[nodes] = np.where(is_split, tree.children_right + base, nodes)
+
+            counts = tree.value[:, 0, :]
+            totals = counts.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            value[nodes] = counts / totals
+
+            base += count
+
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(feature, threshold, left, right, value, roots,
+                   np.asarray(model.classes_), max_depth)
+
+    @classmethod
+    def concatenate(cls, forests):
+        """
+        Join several forests into one that averages all of their trees.
+
+        Parameters:
+        -----------
+        forests : list of FlattenedForest
+            Forests with identical ``classes``
+
+        Returns:
+        --------
+        FlattenedForest : Every tree of every input forest, in order
+        """
+        classes = forests[0].classes
+        if any(not np.array_equal(forest.classes, classes) for forest in forests):
+            raise ValueError("Forests must share the same classes; see align_classes()")
+
+        bases = np.cumsum([0] + [forest.n_nodes for forest in forests[:-1]])
+        return cls(
+            feature=np.concatenate([forest.feature for forest in forests]),
+            threshold=np.concatenate([forest.threshold for forest in forests]),
+            left=np.concatenate([forest.left + base for forest, base in zip(forests, bases)]).astype(np.int32),
+            right=np.concatenate([forest.right + base for forest, base in zip(forests, bases)]).astype(np.int32),
+            value=np.concatenate([forest.value for forest in forests]),
+            roots=np.concatenate([forest.roots + base for forest, base in zip(forests, bases)]).astype(np.int32),
+            classes=np.array(classes),
+            max_depth=max(forest.max_depth for forest in forests)
+        )
+
+    def align_classes(self, classes):
+        """
+        Re-express node values over a superset of this forest's classes.
+
+        Trees fitted on data missing some classes give those classes zero
+        probability, so forests fitted on different samples can be joined.
+
+        Parameters:
+        -----------
+        classes : array-like
+            Sorted class labels containing every label in ``self.classes``
+
+        Returns:
+        --------
+        FlattenedForest : Same trees with ``value`` widened to ``classes``
+        """
+        classes = np.asarray(classes)
+        columns = np.searchsorted(classes, self.classes)
+        if np.any(columns >= len(classes)) or not np.array_equal(classes[columns], self.classes):
+            raise ValueError("Target classes must include every class of the forest")
+
+        value = np.zeros((self.n_nodes, len(classes)), dtype=self.value.dtype)
+        value[:, columns] = self.value
+        return FlattenedForest(self.feature, self.threshold, self.left, self.right,
+                               value, self.roots, classes, self.max_depth)
+
+    def rescale(self, scale, offset):
+        """
+        Move split thresholds into the space ``x * scale + offset``.
+
+        Row routing is unchanged except for inputs within float32 rounding
+        of a threshold.
+
+        Parameters:
+        -----------
+        scale, offset : array-like (n_features,)
+            Positive per-feature scale and offset of the new input space
+
+        Returns:
+        --------
+        FlattenedForest : A forest taking transformed inputs
+        """
+        scale = np.asarray(scale, dtype=np.float64)
+        offset = np.asarray(offset, dtype=np.float64)
+        if np.any(scale <= 0):
+            raise ValueError("Scale must be positive to preserve split order")
+
+        # Inputs are scaled in float64 and then rounded to float32 for
+        # traversal; rounding the mapped thresholds the same (monotonic) way
+        # keeps rows that sat exactly on a threshold on the same side
+        mapped = self.threshold * scale[self.feature] + offset[self.feature]
+        threshold = np.where(self.is_split, mapped.astype(np.float32), np.inf)
+        return FlattenedForest(self.feature, threshold, self.left, self.right,
+                               self.value, self.roots, self.classes, self.max_depth)
+
+    @property
+    def n_trees(self):
+        """Number of trees in the forest."""
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        """Total number of nodes across all trees."""
+        return len(self.feature)
+
+    def apply(self, X):
+        """
+        Find the leaf each row reaches in every tree.
+
+        Parameters:
+        -----------
+        X : array-like (n_samples, n_features)
+            Scaled feature matrix
+
+        Returns:
+        --------
+        np.ndarray : (n_samples, n_trees) global leaf indices
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=np.int32)
+        for start in range(0, X.shape[0], ROW_CHUNK_SIZE):
+            stop = start + ROW_CHUNK_SIZE
+            leaves[start:stop] = self._apply_chunk(X[start:stop])
+        return leaves
+
+    def select_trees(self, indices):
+        """
+        Build a forest from a subset of this forest's trees.
+
+        Parameters:
+        -----------
+        indices : sequence of int
+            Distinct tree positions to keep, in the order to store them
+
+        Returns:
+        --------
+        FlattenedForest : The selected trees with compacted node arrays
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(np.unique(indices)) != len(indices):
+            raise ValueError("Tree indices must be distinct")
+        return self._compact(self.roots[indices])
+
+    def prune(self, max_depth=None, merge_leaves=False):
+        """
+        Shrink every tree by capping its depth and/or merging redundant leaves.
+
+        Capping turns each node at ``max_depth`` into a leaf carrying the class
+        distribution of the samples that reached it. Merging collapses any
+        subtree whose leaves all predict the same class into a single leaf,
+        which keeps each tree's vote but drops the splits below it.
+
+        Parameters:
+        -----------
+        max_depth : int, optional
+            Deepest level kept (the root is level 0)
+        merge_leaves : bool
+            Collapse subtrees whose leaves agree on the predicted class
+
+        Returns:
+        --------
+        FlattenedForest : The pruned forest with compacted node arrays
+        """
+        levels = self._levels(self.roots, ~self.is_split)
+        make_leaf = ~self.is_split
+        if max_depth is not None:
+            for depth in range(max_depth, len(levels)):
+                make_leaf[levels[depth]] = True
+
+        if merge_leaves:
+            # Bottom-up: a node is pure when it is a leaf, or both children are
+            # pure and predict the same class
+            pure_class = np.full(self.n_nodes, -1, dtype=np.int64)
+            for level in reversed(levels):
+                leaf = make_leaf[level]
+                pure_class[level[leaf]] = np.argmax(self.value[level[leaf]], axis=1)
+                split = level[~leaf]
+                left_class = pure_class[self.left[split]]
+                same = (left_class >= 0) & (left_class == pure_class[self.right[split]])
+                pure_class[split[same]] = left_class[same]
+                make_leaf[split[same]] = True
+
+        return self._compact(self.roots, make_leaf)
+
+    def _levels(self, roots, is_leaf):
+        """List the node indices at each depth below ``roots``."""
+        levels = []
+        frontier = np.asarray(roots, dtype=np.int64)
+        while frontier.size:
+            levels.append(frontier)
+            split = frontier[~is_leaf[frontier]]
+            frontier = np.concatenate([self.left[split], self.right[split]]).astype(np.int64)
+        return levels
+
+    def _compact(self, roots, make_leaf=None):
+        """
+        Copy the trees under ``roots`` into fresh arrays, keeping only reachable
+        nodes and turning nodes flagged in ``make_leaf`` into leaves.
+        """
+        is_leaf = ~self.is_split if make_leaf is None else (make_leaf | ~self.is_split)
+        levels = self._levels(roots, is_leaf)
+        old = np.concatenate(levels)
+
+        new_index = np.full(self.n_nodes, -1, dtype=np.int32)
+        new_index[old] = np.arange(len(old), dtype=np.int32)
+        nodes = new_index[old]
+        leaf = is_leaf[old]
+
+        return FlattenedForest(
+            feature=np.where(leaf, 0, self.feature[old]).astype(self.feature.dtype),
+            threshold=np.where(leaf, np.inf, self.threshold[old]).astype(self.threshold.dtype),
+            left=np.where(leaf, nodes, new_index[self.left[old]]).astype(np.int32),
+            right=np.where(leaf, nodes, new_index[self.right[old]]).astype(np.int32),
+            value=np.array(self.value[old]),
+            roots=new_index[np.asarray(roots)].astype(np.int32),
+            classes=np.array(self.classes),
+            max_depth=len(levels) - 1
+        )
+
+    def predict_proba(self, X):
+        """
+        Average the leaf probabilities of all trees for each row.
+
+        Parameters:
+        -----------
+        X : array-like (n_samples, n_features)
+            Scaled feature matrix
+
+        Returns:
+        --------
+        np.ndarray : (n_samples, n_classes) class probabilities
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+
+        if n_samples <= ROW_CHUNK_SIZE:
+            return self._predict_proba_chunk(X)
+
+        proba = np.empty((n_samples, len(self.classes)), dtype=np.float64)
+        for start in range(0, n_samples, ROW_CHUNK_SIZE):
+            stop = start + ROW_CHUNK_SIZE
+            proba[start:stop] = self._predict_proba_chunk(X[start:stop])
+        return proba
+
+    def _predict_proba_chunk(self, X):
+        """Traverse all trees for a block of rows and average the leaf values."""
+        node = self._apply_chunk(X)
+        return self.value[node].sum(axis=1) / self.n_trees
+
+    def _apply_chunk(self, X):
+        """Traverse all trees for a block of rows, returning (rows, trees) leaf indices."""
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One entry per (row, tree) pair, row-major
+        node = np.tile(self.roots, n_samples)
+        row_base = np.repeat(np.arange(n_samples, dtype=np.int32) * n_features, self.n_trees)
+        active = np.arange(node.size)
+
+        # Step only the pairs that have not reached a leaf yet
+        for _ in range(self.max_depth):
+            current = node[active]
+            go_left = flat_X[row_base[active] + self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[self.is_split[current]]
+            if active.size == 0:
+                break
+
+        return node.reshape(n_samples, self.n_trees)
@@ -0,0 +1,273 @@
+"""
+Hyperparameter Search
+
+Runs a k-fold cross-validated search over Random Forest hyperparameters across
+a process pool. Every fold is scaled once (MinMaxScaler + StandardScaler fitted
+on the fold's training part) and written to a scratch directory as .npy files;
+workers memory-map them instead of receiving a pickled copy per candidate.
+
+Each (candidate, fold) fit records accuracy, fit time, model size and
+single-row inference latency. The leaderboard averages them per candidate,
+so the smallest and fastest forest that keeps accuracy can be picked, not
+just the most accurate one.
+
+Usage:
+    python scripts/train.py --search [--folds 5] [--workers 4] [--n-candidates 20]
+    python scripts/tune.py [--data data/Crop_recommendation.csv] [--folds 5] [--workers 4] [--n-candidates 20]
+"""
+
+import argparse
+import itertools
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+from dataset import load_dataset
+from predict import fuse_scalers
+from tree_engine import FlattenedForest
+
+LEADERBOARD_FILE = os.path.join(config.MODELS_PATH, 'search_leaderboard.csv')
+
+# Rows timed one at a time for the latency column
+LATENCY_ROWS = 50
+
+# Memory-mapped folds, loaded once per worker by _init_worker
+_folds = None
+
+
+def expand_search_space(space, n_candidates=None, seed=config.RANDOM_STATE):
+    """
+    List the parameter combinations of a search space.
+
+    Parameters:
+    -----------
+    space : dict
+        Parameter name -> list of values
+    n_candidates : int, optional
+        Sample this many combinations at random instead of the full grid
+
+    Returns:
+    --------
+    list of dict : Candidate parameter sets
+    """
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    if n_candidates is not None and n_candidates < len(grid):
+        grid = random.Random(seed).sample(grid, n_candidates)
+    return grid
+
+
+def write_folds(X, y, n_folds, fold_dir, seed=config.RANDOM_STATE):
+    """
+    Split, scale and save each CV fold as .npy files.
+
+    Scalers are fitted on the training part of each fold only, so the
+    validation part is scored exactly as unseen data would be.
+    """
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for fold, (train_idx, val_idx) in enumerate(splitter.split(X, y)):
+        minmax = MinMaxScaler().fit(X[train_idx])
+        standard = StandardScaler().fit(minmax.transform(X[train_idx]))
+        scale, offset = fuse_scalers(minmax, standard)
+        np.save(os.path.join(fold_dir, f'X_train_{fold}.npy'), X[train_idx] * scale + offset)
+        np.save(os.path.join(fold_dir, f'y_train_{fold}.npy'), y[train_idx])
+        np.save(os.path.join(fold_dir, f'X_val_{fold}.npy'), X[val_idx] * scale + offset)
+        np.save(os.path.join(fold_dir, f'y_val_{fold}.npy'), y[val_idx])
+
+
+def _init_worker(fold_dir, n_folds):
+    """Process pool initializer: memory-map every fold once per worker."""
+    global _folds
+    _folds = [
+        {part: np.load(os.path.join(fold_dir, f'{part}_{fold}.npy'), mmap_mode='r')
+         for part in ('X_train', 'y_train', 'X_val', 'y_val')}
+        for fold in range(n_folds)
+    ]
+
+
+def evaluate_candidate(candidate, params, fold, engine='sklearn'):
+    """
+    Fit one candidate on one fold and measure it.
+
+    Returns:
+    --------
+    dict : Candidate index, fold, accuracy, fit time, model size and latency
+    """
+    data = _folds[fold]
+    model = RandomForestClassifier(**params, random_state=config.RANDOM_STATE, n_jobs=1)
+
+    start = time.perf_counter()
+    model.fit(data['X_train'], data['y_train'])
+    fit_seconds = time.perf_counter() - start
+
+    X_val = np.asarray(data['X_val'])
+    accuracy = float(np.mean(model.predict(X_val) == data['y_val']))
+
+    # Single-row latency on the engine the API would serve this model with
+    if engine == 'compiled':
+        predict_row = FlattenedForest.from_sklearn(model).predict_proba
+    else:
+        predict_row = model.predict_proba
+    timings = []
+    for row in X_val[:LATENCY_ROWS]:
+        start = time.perf_counter()
+        predict_row(row.reshape(1, -1))
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'candidate': candidate,
+        'fold': fold,
+        'accuracy': accuracy,
+        'fit_seconds': fit_seconds,
+        'model_bytes': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        'n_nodes': sum(tree.tree_.node_count for tree in model.estimators_),
+        'latency_ms': float(np.median(timings)) * 1000
+    }
+
+
+def run_search(X, y, space=None, n_folds=config.CV_FOLDS, workers=None,
+               n_candidates=None, engine='sklearn'):
+    """
+    Cross-validate every candidate of a search space.
+
+    Parameters:
+    -----------
+    X : np.ndarray
+        (n, n_features) raw (unscaled) features
+    y : np.ndarray
+        Class labels
+    space : dict, optional
+        Search space (default ``config.SEARCH_SPACE``)
+    n_folds : int
+        Cross-validation folds
+    workers : int, optional
+        Worker processes (default: CPU count, 0 = in-process)
+    n_candidates : int, optional
+        Randomly sample this many candidates instead of the full grid
+    engine : str
+        Engine used to time single-row inference ('sklearn' or 'compiled')
+
+    Returns:
+    --------
+    pd.DataFrame : Leaderboard, one row per candidate, best accuracy first
+    """
+    candidates = expand_search_space(space or config.SEARCH_SPACE, n_candidates)
+    workers = os.cpu_count() if workers is None else workers
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+
+    fold_dir = tempfile.mkdtemp(prefix='crop_cv_')
+    try:
+        write_folds(X, y, n_folds, fold_dir)
+        tasks = [(index, params, fold, engine)
+                 for index, params in enumerate(candidates) for fold in range(n_folds)]
+
+        if workers == 0:
+            _init_worker(fold_dir, n_folds)
+            results = [evaluate_candidate(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(fold_dir, n_folds)) as pool:
+                futures = [pool.submit(evaluate_candidate, *task) for task in tasks]
+                results = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(fold_dir, ignore_errors=True)
+
+    scores = pd.DataFrame(results).groupby('candidate')
+    leaderboard = pd.DataFrame({
+        'accuracy': scores['accuracy'].mean(),
+        'accuracy_std': scores['accuracy'].std(ddof=0),
+        'fit_seconds': scores['fit_seconds'].mean(),
+        'model_bytes': scores['model_bytes'].mean().round().astype(int),
+        'n_nodes': scores['n_nodes'].mean().round().astype(int),
+        'latency_ms': scores['latency_ms'].mean()
+    })
+    params = pd.DataFrame(candidates)
+    leaderboard = params.join(leaderboard)
+    return leaderboard.sort_values(['accuracy', 'model_bytes'], ascending=[False, True],
+                                   ignore_index=True)
+
+
+def select_candidate(leaderboard, tolerance=config.SEARCH_ACCURACY_TOLERANCE):
+    """
+    Pick the smallest, fastest candidate within ``tolerance`` of the best accuracy.
+
+    Returns:
+    --------
+    pd.Series : The selected leaderboard row
+    """
+    eligible = leaderboard[leaderboard['accuracy'] >= leaderboard['accuracy'].max() - tolerance]
+    return eligible.sort_values(['model_bytes', 'latency_ms']).iloc[0]
+
+
+def candidate_params(row, space=None):
+    """Recover a candidate's hyperparameters, with their original types, from its leaderboard row."""
+    space = space or config.SEARCH_SPACE
+    params = {}
+    for name in sorted(space):
+        value = row[name]
+        params[name] = next(option for option in space[name]
+                            if (option is None and pd.isna(value))
+                            or (option is not None and not pd.isna(value) and option == value))
+    return params
+
+
+def print_leaderboard(leaderboard, limit=10):
+    """Print the top rows of a leaderboard."""
+    columns = [c for c in leaderboard.columns if c not in ('accuracy_std', 'n_nodes')]
+    print(leaderboard[columns].head(limit).to_string(
+        index=False, float_format=lambda v: f"{v:.4f}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-validated Random Forest hyperparameter search')
+    parser.add_argument('--data', default=config.DATASET_FILE,
+                        help='Dataset (CSV/Parquet file or shard directory, see dataset.py)')
+    parser.add_argument('--folds', type=int, default=config.CV_FOLDS, help='Cross-validation folds')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count, 0 = in-process)')
+    parser.add_argument('--n-candidates', type=int, default=None,
+                        help='Sample this many candidates instead of the full grid')
+    parser.add_argument('--engine', choices=['sklearn', 'compiled'], default=config.MODEL_ENGINE,
+                        help='Engine used to time single-row inference')
+    parser.add_argument('--output', default=LEADERBOARD_FILE, help='Leaderboard CSV')
+    args = parser.parse_args()
+
+    # Labels are validated while the columnar cache is built, as in train.py
+    dataset = load_dataset(args.data)
+    X = dataset.features().astype(np.float64)
+    y = np.asarray(dataset.labels, dtype=np.int64)
+
+    print("=" * 60)
+    print("Crop Recommendation Hyperparameter Search")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    leaderboard = run_search(X, y, n_folds=args.folds, workers=args.workers,
+                             n_candidates=args.n_candidates, engine=args.engine)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    leaderboard.to_csv(args.output, index=False)
+
+    print_leaderboard(leaderboard)
+    print(f"\n[OK] {len(leaderboard)} candidates x {args.folds} folds in "
+          f"{time.perf_counter() - start:.1f}s")
+    print(f"[OK] Leaderboard written to {args.output}")
+    print(f"[OK] Selected: {candidate_params(select_candidate(leaderboard))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Vectorized Input Validation
+
+Converts a batch of feature records into one (n, 7) float64 matrix, a column
+at a time. Every check runs as an array mask over the whole batch:
+
+- missing:     key absent, None, or an empty string (CSV)
+- non-numeric: values float() rejects, and booleans
+- non-finite:  NaN and +/-inf (including the strings 'nan' and 'inf')
+- range:       outside ``config.FEATURE_RANGES`` (when config.VALIDATE_RANGES)
+
+Columns of plain ints and floats, the common case, are converted by numpy in
+a single call. Element-by-element conversion only happens for columns that
+contain other types. Error messages are built for the failing rows only.
+
+``validate_matrix`` applies the finite and range checks to a numeric matrix
+that is already in feature order (e.g. a binary request body), without
+copying it when every row is valid.
+
+Callers either reject the whole batch when any row is invalid, or score only
+``result.features`` (the valid rows) and report ``result.error_list()``. In
+both cases no model work is spent on rows that will be rejected.
+"""
+
+import numbers
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config
+
+# How /predict-batch treats invalid rows: reject the request, or skip the rows
+VALIDATION_MODES = ('reject', 'skip')
+
+_NUMERIC_TYPES = {int, float}
+
+# Query-string spellings of a boolean option
+_QUERY_FLAGS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class ValidationError(ValueError):
+    """A batch was rejected; ``errors`` lists ``{'row': i, 'errors': [...]}`` per invalid row."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        first = errors[0]
+        super().__init__(f"{len(errors)} invalid row(s); row {first['row']}: {'; '.join(first['errors'])}")
+
+
+class ValidationResult:
+    """
+    Outcome of validating one batch.
+
+    Attributes:
+    -----------
+    features : np.ndarray
+        (n_valid, n_features) matrix of the valid rows, in input order (float64,
+        or the input dtype for ``validate_matrix``)
+    valid : np.ndarray
+        (n,) bool mask of valid input rows
+    errors : dict
+        Input row index -> list of error messages, for invalid rows only
+    feature_names : list of str
+        Column order of ``features``
+    """
+
+    def __init__(self, features, valid, errors, feature_names):
+        self.features = features
+        self.valid = valid
+        self.errors = errors
+        self.feature_names = feature_names
+
+    @property
+    def ok(self):
+        """True when every row is valid."""
+        return not self.errors
+
+    @property
+    def valid_rows(self):
+        """Input indices of the rows in ``features``."""
+        return np.flatnonzero(self.valid)
+
+    def inputs(self):
+        """The valid rows as feature dicts of floats (echoed back in predictions)."""
+        return [dict(zip(self.feature_names, row)) for row in self.features.tolist()]
+
+    def error_list(self):
+        """Per-row errors as ``[{'row': i, 'errors': [...]}, ...]``, in row order."""
+        return [{'row': row, 'errors': self.errors[row]} for row in sorted(self.errors)]
+
+
+def parse_validation_mode(value, default=None):
+    """Read an ``on_error`` option; raises ValueError unless it is a known mode."""
+    if value is None:
+        return default or config.VALIDATION_MODE
+    if value not in VALIDATION_MODES:
+        raise ValueError(f"on_error must be one of {', '.join(VALIDATION_MODES)}")
+    return value
+
+
+def parse_top_k(value, default):
+    """Read a ``top_k`` option; raises ValueError unless it is an int in 1..n_crops."""
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= len(config.CROPS):
+        raise ValueError(f'top_k must be an integer between 1 and {len(config.CROPS)}')
+    return value
+
+
+def parse_fields(value):
+    """Read a ``fields`` option (a list or comma-separated string of prediction fields)."""
+    # Imported here: predict.py imports this module
+    from predict import PREDICTION_FIELDS
+
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(',') if field.strip()]
+    if not isinstance(value, list) or not value or any(field not in PREDICTION_FIELDS for field in value):
+        raise ValueError(f'fields must be a non-empty list of {", ".join(PREDICTION_FIELDS)}')
+    return value
+
+
+def parse_compact(value, fields):
+    """Read the ``compact`` flag of /predict-batch; it cannot be combined with ``fields``."""
+    if value is None:
+        return False
+    if not isinstance(value, bool):
+        raise ValueError('compact must be true or false')
+    if value and fields is not None:
+        raise ValueError('fields cannot be combined with compact')
+    return value
+
+
+def parse_query_options(args):
+    """
+    Read /predict-batch options from a query string.
+
+    ``args`` maps option names to strings (e.g. Flask's ``request.args``).
+    ``top_k`` becomes an int, ``fields`` a list and ``compact`` a bool
+    (true/false or 1/0); ``on_error`` is checked as is. Only the options
+    present are returned, typed so the ``parse_*`` helpers accept them like
+    values from a JSON body. Raises ValueError with the same messages.
+    """
+    options = {}
+    if 'top_k' in args:
+        try:
+            top_k = int(args['top_k'])
+        except ValueError:
+            raise ValueError(f'top_k must be an integer between 1 and {len(config.CROPS)}') from None
+        options['top_k'] = parse_top_k(top_k, None)
+    if 'on_error' in args:
+        options['on_error'] = parse_validation_mode(args['on_error'])
+    if 'fields' in args:
+        options['fields'] = parse_fields(args['fields'])
+    if 'compact' in args:
+        flag = args['compact'].strip().lower()
+        if flag not in _QUERY_FLAGS:
+            raise ValueError('compact must be true or false')
+        options['compact'] = _QUERY_FLAGS[flag]
+    return options
+
+
+def _convert_slow(column):
+    """
+    Element-wise conversion of a column with non-float entries.
+
+    Returns:
+    --------
+    tuple : (float64 values with NaN for failures, missing mask, non-numeric mask)
+    """
+    values = np.full(len(column), np.nan)
+    missing = np.zeros(len(column), dtype=bool)
+    non_numeric = np.zeros(len(column), dtype=bool)
+    for i, value in enumerate(column):
+        if value is None or (isinstance(value, str) and not value.strip()):
+            missing[i] = True
+        elif isinstance(value, (bool, np.bool_)) or not isinstance(value, (numbers.Number, str)):
+            non_numeric[i] = True
+        else:
+            try:
+                values[i] = float(value)
+            except (TypeError, ValueError, OverflowError):
+                non_numeric[i] = True
+    return values, missing, non_numeric
+
+
+def validate_records(records, feature_names=None, ranges=None):
+    """
+    Validate and convert a batch of feature records.
+
+    Parameters:
+    -----------
+    records : list
+        Feature dicts (anything else is reported as an invalid row)
+    feature_names : list of str, optional
+        Required features, in matrix column order (default ``config.FEATURES``)
+    ranges : dict, optional
+        Feature -> (low, high) inclusive bounds (default ``config.FEATURE_RANGES``
+        when ``config.VALIDATE_RANGES`` is on, else no range check)
+
+    Returns:
+    --------
+    ValidationResult : Matrix of the valid rows plus per-row errors
+    """
+    feature_names = list(feature_names or config.FEATURES)
+    if ranges is None and config.VALIDATE_RANGES:
+        ranges = config.FEATURE_RANGES
+    n_rows, n_features = len(records), len(feature_names)
+
+    matrix = np.empty((n_rows, n_features), dtype=np.float64)
+    missing = np.zeros((n_rows, n_features), dtype=bool)
+    non_numeric = np.zeros((n_rows, n_features), dtype=bool)
+    not_object = np.array([type(row) is not dict for row in records], dtype=bool)
+
+    for j, name in enumerate(feature_names):
+        column = [row.get(name) if type(row) is dict else None for row in records]
+        if set(map(type, column)) <= _NUMERIC_TYPES:
+            try:
+                matrix[:, j] = column
+                continue
+            except OverflowError:
+                pass
+        matrix[:, j], missing[:, j], non_numeric[:, j] = _convert_slow(column)
+
+    missing[not_object] = False
+    return _check(matrix, feature_names, ranges, not_object, missing, non_numeric)
+
+
+def validate_matrix(matrix, feature_names=None, ranges=None):
+    """
+    Validate an (n, n_features) numeric matrix whose columns are in feature order.
+
+    Rows are checked for non-finite and out-of-range values only. When every
+    row is valid, ``features`` is ``matrix`` itself (no copy, same dtype).
+
+    Returns:
+    --------
+    ValidationResult : The valid rows plus per-row errors
+    """
+    feature_names = list(feature_names or config.FEATURES)
+    if ranges is None and config.VALIDATE_RANGES:
+        ranges = config.FEATURE_RANGES
+    if matrix.ndim != 2 or matrix.shape[1] != len(feature_names):
+        raise ValueError(f"Expected an (n, {len(feature_names)}) feature matrix, got shape {matrix.shape}")
+    flags = np.zeros(matrix.shape, dtype=bool)
+    return _check(matrix, feature_names, ranges, np.zeros(len(matrix), dtype=bool), flags, flags)
+
+
+def _check(matrix, feature_names, ranges, not_object, missing, non_numeric):
+    """Add the finite and range checks to the conversion masks and collect per-row errors."""
+    n_rows, n_features = matrix.shape
+    converted = ~(missing | non_numeric)
+    converted[not_object] = False
+    non_finite = converted & ~np.isfinite(matrix)
+
+    out_of_range = np.zeros((n_rows, n_features), dtype=bool)
+    if ranges:
+        low = np.array([ranges.get(name, (-np.inf, np.inf))[0] for name in feature_names], dtype=matrix.dtype)
+        high = np.array([ranges.get(name, (-np.inf, np.inf))[1] for name in feature_names], dtype=matrix.dtype)
+        with np.errstate(invalid='ignore'):
+            out_of_range = converted & ~non_finite & ((matrix < low) | (matrix > high))
+    else:
+        low = high = None
+
+    invalid = not_object | missing.any(axis=1) | non_numeric.any(axis=1) | non_finite.any(axis=1) \
+        | out_of_range.any(axis=1)
+
+    errors = {}
+    for i in np.flatnonzero(invalid).tolist():
+        if not_object[i]:
+            errors[i] = ['Record must be a JSON object']
+            continue
+        messages = []
+        if missing[i].any():
+            messages.append(f"Missing required fields: {', '.join(_names(feature_names, missing[i]))}")
+        if non_numeric[i].any():
+            messages.append(f"Non-numeric values: {', '.join(_names(feature_names, non_numeric[i]))}")
+        if non_finite[i].any():
+            messages.append(f"Non-finite values: {', '.join(_names(feature_names, non_finite[i]))}")
+        for j in np.flatnonzero(out_of_range[i]).tolist():
+            messages.append(f"{feature_names[j]}={matrix[i, j]:g} is outside the range "
+                            f"{low[j]:g} to {high[j]:g}")
+        errors[i] = messages
+
+    valid = ~invalid
+    features = matrix if valid.all() else matrix[valid]
+    return ValidationResult(features, valid, errors, feature_names)
+
+
+def _names(feature_names, mask):
+    return [name for name, flagged in zip(feature_names, mask.tolist()) if flagged]
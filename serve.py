@@ -0,0 +1,333 @@
+"""
+Production Server for the Crop Recommendation API
+
+Pre-fork serving entry point. The master process loads the model once, binds
+the listening socket and forks worker processes that inherit both, so the
+model's memory is shared copy-on-write instead of being loaded per worker.
+Each worker serves requests from a bounded thread pool.
+
+Signals (send to the master process):
+    SIGHUP           Reload the model, start fresh workers, then gracefully
+                     stop the old ones (in-flight requests are finished)
+    SIGTERM/SIGINT   Graceful shutdown
+
+The master also polls the model registry (scripts/registry.py) and performs
+the same graceful reload whenever a new version is activated.
+
+With --shared-model (config.SHARED_MEMORY_MODEL), the master publishes the
+flattened forest in a POSIX shared memory segment (scripts/shared_model.py)
+and serves it from a read-only mapping that the workers inherit, so no
+process holds a private copy of the trees. Each reload publishes a new
+segment and unlinks the previous one; shutdown unlinks the last. The segment
+name is exported as CROP_SHARED_MODEL for workers started some other way.
+
+Usage:
+    python serve.py [--workers N] [--threads N] [--host HOST] [--port PORT] [--shared-model]
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, select_address_family
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scripts'))
+
+import config
+from shared_model import SHARED_MODEL_ENV, SharedModelPublisher
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles connections on a fixed thread pool."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, fd=fd)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        """Hand the accepted connection to the thread pool."""
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Wait for in-flight requests to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def create_listen_socket(host, port, backlog=2048):
+    """Bind the shared listening socket in the master process."""
+    family = select_address_family(host, port)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # Workers race on accept(); a loser gets EAGAIN instead of blocking
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(wsgi_app, listen_sock, host, threads):
+    """Serve requests in a forked worker until SIGTERM, then drain and exit."""
+    server = PooledWSGIServer(host, listen_sock.getsockname()[1], wsgi_app, threads,
+                              fd=listen_sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.drain()
+
+
+class Master:
+    """Pre-fork master: owns the socket and the model, supervises workers."""
+
+    def __init__(self, app_module, host, port, workers, threads, graceful_timeout, shared_model=False):
+        self.app_module = app_module
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.publisher = SharedModelPublisher() if shared_model else None
+
+        self.listen_sock = None
+        self.workers = set()
+        self.retiring = {}
+        self._reload_requested = False
+        self._stop_requested = False
+        self._next_registry_poll = 0.0
+        self._registry_version = None
+
+    def spawn_worker(self):
+        """Fork one worker process."""
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(self.app_module.app, self.listen_sock, self.host, self.threads)
+            except Exception as e:
+                print(f"[ERROR] Worker {os.getpid()} crashed: {e}", file=sys.stderr)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers.add(pid)
+        return pid
+
+    def share_model(self):
+        """
+        Publish the loaded model to shared memory and serve it from there.
+
+        The master swaps its own predictor for one mapped from the segment,
+        dropping the private copy; workers forked afterwards inherit that
+        mapping. Publishing unlinks the previous segment, which stays mapped
+        by the workers still using it until they exit.
+        """
+        if self.publisher is None:
+            return
+        name = self.publisher.publish(self.app_module.predictor)
+        self.app_module.attach_shared_model(name)
+        os.environ[SHARED_MODEL_ENV] = name
+        print(f"[OK] Model published to shared memory segment {name} "
+              f"({self.publisher.size / 2 ** 20:.1f} MB)")
+
+    def reload(self, reason='HUP'):
+        """Reload the model in the master and replace every worker."""
+        print(f"\n[{reason}] Reloading model...")
+        try:
+            self.app_module.reload_predictor()
+            self.share_model()
+        except Exception as e:
+            print(f"[ERROR] Reload failed, keeping current workers: {e}")
+            return
+
+        old_workers = self.workers
+        self.workers = set()
+        for _ in range(self.num_workers):
+            self.spawn_worker()
+
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in old_workers:
+            self._signal(pid, signal.SIGTERM)
+            self.retiring[pid] = deadline
+        print(f"[OK] Model reloaded; {len(self.workers)} new workers started")
+
+    def registry_changed(self):
+        """
+        True when the registry's current version differs from the loaded one.
+
+        Polled from the supervision loop rather than a thread, because the
+        master forks workers and must not hold locks owned by other threads.
+        """
+        registry = self.app_module.model_registry
+        now = time.monotonic()
+        if registry is None or now < self._next_registry_poll:
+            return False
+        self._next_registry_poll = now + config.REGISTRY_POLL_SECONDS
+
+        # Each activation triggers one reload attempt, even if it fails
+        try:
+            version = registry.current_version()
+        except ValueError as e:
+            print(f"[WARN] Ignoring registry pointer: {e}")
+            return False
+        if version is None or version == self._registry_version:
+            return False
+        self._registry_version = version
+        return version != self.app_module.predictor.model_version
+
+    def reap(self):
+        """Collect exited workers and replace any that died unexpectedly."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                del self.retiring[pid]
+            elif pid in self.workers:
+                self.workers.discard(pid)
+                if not self._stop_requested:
+                    print(f"[WARN] Worker {pid} exited (status {status}); respawning")
+                    self.spawn_worker()
+
+    def kill_stragglers(self):
+        """SIGKILL retiring workers that outlived the graceful timeout."""
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                self._signal(pid, signal.SIGKILL)
+
+    def shutdown(self):
+        """Stop all workers gracefully, force-killing after the timeout."""
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+            self.retiring[pid] = deadline
+        self.workers = set()
+        while self.retiring:
+            self.reap()
+            self.kill_stragglers()
+            time.sleep(0.1)
+        self.listen_sock.close()
+        if self.publisher is not None:
+            self.publisher.close()
+
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def run(self):
+        """Bind, preload, fork workers and supervise until told to stop."""
+        self.listen_sock = create_listen_socket(self.host, self.port)
+        self.port = self.listen_sock.getsockname()[1]
+
+        print("\nInitializing prediction model in master...")
+        # The master polls the registry itself; a watcher thread must not be
+        # running when workers are forked
+        self.app_module.watch_registry = False
+        if self.publisher is not None:
+            # The master loads from disk; a stale segment name must not be attached
+            os.environ.pop(SHARED_MODEL_ENV, None)
+        if not self.app_module.initialize_predictor():
+            print("[ERROR] Failed to load model!")
+            print("Please train the model first using: python scripts/train.py")
+            return 1
+        try:
+            self.share_model()
+        except Exception as e:
+            print(f"[ERROR] Failed to publish the model to shared memory: {e}")
+            return 1
+
+        for _ in range(self.num_workers):
+            self.spawn_worker()
+
+        print(f"[OK] Serving on http://{self.host}:{self.port} "
+              f"with {self.num_workers} workers x {self.threads} threads (master pid {os.getpid()})")
+
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, '_reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, '_stop_requested', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, '_stop_requested', True))
+
+        while not self._stop_requested:
+            if self._reload_requested:
+                self._reload_requested = False
+                self.reload()
+            elif self.registry_changed():
+                self.reload(reason='REGISTRY')
+            self.reap()
+            self.kill_stragglers()
+            time.sleep(0.2)
+
+        print("\nShutting down workers...")
+        self.shutdown()
+        print("[OK] Server stopped")
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-fork production server for the Crop Recommendation API')
+    parser.add_argument('--host', default=config.API_HOST)
+    parser.add_argument('--port', type=int, default=config.API_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS)
+    parser.add_argument('--threads', type=int, default=config.SERVER_THREADS)
+    parser.add_argument('--graceful-timeout', type=float, default=config.SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument('--shared-model', action=argparse.BooleanOptionalAction,
+                        default=config.SHARED_MEMORY_MODEL,
+                        help='Serve the forest from one shared memory segment instead of per-process copies')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Crop Recommendation API Server (production)")
+    print("=" * 60)
+
+    import app as app_module
+
+    if not hasattr(os, 'fork'):
+        # No fork() (e.g. Windows): serve from a single process
+        print("[WARN] os.fork is unavailable; running a single worker process")
+        if not app_module.initialize_predictor():
+            print("[ERROR] Failed to load model!")
+            return 1
+        server = PooledWSGIServer(args.host, args.port, app_module.app, args.threads)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.drain()
+        return 0
+
+    master = Master(app_module, args.host, args.port, args.workers,
+                    args.threads, args.graceful_timeout, shared_model=args.shared_model)
+    return master.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
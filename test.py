@@ -4,13 +4,21 @@ Test script for Crop Recommendation System
 This script tests the trained model with various inputs and validates the system.
 """
 
+import asyncio
+import json
 import sys
 import os
+import tempfile
 
 # Add scripts to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scripts'))
 
-from predict import CropRecommendationPredictor
+import numpy as np
+
+from predict import CropRecommendationPredictor, fuse_scalers
+from model_bundle import load_bundle, write_bundle
+from prediction_cache import PredictionCache
+from tree_engine import FlattenedForest
 
 def print_header(title):
     """Print a formatted header."""
@@ -195,6 +203,1182 @@ def test_feature_names():
     expected_features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
     return features == expected_features
 
+def test_fused_scaling_parity():
+    """Test that the fused scaler matches the MinMaxScaler + StandardScaler chain."""
+    print_header("Test 7: Fused Scaling Parity")
+    
+    predictor = CropRecommendationPredictor()
+    scale, offset = fuse_scalers(predictor.minmax_scaler, predictor.standard_scaler)
+    
+    rng = np.random.default_rng(0)
+    features = rng.uniform(0, 300, size=(1000, 7))
+    
+    two_step = predictor._scale_two_step(features.copy())
+    fused = features.copy()
+    fused *= scale
+    fused += offset
+    
+    max_error = np.max(np.abs(fused - two_step))
+    print(f"\nFused scaler loaded from disk: {predictor.fused_scale is not None}")
+    print(f"Max absolute difference: {max_error:.3e}")
+    
+    matches_disk = (predictor.fused_scale is None or
+                    np.allclose(predictor.fused_scale, scale) and
+                    np.allclose(predictor.fused_offset, offset))
+    
+    return np.allclose(fused, two_step, rtol=1e-10, atol=1e-10) and matches_disk
+
+def test_compiled_engine_parity():
+    """Test that the compiled tree engine matches sklearn's probabilities."""
+    print_header("Test 8: Compiled Engine Parity")
+    
+    reference = CropRecommendationPredictor()
+    predictor = CropRecommendationPredictor(engine='compiled')
+    
+    rng = np.random.default_rng(1)
+    features = rng.uniform(0, 300, size=(2000, 7))
+    features[:, 5] = rng.uniform(3, 10, size=2000)
+    features_scaled = predictor._scale(features)
+    
+    expected = reference.model.predict_proba(features_scaled)
+    actual = predictor.forest.predict_proba(features_scaled)
+    
+    max_error = np.max(np.abs(actual - expected))
+    same_labels = np.array_equal(np.argmax(actual, axis=1), np.argmax(expected, axis=1))
+    print(f"\nTrees: {predictor.forest.n_trees}, nodes: {predictor.forest.n_nodes}")
+    print(f"Max probability difference: {max_error:.3e}")
+    print(f"Identical labels: {same_labels}")
+    
+    result = predictor.predict(N=90, P=42, K=43, temperature=20.88,
+                               humidity=82.00, ph=6.50, rainfall=202.94)
+    
+    return max_error < 1e-9 and same_labels and result['crop'] == 'rice'
+
+def test_prediction_cache():
+    """Test the quantized LRU + TTL prediction cache."""
+    print_header("Test 9: Prediction Cache")
+    
+    predictor = CropRecommendationPredictor()
+    now = [0.0]
+    cache = PredictionCache(
+        predictor.get_feature_names(),
+        {'N': 1, 'P': 1, 'K': 1, 'temperature': 0.1, 'humidity': 0.1, 'ph': 0.01, 'rainfall': 0.1},
+        max_entries=2,
+        ttl_seconds=60,
+        clock=lambda: now[0]
+    )
+    
+    rice = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+            'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}
+    rice_jitter = dict(rice, temperature=20.87, rainfall=202.91)
+    mango = {'N': 120, 'P': 70, 'K': 50, 'temperature': 28.0,
+             'humidity': 65.0, 'ph': 6.5, 'rainfall': 200.0}
+    apple = {'N': 100, 'P': 60, 'K': 40, 'temperature': 20.0,
+             'humidity': 50.0, 'ph': 6.5, 'rainfall': 90.0}
+    
+    first = cache.get_or_predict(predictor, rice)
+    second = cache.get_or_predict(predictor, rice_jitter)
+    hit_ok = (cache.hits == 1 and second['crop'] == first['crop'] == 'rice'
+              and second['input'] == rice_jitter)
+    
+    cache.get_or_predict(predictor, mango)
+    cache.get_or_predict(predictor, apple)
+    eviction_ok = cache.evictions == 1 and cache.stats()['size'] == 2
+    
+    now[0] = 61.0
+    cache.get_or_predict(predictor, apple)
+    expiry_ok = cache.expirations == 1
+    
+    predictor.reload()
+    cache.get_or_predict(predictor, apple)
+    invalidation_ok = cache.invalidations == 1 and cache.stats()['size'] == 1
+    
+    print(f"\nCache stats: {cache.stats()}")
+    
+    return hit_ok and eviction_ok and expiry_ok and invalidation_ok
+
+def test_model_bundle():
+    """Test that a model bundle round-trips and predicts like the pickles."""
+    print_header("Test 10: Model Bundle")
+    
+    reference = CropRecommendationPredictor()
+    forest = FlattenedForest.from_sklearn(reference.model)
+    scale, offset = fuse_scalers(reference.minmax_scaler, reference.standard_scaler)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'crop_model.bundle')
+        size = write_bundle(path, forest, reference.crop_mapping, reference.feature_names,
+                            scale, offset, metadata={'source': 'test'})
+        bundle = load_bundle(path)
+        
+        arrays_ok = all(
+            np.array_equal(getattr(bundle.forest, name), getattr(forest, name))
+            for name in ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes')
+        )
+        mapped = isinstance(bundle.forest.value, np.memmap)
+        
+        predictor = CropRecommendationPredictor(engine='compiled', bundle_path=path)
+        rows = [
+            {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+             'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94},
+            {'N': 100, 'P': 60, 'K': 40, 'temperature': 20.0,
+             'humidity': 50.0, 'ph': 6.5, 'rainfall': 90.0}
+        ]
+        same_results = predictor.predict_batch(rows) == reference.predict_batch(rows)
+        no_pickles = predictor.model is None and bundle.metadata == {'source': 'test'}
+        del predictor, bundle
+    
+    print(f"\nBundle size: {size / 1024:.1f} KB")
+    print(f"Arrays identical: {arrays_ok}, memory-mapped: {mapped}")
+    print(f"Predictions identical: {same_results}")
+    
+    return arrays_ok and mapped and same_results and no_pickles
+
+async def _asgi_request(asgi, method, path, payload=None):
+    """Send one HTTP request to an ASGI app and decode the JSON response."""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    messages = []
+    
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    
+    async def send(message):
+        messages.append(message)
+    
+    path, _, query = path.partition('?')
+    await asgi({'type': 'http', 'method': method, 'path': path, 'query_string': query.encode('latin-1'),
+                'headers': []}, receive, send)
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+def test_asgi_micro_batching():
+    """Test that the ASGI app micro-batches /predict and matches Flask's responses."""
+    print_header("Test 11: ASGI Micro-Batching")
+    
+    import app as flask_app
+    from asgi_app import CropRecommendationASGI
+    
+    rows = [
+        {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+         'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94},
+        {'N': 120, 'P': 70, 'K': 50, 'temperature': 28.0,
+         'humidity': 65.0, 'ph': 6.5, 'rainfall': 200.0},
+        {'N': 100, 'P': 60, 'K': 40, 'temperature': 20.0,
+         'humidity': 50.0, 'ph': 6.5, 'rainfall': 90.0}
+    ]
+    
+    async def scenario():
+        asgi = CropRecommendationASGI(max_batch_size=16, max_delay_ms=50)
+        await asgi.startup()
+        try:
+            responses = await asyncio.gather(
+                *[_asgi_request(asgi, 'POST', '/predict', row) for row in rows * 10])
+            missing = await _asgi_request(asgi, 'POST', '/predict', {'N': 1})
+            batch = await _asgi_request(asgi, 'POST', '/predict-batch?compact=true&top_k=2', {'data': rows})
+            return responses, missing, batch, asgi.batcher.stats()
+        finally:
+            await asgi.shutdown()
+    
+    responses, missing, batch, stats = asyncio.run(scenario())
+    
+    client = flask_app.app.test_client()
+    flask_responses = [client.post('/predict', json=row).get_json() for row in rows]
+    flask_missing = client.post('/predict', json={'N': 1})
+    flask_batch = client.post('/predict-batch?compact=true&top_k=2', json={'data': rows})
+    
+    same_shape = all(
+        status == 200 and body == flask_responses[i % len(rows)]
+        for i, (status, body) in enumerate(responses)
+    )
+    same_error = missing == (flask_missing.status_code, flask_missing.get_json())
+    # Query-string options are parsed the same way by both apps
+    same_batch = batch == (flask_batch.status_code, flask_batch.get_json()) and 'ids' in batch[1]
+    
+    print(f"\nRequests: {len(responses)}, batches: {stats['batches']}, "
+          f"largest batch: {stats['largest_batch']}")
+    print(f"Responses match Flask: {same_shape}, errors match Flask: {same_error}")
+    
+    return same_shape and same_error and same_batch and stats['batches'] < len(responses)
+
+def test_predict_stream():
+    """Test streaming NDJSON and CSV scoring on /predict-stream."""
+    print_header("Test 12: Streaming Predictions")
+    
+    import app as flask_app
+    client = flask_app.app.test_client()
+    
+    ndjson_body = "\n".join([
+        json.dumps({'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+                    'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}),
+        json.dumps({'N': 90, 'P': 42}),
+        "not json",
+        json.dumps({'N': 100, 'P': 60, 'K': 40, 'temperature': 20.0,
+                    'humidity': 50.0, 'ph': 6.5, 'rainfall': 90.0})
+    ])
+    response = client.post('/predict-stream?chunk_size=2', data=ndjson_body,
+                           content_type='application/x-ndjson')
+    ndjson_lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    
+    # Both JSON backends decode and encode the stream the same way
+    # (parser error messages differ, so only rows and predictions are compared)
+    import io
+    import serialization
+    from stream_io import score_stream
+    
+    def stream_summary(lines):
+        return [(r['row'], r['success'], r.get('prediction')) for r in lines]
+    
+    backends = ['json'] + (['orjson'] if serialization.resolve_backend('auto') == 'orjson' else [])
+    same_backends = all(
+        stream_summary([json.loads(line) for line in b''.join(score_stream(
+            flask_app.predictor, io.BytesIO(ndjson_body.encode()), 'ndjson', 2, backend)).splitlines()])
+        == stream_summary(ndjson_lines)
+        for backend in backends
+    )
+    
+    csv_body = ("N,P,K,temperature,humidity,ph,rainfall\n"
+                "120,70,50,28.0,65.0,6.5,200.0\n"
+                "100,60,40,20.0,50.0,abc,90.0\n")
+    response = client.post('/predict-stream', data=csv_body, content_type='text/csv')
+    csv_lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    
+    unsupported = client.post('/predict-stream', data='x', content_type='text/plain')
+    
+    print(f"\nNDJSON rows: {[(r['row'], r['success']) for r in ndjson_lines]}")
+    print(f"CSV rows: {[(r['row'], r['success']) for r in csv_lines]}")
+    
+    return (
+        [r['success'] for r in ndjson_lines] == [True, False, False, True]
+        and ndjson_lines[0]['prediction']['crop'] == 'rice'
+        and ndjson_lines[3]['prediction']['crop'] == 'apple'
+        and [r['success'] for r in csv_lines] == [True, False]
+        and csv_lines[0]['prediction']['crop'] == 'mango'
+        and unsupported.status_code == 415
+        and same_backends
+    )
+
+def test_bulk_scoring():
+    """Test the offline bulk scoring CLI against predict_batch."""
+    print_header("Test 13: Bulk Scoring")
+    
+    import pandas as pd
+    from score import iter_input_chunks, score_file
+    from validation import ValidationError
+    
+    samples = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'Crop_recommendation.csv'))
+    samples = samples.drop('label', axis=1).sample(50, random_state=0)
+    expected = CropRecommendationPredictor(engine='compiled').predict_batch(samples.to_dict('records'))
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'samples.csv')
+        output_path = os.path.join(tmp, 'predictions.csv')
+        samples.to_csv(input_path, index=False)
+        
+        stats = score_file(input_path, output_path, chunk_size=16, workers=0, top_k=3)
+        scored = pd.read_csv(output_path)
+        checkpoint_removed = not os.path.exists(output_path + '.ckpt')
+        # Resuming skips leading data rows, whatever the chunk boundaries
+        resumed = np.vstack(list(iter_input_chunks(input_path, chunk_size=16, skip_rows=21)))
+        
+        # Missing and out-of-range values are never scored
+        invalid = samples.head(4).copy()
+        invalid.iloc[1, 0] = np.nan
+        invalid.iloc[2, [0, 5]] = [900, -3]
+        invalid_path = os.path.join(tmp, 'invalid.csv')
+        invalid.to_csv(invalid_path, index=False)
+        try:
+            score_file(invalid_path, output_path, workers=0)
+            rejected = False
+        except ValidationError as e:
+            rejected = [row['row'] for row in e.errors] == [1, 2]
+        skip_stats = score_file(invalid_path, output_path, workers=0, on_error='skip')
+        skipped = pd.read_csv(output_path)
+    
+    print(f"\nRows scored: {stats['rows']} ({stats['rows_per_second']:.0f} rows/s)")
+    
+    return (
+        stats['rows'] == 50 and checkpoint_removed
+        and np.array_equal(resumed, samples.to_numpy(dtype=np.float64)[21:])
+        and rejected and skip_stats['rejected'] == 2
+        and skipped['crop'].isna().tolist() == [False, True, True, False]
+        and skipped['error'].notna().tolist() == [False, True, True, False]
+        and scored['row'].tolist() == list(range(50))
+        and scored['crop'].tolist() == [r['crop'] for r in expected]
+        and scored['crop_id'].tolist() == [r['crop_id'] for r in expected]
+        and (scored['top1_crop'] == scored['crop']).all()
+        and (scored['top1_proba'] >= scored['top2_proba']).all()
+    )
+
+def test_top_k_alternatives():
+    """Test ranked alternatives on single, batch and API predictions."""
+    print_header("Test 14: Top-K Alternatives")
+    
+    import app as flask_app
+    predictor = CropRecommendationPredictor()
+    
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+           'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}
+    single = predictor.predict(**row, top_k=5)
+    batch = predictor.predict_batch([row], top_k=5)[0]
+    plain = predictor.predict(**row)
+    alternatives = single['alternatives']
+    confidences = [alt['confidence'] for alt in alternatives]
+    
+    client = flask_app.app.test_client()
+    default_response = client.post('/predict', json=row).get_json()
+    one_response = client.post('/predict', json=dict(row, top_k=1)).get_json()
+    invalid = client.post('/predict', json=dict(row, top_k=0))
+    
+    print(f"\nAlternatives: {[(alt['crop'], alt['confidence']) for alt in alternatives]}")
+    print(f"Default API alternatives: {len(default_response['prediction']['alternatives'])}")
+    
+    return (
+        len(alternatives) == 5
+        and confidences == sorted(confidences, reverse=True)
+        and alternatives[0]['crop'] == single['crop'] == plain['crop']
+        and alternatives[0]['crop_id'] == single['crop_id']
+        and batch == single
+        and 'alternatives' not in plain
+        and len(default_response['prediction']['alternatives']) == 3
+        and len(one_response['prediction']['alternatives']) == 1
+        and invalid.status_code == 400
+    )
+
+def test_hyperparameter_search():
+    """Test the cross-validated hyperparameter search and candidate selection."""
+    print_header("Test 15: Hyperparameter Search")
+    
+    import pandas as pd
+    import config
+    from tune import candidate_params, run_search, select_candidate
+    
+    crop = pd.read_csv(config.DATASET_FILE)
+    X = crop[config.FEATURES].to_numpy(dtype=np.float64)
+    y = crop['label'].map(config.CROPS).to_numpy()
+    space = {'n_estimators': [5, 20], 'max_depth': [4, None]}
+    
+    leaderboard = run_search(X, y, space=space, n_folds=3, workers=0)
+    selected = select_candidate(leaderboard, tolerance=1.0)
+    params = candidate_params(selected, space)
+    
+    print(f"\n{leaderboard[['n_estimators', 'max_depth', 'accuracy', 'model_bytes']].to_string(index=False)}")
+    print(f"Selected: {params}")
+    
+    return (
+        len(leaderboard) == 4
+        and leaderboard['accuracy'].is_monotonic_decreasing
+        and (leaderboard[['fit_seconds', 'model_bytes', 'latency_ms']] > 0).all().all()
+        and selected['model_bytes'] == leaderboard['model_bytes'].min()
+        and params == {'max_depth': 4, 'n_estimators': 5}
+        and type(params['n_estimators']) is int
+    )
+
+def test_model_compression():
+    """Test tree selection, pruning, distillation and loading compressed variants."""
+    print_header("Test 16: Model Compression")
+    
+    from compress import compress
+    
+    forest = CropRecommendationPredictor(engine='compiled').forest
+    X = np.random.default_rng(0).normal(size=(500, 7))
+    full = forest.predict_proba(X)
+    subset = forest.select_trees([3, 1])
+    expected_subset = forest.value[forest.apply(X)[:, [3, 1]]].mean(axis=1)
+    
+    engine_ok = (
+        np.array_equal(forest.select_trees(range(forest.n_trees)).predict_proba(X), full)
+        and np.array_equal(forest.prune(max_depth=forest.max_depth).predict_proba(X), full)
+        and np.allclose(subset.predict_proba(X), expected_subset)
+        and forest.prune(max_depth=4).max_depth == 4
+    )
+    
+    # Compress a freshly trained bundle, so its recorded split is the one rebuilt
+    import contextlib, io
+    from train import train
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            trained = train(output_dir=os.path.join(tmp, 'models'))
+        split = load_bundle(trained['bundle_path']).metadata['split']
+        report = compress(trained['bundle_path'], output_dir=tmp, depths=[8])
+        variants = {
+            name: CropRecommendationPredictor(engine='compiled',
+                                              bundle_path=os.path.join(tmp, f'{name}.bundle'))
+            for name in report['variant']
+        }
+        result = variants['select'].predict(90, 42, 43, 20.88, 82.00, 6.50, 202.94)
+    
+    try:
+        CropRecommendationPredictor(engine='sklearn', variant='select')
+        variant_guard = False
+    except ValueError:
+        variant_guard = True
+    
+    print(f"\n{report[['variant', 'n_trees', 'n_nodes', 'bytes', 'accuracy_delta']].to_string(index=False)}")
+    print(f"Select variant predicts: {result['crop']}")
+    
+    full_row = report.iloc[0]
+    return (
+        engine_ok and variant_guard
+        and list(report['variant']) == ['full', 'select', 'prune_d8', 'select_prune_d8', 'distill']
+        and full_row['accuracy_delta'] == 0
+        and split['method'] == 'random'
+        and variants['full'].model_metadata['holdout_accuracy'] == trained['accuracy']
+        and (report['bytes'].iloc[1:] < full_row['bytes']).all()
+        and all(p.forest.n_trees == n for p, n in zip(variants.values(), report['n_trees']))
+        and result['crop'] == 'rice'
+    )
+
+def test_incremental_training():
+    """Test incremental retraining from an append-only CSV."""
+    print_header("Test 17: Incremental Training")
+    
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    import config
+    from incremental import IncrementalTrainer
+    
+    data = pd.read_csv(config.DATASET_FILE).sample(frac=1, random_state=0)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'field.csv')
+        state_dir = os.path.join(tmp, 'state')
+        
+        data.iloc[:120].to_csv(source, index=False)
+        trainer = IncrementalTrainer(state_dir, trees_per_segment=10, max_trees=20)
+        trainer.add_segment(source, 'day1')
+        
+        # New rows appended to the same file; only they are read
+        data.iloc[120:].to_csv(source, mode='a', header=False, index=False)
+        trainer = IncrementalTrainer(state_dir, trees_per_segment=10, max_trees=20)
+        second = trainer.add_segment(source, 'day2')
+        nothing_new = trainer.add_segment(source) is None
+        
+        trainer = IncrementalTrainer(state_dir, trees_per_segment=10, max_trees=15)
+        data.iloc[:40].to_csv(os.path.join(tmp, 'day3.csv'), index=False)
+        trainer.add_segment(os.path.join(tmp, 'day3.csv'), 'day3')
+        
+        bundle_path = os.path.join(tmp, 'model.bundle')
+        trainer.export(bundle_path)
+        predictor = CropRecommendationPredictor(engine='compiled', bundle_path=bundle_path)
+        manifest = trainer.manifest
+        retired_files_removed = not os.path.exists(os.path.join(state_dir, manifest['retired'][0]['file']))
+    
+    # Running statistics over all three segments match scalers fitted at once
+    X = data[config.FEATURES].to_numpy(dtype=np.float64)
+    X_seen = np.vstack([X, X[:40]])
+    minmax = MinMaxScaler().fit(X_seen)
+    expected = fuse_scalers(minmax, StandardScaler().fit(minmax.transform(X_seen)))
+    scaler_ok = all(np.allclose(a, b) for a, b in zip(trainer.scaler.fused(), expected))
+    
+    results = predictor.predict_batch(data[config.FEATURES].to_dict('records'))
+    accuracy = np.mean([r['crop'] == label for r, label in zip(results, data['label'])])
+    
+    print(f"\nSegments: {[(seg['id'], seg['start_row'], seg['end_row']) for seg in manifest['segments']]}")
+    print(f"Active groups: {[g['segments'] for g in manifest['groups']]}, "
+          f"retired: {[g['segments'] for g in manifest['retired']]}")
+    print(f"Accuracy of the incremental forest on all rows: {accuracy:.2%}")
+    print(f"Running scaler matches a full fit: {scaler_ok}")
+    
+    return (
+        [(seg['start_row'], seg['end_row']) for seg in manifest['segments'][:2]] == [(0, 120), (120, len(data))]
+        and second['rows'] == len(data) - 120 and nothing_new
+        and [g['segments'] for g in manifest['groups']] == [['day3']]
+        and [g['segments'] for g in manifest['retired']] == [['day1'], ['day2']]
+        and retired_files_removed
+        and trainer.scaler.n_samples == len(data) + 40
+        and predictor.forest.n_trees == 10
+        and scaler_ok
+        and accuracy > 0.5
+    )
+
+def test_model_registry_hot_reload():
+    """Test versioned publishing, the current pointer and hot reload via /model."""
+    print_header("Test 18: Model Registry Hot Reload")
+    
+    import app as flask_app
+    from registry import ModelRegistry, RegistryWatcher
+    
+    source_bundle = os.path.join(os.path.dirname(__file__), 'models', 'crop_model.bundle')
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+           'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}
+    original_registry = flask_app.model_registry
+    client = flask_app.app.test_client()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        first = registry.publish(source_bundle)
+        staged = registry.publish(source_bundle, activate=False)
+        
+        # Version names from the command line or CURRENT cannot leave the registry
+        escapes_rejected = 0
+        for attempt in (lambda: registry.activate('../versions/v0001'),
+                        lambda: ModelRegistry(os.path.join(tmp, 'versions')).activate('../v0001')):
+            try:
+                attempt()
+            except ValueError:
+                escapes_rejected += 1
+        with open(os.path.join(tmp, 'CURRENT'), 'w') as f:
+            f.write('../../outside\n')
+        try:
+            registry.current_version()
+        except ValueError:
+            escapes_rejected += 1
+        ignored = not RegistryWatcher(registry, flask_app.reload_predictor).check()
+        registry.activate(first)
+        
+        try:
+            flask_app.model_registry = registry
+            flask_app.reload_predictor()
+            before = client.get('/model').get_json()
+            
+            watcher = RegistryWatcher(registry, flask_app.reload_predictor, version=first)
+            unchanged = watcher.check()
+            registry.activate(staged)
+            swapped = watcher.check()
+            after = client.get('/model').get_json()
+            prediction = client.post('/predict', json=row).get_json()
+            
+            # Any WSGI host: the first request starts the watcher with the predictor
+            original_watcher = flask_app.model_watcher
+            flask_app.predictor, flask_app.model_watcher = None, None
+            client.get('/health')
+            lazy_watcher = flask_app.model_watcher
+            lazy_watcher.stop()
+            flask_app.model_watcher = original_watcher
+        finally:
+            flask_app.model_registry = original_registry
+            flask_app.reload_predictor()
+    
+    print(f"\nVersions: {after['registry']['versions']}, current: {after['registry']['current']}")
+    print(f"Active before: {before['model']['version']}, after: {after['model']['version']} "
+          f"(loaded in {after['model']['load_seconds']}s)")
+    
+    return (
+        (first, staged) == ('v0001', 'v0002')
+        and after['registry']['versions'] == ['v0001', 'v0002']
+        and before['model']['version'] == 'v0001'
+        and not unchanged and swapped
+        and after['model']['version'] == 'v0002'
+        and after['model']['generation'] > before['model']['generation']
+        and after['model']['loaded_at'] is not None
+        and prediction['prediction']['crop'] == 'rice'
+        and lazy_watcher.registry is registry and lazy_watcher.version == 'v0002'
+        and escapes_rejected == 3 and ignored
+    )
+
+def test_metrics_endpoint():
+    """Test per-stage histograms and the Prometheus text output of /metrics."""
+    print_header("Test 19: Metrics Endpoint")
+    
+    import app as flask_app
+    import metrics
+    
+    client = flask_app.app.test_client()
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+           'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}
+    
+    def sample(text, name):
+        """Value of the first exposition line starting with ``name``."""
+        for line in text.splitlines():
+            if line.startswith(name + ' ') or line.startswith(name + '{'):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+    
+    def stage_count(text, component, stage):
+        return sample(text, f'crop_stage_duration_seconds_count{{component="{component}",stage="{stage}"}}') or 0
+    
+    before = client.get('/metrics').get_data(as_text=True)
+    for i in range(3):
+        client.post('/predict', json=dict(row, N=200 + i))
+    client.post('/predict-batch', json={'data': [row] * 5})
+    response = client.get('/metrics')
+    text = response.get_data(as_text=True)
+    
+    # Buckets are cumulative and end with +Inf == count
+    buckets = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('crop_stage_duration_seconds_bucket{component="predict",stage="model"')]
+    model_count = stage_count(text, 'predict', 'model')
+    
+    # Disabled metrics record nothing
+    metrics.REGISTRY.enabled = False
+    try:
+        client.post('/predict', json=dict(row, N=250))
+        disabled_text = client.get('/metrics').get_data(as_text=True)
+    finally:
+        metrics.REGISTRY.enabled = True
+    
+    print(f"\nContent-Type: {response.content_type}")
+    print(f"predict/model observations: {model_count:.0f}, buckets: {len(buckets)}")
+    
+    return (
+        response.content_type.startswith('text/plain; version=0.0.4')
+        and '# TYPE crop_stage_duration_seconds histogram' in text
+        and stage_count(text, '/predict', 'parse') - stage_count(before, '/predict', 'parse') == 3
+        and stage_count(text, '/predict', 'serialize') - stage_count(before, '/predict', 'serialize') == 3
+        and stage_count(text, 'predict_batch', 'scale') >= 1
+        and buckets == sorted(buckets) and buckets[-1] == model_count
+        and sample(text, 'crop_batch_rows_bucket{component="predict_batch",le="4.0"}') is not None
+        and sample(text, 'crop_cache_misses_total') is not None
+        and sample(text, 'crop_request_duration_seconds_count{route="/predict",method="POST",status="200"}') >= 3
+        and stage_count(disabled_text, '/predict', 'parse') == stage_count(text, '/predict', 'parse')
+    )
+
+def test_benchmark_suite():
+    """Test benchmark results, regression detection and synthetic dataset scaling."""
+    print_header("Test 20: Benchmark Suite")
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'benchmarks'))
+    import pandas as pd
+    from compare import compare
+    from run_benchmarks import metric, run_suite, scale_dataset
+    
+    report = run_suite(['predict'])
+    results = report['results']
+    
+    # A 20% slower latency and a 5% lower throughput against a 10% threshold
+    baseline = {'predict.p50_ms': metric(1.0, 'ms'), 'batch.rows_per_s': metric(1000, 'rows/s', 'higher'),
+                'train.seconds': metric(10.0, 's')}
+    candidate = {'predict.p50_ms': metric(1.2, 'ms'), 'batch.rows_per_s': metric(950, 'rows/s', 'higher'),
+                 'train.seconds': metric(5.0, 's')}
+    status = {row['name']: row['status'] for row in compare(baseline, candidate, threshold=0.10)}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'crop_x3.csv')
+        n_rows = scale_dataset(3, path)
+        synthetic = pd.read_csv(path)
+    original = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'Crop_recommendation.csv'))
+    
+    print(f"\nMeasured: {sorted(results)}")
+    print(f"Statuses: {status}")
+    print(f"Synthetic rows: {n_rows} (original {len(original)})")
+    
+    return (
+        report['environment']['cpu_count'] == os.cpu_count()
+        and all(results[f'predict.{engine}.p50_ms']['value'] > 0 for engine in ('sklearn', 'compiled'))
+        and status == {'predict.p50_ms': 'regressed', 'batch.rows_per_s': 'ok', 'train.seconds': 'improved'}
+        and n_rows == len(synthetic) == 3 * len(original)
+        and list(synthetic.columns) == list(original.columns)
+        and set(synthetic['label']) == set(original['label'])
+    )
+
+def test_synthetic_data_generator():
+    """Test seeded, sharded synthetic data generation."""
+    print_header("Test 21: Synthetic Data Generator")
+    
+    import pandas as pd
+    import config
+    from generate_data import CropFeatureModel, generate, iter_chunks
+    from sklearn.ensemble import RandomForestClassifier
+    
+    source = pd.read_csv(config.DATASET_FILE)
+    model = CropFeatureModel.fit(source)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Same seed -> same shards, whether written in-process or by a pool
+        manifest = generate(os.path.join(tmp, 'a'), 2500, shard_rows=1000, chunk_rows=400, workers=0)
+        generate(os.path.join(tmp, 'b'), 2500, shard_rows=1000, chunk_rows=400, workers=2)
+        shards = [pd.read_csv(os.path.join(tmp, 'a', shard['file'])) for shard in manifest['shards']]
+        identical = all(
+            open(os.path.join(tmp, 'a', shard['file'])).read() == open(os.path.join(tmp, 'b', shard['file'])).read()
+            for shard in manifest['shards']
+        )
+    data = pd.concat(shards, ignore_index=True)
+    in_memory = pd.concat(iter_chunks(model, 1000, shard=1, chunk_rows=400), ignore_index=True)
+    
+    in_range = all(data[name].between(low, high).all() for name, (low, high) in config.FEATURE_RANGES.items())
+    
+    # A forest trained only on synthetic rows should still recognize the real ones
+    forest = RandomForestClassifier(n_estimators=25, random_state=0).fit(data[config.FEATURES], data['label'])
+    real_accuracy = float(np.mean(forest.predict(source[config.FEATURES]) == source['label']))
+    
+    print(f"\nShards: {[shard['rows'] for shard in manifest['shards']]}, identical across runs: {identical}")
+    print(f"Accuracy on the real dataset: {real_accuracy:.3f}")
+    
+    return (
+        identical
+        and [shard['rows'] for shard in manifest['shards']] == [1000, 1000, 500]
+        and len(data) == 2500 and list(data.columns) == list(source.columns)
+        and in_range
+        and (data[['N', 'P', 'K']] == data[['N', 'P', 'K']].round()).all().all()
+        and set(data['label']) <= set(config.CROPS)
+        and np.allclose(in_memory[config.FEATURES].to_numpy(), shards[1][config.FEATURES].to_numpy(), atol=1e-6)
+        and real_accuracy > 0.9
+    )
+
+def test_columnar_dataset():
+    """Test typed, chunked ingestion into the memory-mapped columnar cache."""
+    print_header("Test 22: Columnar Dataset Cache")
+    
+    import time
+    import pandas as pd
+    import config
+    from dataset import ColumnarDataset, load_dataset
+    
+    source = pd.read_csv(config.DATASET_FILE)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'crops.csv')
+        source.to_csv(csv_path, index=False)
+        cache_dir = os.path.join(tmp, 'cache')
+        
+        # Chunks smaller than the file, and not a divisor of its length
+        dataset = load_dataset(csv_path, cache_dir, chunk_rows=7)
+        features_ok = np.array_equal(dataset.features(), source[config.FEATURES].to_numpy(dtype=np.float32))
+        labels_ok = np.array_equal(dataset.labels, source['label'].map(config.CROPS).to_numpy())
+        mapped = isinstance(dataset.columns['N'], np.memmap)
+        chunks = list(dataset.iter_chunks(100))
+        
+        # A second load reuses the store; touching the source rebuilds it
+        label_file = os.path.join(dataset.store_dir, 'label.npy')
+        built_at = os.stat(label_file).st_mtime_ns
+        reused = os.stat(os.path.join(load_dataset(csv_path, cache_dir).store_dir, 'label.npy')).st_mtime_ns == built_at
+        time.sleep(0.01)
+        source.iloc[:50].to_csv(csv_path, index=False)
+        rebuilt = load_dataset(csv_path, cache_dir)
+        
+        # Unknown crops raise instead of becoming NaN
+        bad = source.copy()
+        bad.loc[3, 'label'] = 'quinoa'
+        bad_path = os.path.join(tmp, 'bad.csv')
+        bad.to_csv(bad_path, index=False)
+        try:
+            load_dataset(bad_path, cache_dir)
+            rejected = False
+        except ValueError as e:
+            rejected = 'quinoa' in str(e)
+        
+        # A directory of generate_data.py shards is one dataset
+        shard_dir = os.path.join(tmp, 'shards')
+        os.makedirs(shard_dir)
+        source.iloc[:100].to_csv(os.path.join(shard_dir, 'part-00000.csv'), index=False)
+        source.iloc[100:].to_csv(os.path.join(shard_dir, 'part-00001.csv'), index=False)
+        sharded = load_dataset(shard_dir, cache_dir)
+        sharded_ok = np.array_equal(sharded.features(), dataset.features()) if len(sharded) == 220 else False
+        reopened = ColumnarDataset(sharded.store_dir)
+    
+    print(f"\nRows: {len(dataset)}, chunks: {[len(y) for _, y in chunks]}")
+    print(f"Reused: {reused}, rebuilt rows: {len(rebuilt)}, unknown label rejected: {rejected}")
+    
+    return (
+        features_ok and labels_ok and mapped
+        and dataset.columns['N'].dtype == np.float32 and dataset.labels.dtype == np.int8
+        and [len(y) for _, y in chunks] == [100, 100, 20]
+        and reused and len(rebuilt) == 50
+        and rejected and sharded_ok and len(reopened) == 220
+    )
+
+def test_out_of_core_training():
+    """Test streamed scaler statistics, hashed splits and merged forest members."""
+    print_header("Test 23: Out-of-Core Training")
+    
+    import config
+    from dataset import load_dataset
+    from out_of_core import hash_split, scalers_from_stats, scan_training_rows, train_out_of_core
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    
+    # The split depends on row ids only, not on how the rows are chunked
+    ids = np.arange(200000)
+    test_mask = hash_split(ids)
+    split_ok = (np.array_equal(test_mask[1000:2000], hash_split(ids[1000:2000]))
+                and abs(test_mask.mean() - config.TEST_SIZE) < 0.01)
+    
+    # Streamed scalers match sklearn fitted on the materialized training rows
+    dataset = load_dataset()
+    train = ~hash_split(np.arange(dataset.rows))
+    stats, _, _ = scan_training_rows(dataset, chunk_rows=32)
+    minmax, standard = scalers_from_stats(stats)
+    X_train = dataset.features()[train].astype(np.float64)
+    ref_minmax = MinMaxScaler().fit(X_train)
+    ref_standard = StandardScaler().fit(ref_minmax.transform(X_train))
+    scaler_ok = np.allclose(standard.transform(minmax.transform(X_train)),
+                            ref_standard.transform(ref_minmax.transform(X_train)), atol=1e-9)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = train_out_of_core(config.DATASET_FILE, tmp, workers=0, trees_per_member=25)
+        predictor = CropRecommendationPredictor(engine='compiled', bundle_path=summary['bundle_path'])
+        rice = predictor.predict(N=90, P=42, K=43, temperature=20.88, humidity=82.00, ph=6.50, rainfall=202.94)
+        with open(os.path.join(tmp, 'crop_recommendation_model.pkl'), 'rb') as f:
+            import pickle
+            model = pickle.load(f)
+        
+        # compress.py rebuilds the hashed split from the bundle metadata
+        from compress import load_splits
+        _, X_test, _, y_test = load_splits(load_bundle(summary['bundle_path']))
+        sampled_train, sampled_test, _, _ = load_splits(load_bundle(summary['bundle_path']), max_rows=10)
+    
+    # Members too small to see every crop: no model pickle, and no stale one left behind
+    with tempfile.TemporaryDirectory() as tmp:
+        stale_path = os.path.join(tmp, 'crop_recommendation_model.pkl')
+        with open(stale_path, 'wb') as f:
+            pickle.dump('stale model', f)
+        partial = train_out_of_core(config.DATASET_FILE, tmp, params=dict(config.MODEL_PARAMS, n_estimators=4),
+                                    workers=0, trees_per_member=2, member_rows=20)
+        partial_predictor = CropRecommendationPredictor(engine='compiled', bundle_path=partial['bundle_path'])
+        stale_removed = (not os.path.exists(stale_path)
+                         and os.path.exists(os.path.join(tmp, 'fused_scaler.pkl'))
+                         and partial_predictor.forest.n_trees == 4)
+    
+    # The merged sklearn model and the flattened forest agree
+    X_scaled = dataset.features() * predictor.fused_scale + predictor.fused_offset
+    agree = np.array_equal(model.predict(X_scaled.astype(np.float32)),
+                           predictor.forest.classes[predictor.forest.predict_proba(X_scaled).argmax(axis=1)])
+    
+    print(f"\nTrain/test rows: {summary['train_rows']}/{summary['test_rows']}, "
+          f"members: {summary['members']}, accuracy: {summary['accuracy']:.3f}")
+    print(f"Rice prediction: {rice['crop']}")
+    
+    print(f"Stale model pickle removed after a partial merge: {stale_removed}")
+    
+    return (
+        split_ok and scaler_ok and agree and stale_removed
+        and summary['train_rows'] + summary['test_rows'] == dataset.rows
+        and summary['members'] == 4 and summary['n_trees'] == 100 and model.n_estimators == 100
+        and predictor.model_metadata['split']['method'] == 'hash'
+        and len(X_test) == len(y_test) == summary['test_rows']
+        and 0 < len(sampled_test) < summary['test_rows'] and 0 < len(sampled_train) < summary['train_rows']
+        and summary['accuracy'] > 0.8
+        and rice['crop'] == 'rice'
+    )
+
+def test_input_validation():
+    """Test vectorized validation and the reject/skip modes of /predict-batch."""
+    print_header("Test 24: Input Validation")
+    
+    import app as flask_app
+    from validation import ValidationError, validate_records
+    
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.88,
+           'humidity': 82.00, 'ph': 6.50, 'rainfall': 202.94}
+    rows = [
+        row,
+        {k: v for k, v in row.items() if k != 'ph'},
+        dict(row, N='abc'),
+        dict(row, humidity=float('nan')),
+        dict(row, ph=9.5),
+        'not a record',
+        dict(row, N='90', ph=True)
+    ]
+    
+    result = validate_records(rows)
+    errors = result.errors
+    checks_ok = (
+        result.valid_rows.tolist() == [0] and result.features.shape == (1, 7)
+        and errors[1] == ['Missing required fields: ph']
+        and errors[2] == ['Non-numeric values: N']
+        and errors[3] == ['Non-finite values: humidity']
+        and errors[4] == ['ph=9.5 is outside the range 5 to 8']
+        and errors[5] == ['Record must be a JSON object']
+        and errors[6] == ['Non-numeric values: ph']
+    )
+    
+    # Rejected batches raise before any row is scored
+    predictor = CropRecommendationPredictor()
+    try:
+        predictor.predict_batch(rows)
+        raised = False
+    except ValidationError as e:
+        raised = [error['row'] for error in e.errors] == [1, 2, 3, 4, 5, 6]
+    
+    client = flask_app.app.test_client()
+    rejected = client.post('/predict-batch', json={'data': rows})
+    skipped = client.post('/predict-batch', json={'data': rows, 'on_error': 'skip'}).get_json()
+    bad_mode = client.post('/predict-batch', json={'data': rows, 'on_error': 'ignore'})
+    single = client.post('/predict', json=dict(row, ph=9.5))
+    
+    print(f"\nRejected: {rejected.status_code} with {len(rejected.get_json()['errors'])} row errors")
+    print(f"Skipped:  {skipped['total_predictions']} scored, {skipped['rejected']} rejected")
+    
+    return (
+        checks_ok and raised
+        and rejected.status_code == 400 and len(rejected.get_json()['errors']) == 6
+        and skipped['success'] and skipped['total_predictions'] == 1
+        and skipped['predictions'][0]['row'] == 0 and skipped['predictions'][0]['crop'] == 'rice'
+        and skipped['rejected'] == 6 and skipped['errors'][3]['row'] == 4
+        and bad_mode.status_code == 400
+        and single.status_code == 400 and 'outside the range' in single.get_json()['error']
+    )
+
+def test_fast_json_responses():
+    """Test the JSON backends and the fields/compact response layouts."""
+    print_header("Test 25: Fast JSON Responses")
+    
+    import app as flask_app
+    import pandas as pd
+    import serialization
+    
+    payload = {'ids': np.arange(3), 'confidences': np.array([99.5, 0.25, 0.0]),
+               'count': np.int64(3), 'mapping': {1: 'rice'}}
+    expected = {'ids': [0, 1, 2], 'confidences': [99.5, 0.25, 0.0], 'count': 3, 'mapping': {'1': 'rice'}}
+    backends = ['json'] + (['orjson'] if serialization.resolve_backend('auto') == 'orjson' else [])
+    encoded_ok = all(json.loads(serialization.dumps(payload, backend)) == expected for backend in backends)
+    try:
+        serialization.resolve_backend('yaml')
+        unknown_rejected = False
+    except ValueError:
+        unknown_rejected = True
+    
+    samples = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'Crop_recommendation.csv'))
+    rows = samples.drop('label', axis=1).sample(100, random_state=1).to_dict('records')
+    client = flask_app.app.test_client()
+    full = client.post('/predict-batch', json={'data': rows, 'top_k': 2}).get_json()
+    lean = client.post('/predict-batch', json={'data': rows, 'fields': 'crop,confidence'}).get_json()
+    compact = client.post('/predict-batch', json={'data': rows, 'compact': True, 'top_k': 2}).get_json()
+    skipped = client.post('/predict-batch', json={'data': [{'N': 1}] + rows[:3], 'compact': True,
+                                                  'on_error': 'skip'}).get_json()
+    conflict = client.post('/predict-batch', json={'data': rows, 'compact': True, 'fields': ['crop']})
+    single = client.post('/predict', json=dict(rows[0], fields=['crop'])).get_json()
+    
+    predictions = full['predictions']
+    print(f"\nBackends: {backends}")
+    print(f"Compact crops: {compact['crops'][:3]} ...")
+    
+    return (
+        encoded_ok and unknown_rejected
+        and compact['total_predictions'] == 100
+        and compact['crops'] == [p['crop'] for p in predictions]
+        and compact['ids'] == [p['crop_id'] for p in predictions]
+        and compact['confidences'] == [p['confidence'] for p in predictions]
+        and compact['alternatives']['crops'] == [[a['crop'] for a in p['alternatives']] for p in predictions]
+        and 'predictions' not in compact
+        and all(set(p) == {'crop', 'confidence'} for p in lean['predictions'])
+        and [p['crop'] for p in lean['predictions']] == compact['crops']
+        and skipped['rows'] == [1, 2, 3] and skipped['rejected'] == 1 and len(skipped['crops']) == 3
+        and conflict.status_code == 400
+        and single['prediction'] == {'crop': predictions[0]['crop']}
+    )
+
+def test_binary_batch_format():
+    """Test the binary columnar /predict-batch format against the JSON path."""
+    print_header("Test 26: Binary Batch Format")
+    
+    import app as flask_app
+    import pandas as pd
+    from binary_batch import (FEATURES_MIMETYPE, PREDICTIONS_MIMETYPE, decode_features,
+                              decode_predictions, encode_features)
+    
+    samples = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'Crop_recommendation.csv'))
+    features = samples[flask_app.config.FEATURES].to_numpy()
+    body = encode_features(features)
+    view = decode_features(body, 7)
+    zero_copy = view.base is not None and not view.flags.writeable and np.allclose(view, features)
+    
+    client = flask_app.app.test_client()
+    binary_headers = {'Accept': PREDICTIONS_MIMETYPE}
+    expected = client.post('/predict-batch', json={'data': samples.drop('label', axis=1).to_dict('records'),
+                                                   'compact': True, 'top_k': 2}).get_json()
+    response = client.post('/predict-batch?top_k=2', data=body, content_type=FEATURES_MIMETYPE,
+                           headers=binary_headers)
+    # Rounding inputs to float32 can flip a few borderline tree votes, not the best crop
+    result = decode_predictions(response.data)
+    
+    # Invalid rows skipped or rejected; JSON in, binary out
+    bad = features[:4].copy()
+    bad[1, 5] = 9.5
+    skipped = decode_predictions(client.post('/predict-batch?on_error=skip', data=encode_features(bad),
+                                             content_type=FEATURES_MIMETYPE, headers=binary_headers).data)
+    rejected = client.post('/predict-batch', data=encode_features(bad), content_type=FEATURES_MIMETYPE)
+    truncated = client.post('/predict-batch', data=body[:-4], content_type=FEATURES_MIMETYPE)
+    json_in = client.post('/predict-batch', json={'data': samples.drop('label', axis=1).head(3).to_dict('records')},
+                          headers=binary_headers)
+    # Query-string options are strings: compact and fields are coerced like top_k
+    compact = client.post('/predict-batch?compact=true&top_k=2', data=encode_features(features[:3]),
+                          content_type=FEATURES_MIMETYPE).get_json()
+    fields = client.post('/predict-batch?fields=crop,confidence', data=encode_features(features[:3]),
+                         content_type=FEATURES_MIMETYPE).get_json()
+    bad_compact = client.post('/predict-batch?compact=maybe', data=encode_features(features[:3]),
+                              content_type=FEATURES_MIMETYPE)
+    bad_top_k = client.post('/predict-batch?top_k=2.0', data=encode_features(features[:3]),
+                            content_type=FEATURES_MIMETYPE).get_json()
+    sparse_fields = client.post('/predict-batch?fields=crop,,confidence', data=encode_features(features[:3]),
+                                content_type=FEATURES_MIMETYPE)
+    # The same options in the query string of a JSON request
+    json_query = client.post('/predict-batch?compact=1&top_k=2',
+                             json={'data': samples.drop('label', axis=1).head(3).to_dict('records')}).get_json()
+    
+    print(f"\nRequest: {len(body)} bytes, response: {len(response.data)} bytes for {len(features)} rows")
+    
+    return (
+        zero_copy and response.status_code == 200
+        and response.mimetype == PREDICTIONS_MIMETYPE
+        and result['ids'].tolist() == expected['ids']
+        and np.abs(result['confidences'] - expected['confidences']).max() <= 5
+        and np.array_equal(result['alternatives']['ids'][:, 0], result['ids'])
+        and skipped['rows'].tolist() == [0, 2, 3] and len(skipped['ids']) == 3
+        and rejected.status_code == 400 and rejected.get_json()['errors'][0]['row'] == 1
+        and truncated.status_code == 400
+        and decode_predictions(json_in.data)['ids'].tolist() == expected['ids'][:3]
+        and compact['ids'] == expected['ids'][:3] and 'predictions' not in compact
+        and all(set(p) == {'crop', 'confidence'} for p in fields['predictions'])
+        and bad_compact.status_code == 400
+        and bad_top_k['error'] == 'Invalid input value: top_k must be an integer between 1 and 22'
+        and sparse_fields.status_code == 200
+        and json_query['ids'] == expected['ids'][:3] and 'alternatives' in json_query
+    )
+
+def test_lean_startup():
+    """Test that booting an API worker skips scikit-learn and that train.py imports without training."""
+    print_header("Test 27: Lean Startup")
+    
+    import subprocess
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = (
+        "import contextlib, io, json, sys\n"
+        "import app\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    app.initialize_predictor()\n"
+        "heavy = ['sklearn', 'pandas', 'scipy', 'matplotlib', 'urllib.request']\n"
+        "print(json.dumps({'engine': app.predictor.engine, 'loaded': [m for m in heavy if m in sys.modules]}))\n"
+    )
+    boot = json.loads(subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True,
+                                     text=True, check=True).stdout.strip().splitlines()[-1])
+    
+    # Importing train.py defines the pipeline without running it
+    imported = subprocess.run([sys.executable, '-c', "import sys; sys.path.insert(0, 'scripts'); import train; "
+                               "print(callable(train.train) and callable(train.main))"],
+                              cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+    
+    with open(os.path.join(root, 'requirements.txt')) as f:
+        requirements = f.read()
+    
+    print(f"\nWorker boot: engine={boot['engine']}, heavy modules loaded: {boot['loaded']}")
+    print(f"import train output: {imported!r}")
+    
+    return (
+        boot['engine'] == 'compiled' and boot['loaded'] == []
+        and imported == 'True'
+        and 'matplotlib' not in requirements and 'seaborn' not in requirements
+    )
+
+def test_shared_memory_model():
+    """Test publishing the forest to shared memory, read-only worker attachment and segment retirement."""
+    print_header("Test 28: Shared-Memory Model")
+    
+    import subprocess
+    import config
+    from shared_model import SHARED_MODEL_ENV, SharedModelPublisher, attach
+    
+    root = os.path.dirname(os.path.abspath(__file__))
+    source = CropRecommendationPredictor(engine='sklearn')
+    rng = np.random.default_rng(7)
+    low = np.array([config.FEATURE_RANGES[name][0] for name in config.FEATURES], dtype=np.float64)
+    high = np.array([config.FEATURE_RANGES[name][1] for name in config.FEATURES], dtype=np.float64)
+    features = rng.uniform(low, high, size=(200, len(config.FEATURES)))
+    
+    with SharedModelPublisher() as publisher:
+        # The supervisor flattens the sklearn model once; workers get the compiled engine
+        first = publisher.publish(source)
+        shared = CropRecommendationPredictor(engine='compiled', shared_model=first)
+        read_only = not any(getattr(shared.forest, name).flags.writeable
+                            for name in ('feature', 'threshold', 'left', 'right', 'value'))
+        expected = source.predict_proba(features.copy())
+        max_diff = float(np.abs(shared.predict_proba(features.copy()) - expected).max())
+        
+        # A separate worker process attaches through the environment variable and exits
+        script = (
+            "import contextlib, io\n"
+            "import app\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    app.initialize_predictor()\n"
+            "print(app.predictor.shared_model, app.predictor.predict(90, 42, 43, 20.8, 82, 6.5, 202.9)['crop'])\n"
+        )
+        env = dict(os.environ, **{SHARED_MODEL_ENV: first})
+        worker = subprocess.run([sys.executable, '-c', script], cwd=root, env=env, capture_output=True,
+                                text=True, check=True).stdout.strip().splitlines()[-1]
+        still_published = attach(first).forest.n_nodes == shared.forest.n_nodes
+        
+        # Republishing retires the old segment; mappings made before keep working
+        second = publisher.publish(source)
+        try:
+            attach(first)
+            retired = False
+        except FileNotFoundError:
+            retired = True
+        still_serving = float(np.abs(shared.predict_proba(features.copy()) - expected).max()) == max_diff
+    
+    try:
+        attach(second)
+        closed = False
+    except FileNotFoundError:
+        closed = True
+    
+    print(f"\nSegments: {first}, {second}")
+    print(f"Read-only views: {read_only}, max probability difference: {max_diff}")
+    print(f"Worker via {SHARED_MODEL_ENV}: {worker}")
+    print(f"Old segment retired: {retired}, last segment unlinked on close: {closed}")
+    
+    return (
+        read_only and max_diff < 1e-9
+        and worker == f"{first} rice" and still_published
+        and retired and still_serving and closed
+    )
+
+def test_decision_grid():
+    """Test the precomputed decision grid against the exact model, its fallback and persistence."""
+    print_header("Test 29: Decision Grid")
+    
+    import config
+    from decision_grid import DecisionGrid, GridPredictor, build_grid
+    
+    root = os.path.dirname(os.path.abspath(__file__))
+    bundle = load_bundle(os.path.join(root, 'models', 'crop_model.bundle'))
+    predictor = CropRecommendationPredictor(engine='compiled')
+    steps = {'N': 40, 'P': 40, 'K': 40, 'temperature': 5, 'humidity': 20, 'ph': 1.0, 'rainfall': 100}
+    ranges = {'N': (0, 160), 'P': (0, 160), 'K': (0, 160), 'temperature': (10, 35),
+              'humidity': (20, 100), 'ph': (5.0, 8.0), 'rainfall': (50, 450)}
+    grid = build_grid(bundle, steps, ranges)
+    
+    # Every grid point, scored by the model
+    axes = np.meshgrid(*[grid.levels(axis) for axis in range(len(grid.shape))], indexing='ij')
+    points = np.stack([axis.ravel() for axis in axes], axis=1)
+    proba = predictor.predict_proba(points.copy())
+    exact_ids = predictor.crop_ids[proba.argmax(axis=1)]
+    agreement = float(np.mean(grid.ids == exact_ids))
+    confidence_error = float(np.abs(grid.confidence.astype(np.float64) - proba.max(axis=1)).max())
+    
+    # On-grid rows come from the table; off-grid and out-of-range rows from the model
+    lookup = GridPredictor(grid, predictor)
+    rows = np.array([[80, 40, 40, 25, 80, 6.0, 250],
+                     [91, 42, 43, 20.8, 82, 6.5, 202.9],
+                     [400, 40, 40, 25, 80, 6.0, 250]], dtype=np.float64)
+    crop_ids, confidences, from_grid = lookup.predict_ids(rows)
+    model_ids = predictor.crop_ids[predictor.predict_proba(rows.copy()).argmax(axis=1)]
+    single = lookup.predict(N=80, P=40, K=40, temperature=25, humidity=80, ph=6.0, rainfall=250)
+    expected = predictor.predict(N=80, P=40, K=40, temperature=25, humidity=80, ph=6.0, rainfall=250)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'grid.npz')
+        file_bytes = grid.save(path)
+        loaded = DecisionGrid.load(path)
+    round_trip = (loaded.shape == grid.shape and np.array_equal(loaded.ids, grid.ids)
+                  and np.array_equal(loaded.confidence, grid.confidence) and loaded.digest == grid.digest)
+    
+    loaded.digest = 'stale'
+    try:
+        GridPredictor(loaded, predictor)
+        stale_rejected = False
+    except ValueError:
+        stale_rejected = True
+    try:
+        build_grid(bundle, {name: 0.01 for name in config.FEATURES})
+        oversized_rejected = False
+    except ValueError:
+        oversized_rejected = True
+    
+    print(f"\nGrid: {grid.shape} = {grid.n_cells} points, {grid.nbytes} bytes in memory, {file_bytes} on disk")
+    print(f"Agreement with the model: {agreement:.2%}, max confidence error {confidence_error:.5f}")
+    print(f"Lookup sources (grid?): {from_grid.tolist()}, ids {crop_ids.tolist()} vs model {model_ids.tolist()}")
+    print(f"Single: {single['crop']} {single['confidence']} (model: {expected['crop']} {expected['confidence']})")
+    print(f"Round trip: {round_trip}, stale grid rejected: {stale_rejected}, oversized grid rejected: {oversized_rejected}")
+    
+    return (
+        grid.ids.dtype == np.uint8 and grid.confidence.dtype == np.float16
+        and agreement == 1.0 and confidence_error < 1e-3
+        and from_grid.tolist() == [True, False, False]
+        and np.array_equal(crop_ids, model_ids)
+        and abs(confidences[1] - predictor.predict_proba(rows[1:2].copy()).max() * 100) < 1e-9
+        and single['crop'] == expected['crop'] and abs(single['confidence'] - expected['confidence']) < 0.1
+        and round_trip and stale_rejected and oversized_rejected
+    )
+
 def run_all_tests():
     """Run all tests and report results."""
     print_header("CROP RECOMMENDATION SYSTEM - TEST SUITE")
@@ -206,6 +1390,29 @@ def run_all_tests():
         ("Batch Predictions", test_batch_prediction),
         ("Crop List", test_crop_list),
         ("Feature Names", test_feature_names),
+        ("Fused Scaling Parity", test_fused_scaling_parity),
+        ("Compiled Engine Parity", test_compiled_engine_parity),
+        ("Prediction Cache", test_prediction_cache),
+        ("Model Bundle", test_model_bundle),
+        ("ASGI Micro-Batching", test_asgi_micro_batching),
+        ("Streaming Predictions", test_predict_stream),
+        ("Bulk Scoring", test_bulk_scoring),
+        ("Top-K Alternatives", test_top_k_alternatives),
+        ("Hyperparameter Search", test_hyperparameter_search),
+        ("Model Compression", test_model_compression),
+        ("Incremental Training", test_incremental_training),
+        ("Model Registry Hot Reload", test_model_registry_hot_reload),
+        ("Metrics Endpoint", test_metrics_endpoint),
+        ("Benchmark Suite", test_benchmark_suite),
+        ("Synthetic Data Generator", test_synthetic_data_generator),
+        ("Columnar Dataset Cache", test_columnar_dataset),
+        ("Out-of-Core Training", test_out_of_core_training),
+        ("Input Validation", test_input_validation),
+        ("Fast JSON Responses", test_fast_json_responses),
+        ("Binary Batch Format", test_binary_batch_format),
+        ("Lean Startup", test_lean_startup),
+        ("Shared-Memory Model", test_shared_memory_model),
+        ("Decision Grid", test_decision_grid),
     ]
     
     results = []